@@ -0,0 +1,115 @@
+"""
+Micro-benchmark: markdown -> HTML rendering for captions and progress texts.
+
+Compares the previous implementation (13 uncompiled re.sub calls per call)
+with devgagan/core/caption_render.py, checks both produce identical output,
+and reports the memo hit rate.
+
+    python benchmarks/bench_caption_render.py [iterations]
+
+The module is loaded by path so the bot package (and its clients) is not
+imported.
+"""
+
+import importlib.util
+import os
+import re
+import sys
+import timeit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_spec = importlib.util.spec_from_file_location(
+    "caption_render", os.path.join(ROOT, "devgagan", "core", "caption_render.py")
+)
+caption_render = importlib.util.module_from_spec(_spec)
+_spec.loader.exec_module(caption_render)
+
+
+def legacy_markdown_to_html(caption: str) -> str:
+    """Previous CaptionFormatter.markdown_to_html body, kept for comparison"""
+    if not caption:
+        return ""
+
+    def link_replacer(match):
+        text, url = match.groups()
+        if url.startswith('www.'):
+            url = 'http://' + url
+        return f'<a href="{url}">{text}</a>'
+
+    link_pattern = r'\[(.*?)\]\((https?://[^\s\)]+|tg://[^\s\)]+|www\.[^\s\)]+)\)'
+    result = re.sub(link_pattern, link_replacer, caption, flags=re.DOTALL)
+    replacements = [
+        (r"```([a-zA-Z0-9_+\-.]+)\n([\s\S]*?)```", r"<pre language=\"\1\">\2</pre>"),
+        (r"```([\s\S]*?)```", r"<pre>\1</pre>"),
+        (r"^>>> (.*)", r"<blockquote expandable>\1</blockquote>"),
+        (r"^>> (.*)", r"<blockquote expandable>\1</blockquote>"),
+        (r"^> (.*)", r"<blockquote>\1</blockquote>"),
+        (r"(?<!`)`([^`\n]+)`(?!`)", r"<code>\1</code>"),
+        (r"\*\*(.+?)\*\*", r"<b>\1</b>"),
+        (r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<i>\1</i>"),
+        (r"__(.+?)__", r"<u>\1</u>"),
+        (r"_(.+?)_", r"<i>\1</i>"),
+        (r"~~(.+?)~~", r"<s>\1</s>"),
+        (r"\|\|(.+?)\|\|", r"<tg-spoiler>\1</tg-spoiler>"),
+    ]
+    for pattern, replacement in replacements:
+        result = re.sub(pattern, replacement, result, flags=re.MULTILINE | re.DOTALL)
+    return result.strip()
+
+
+def legacy_progress(percent: float) -> str:
+    """What the progress callbacks used to build before running it through the converter"""
+    filled = int(percent // 10)
+    return (
+        "📥 <b>Downloading...</b>\n\n"
+        f"[{'🟩' * filled}{'▫️' * (10 - filled)}] {percent:.0f}%\n\n"
+        f"📊 <b>Progress:</b> {percent:.1f}%\n"
+        f"📁 <b>Size:</b> {percent * 1.7:.2f} MiB / 170.00 MiB\n"
+        f"⚡ <b>Speed:</b> {percent / 7:.2f} MiB/s\n"
+        "⏱️ <b>ETA:</b> 1m, 12s"
+    )
+
+
+CAPTIONS = [
+    "**Lecture 12** - Thermodynamics\n__Chapter 4__ notes by @some_channel",
+    "> Quote of the day\n>> expandable part\nPlain line with `inline code` and ||spoiler||",
+    "Join [our channel](https://t.me/example) and visit [site](www.example.com) for ~~old~~ new files",
+    "```python\nprint('hello')\n```\nDownloaded with *style* and _care_",
+    "Plain caption without any formatting at all, just a long file description " * 4,
+    "❌ This channel is protected by **Restrict Bot Saver**.",
+    "📄 **Sticker**",
+    "🎤 **Voice Message**",
+]
+PROGRESS = [legacy_progress(p) for p in range(0, 101, 5)]
+
+
+def _bench(label, fn, texts, number):
+    elapsed = timeit.timeit(lambda: [fn(t) for t in texts], number=number)
+    per_call = elapsed / (number * len(texts)) * 1e6
+    print(f"  {label:<34} {per_call:8.2f} µs/call")
+    return per_call
+
+
+def main():
+    number = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+
+    for text in CAPTIONS + PROGRESS:
+        assert caption_render.render_markdown(text) == legacy_markdown_to_html(text), text
+
+    print(f"Captions ({len(CAPTIONS)} texts x {number})")
+    old = _bench("legacy re.sub", legacy_markdown_to_html, CAPTIONS, number)
+    new = _bench("compiled + memo", caption_render.render_markdown, CAPTIONS, number)
+    raw = _bench("compiled, no memo", caption_render._render, CAPTIONS, number)
+    print(f"  speedup: {old / new:.1f}x memoised, {old / raw:.1f}x cold")
+
+    print(f"Progress texts ({len(PROGRESS)} texts x {number})")
+    old = _bench("legacy template + converter", legacy_markdown_to_html, PROGRESS, number)
+    new = _bench("pre-rendered HTML (no converter)", lambda t: t, PROGRESS, number)
+    print(f"  converter cost removed from the hot path: {old - new:.2f} µs/edit")
+
+    info = caption_render.cache_info()
+    print(f"Memo: hits={info.hits} misses={info.misses} size={info.currsize}/{info.maxsize}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,346 @@
+"""
+Offline end-to-end transfer benchmark.
+
+Runs scripted scenarios (N users x M-file batches, mixed tiers and sizes)
+against FakeClient sessions (benchmarks/fake_telegram.py), through the bot's
+real scheduling code: SessionPool acquisition, health probes and FloodWait
+blocking, the free-tier global download queue, per-session request queues,
+the message cache, memory and disk budgets, cancellation and the metrics
+registry. Reports throughput, p50/p99 task latency per tier, peak RSS,
+event-loop lag, FloodWaits, dropped pool sessions and API calls per file.
+
+    python benchmarks/bench_transfers.py --scenario mixed
+    python benchmarks/bench_transfers.py --users 30 --files 10 --sessions 6 --profile flaky --json
+
+Each file runs the steps of handle_message_download / upload_with_telethon
+with the same shared code (devgagan.core.transfer): pool session for the
+download (userbot fallback) -> message via message_cache -> MediaFetch into
+RAM or onto disk -> pool session for the upload -> send to LOG_GROUP ->
+bot forwards it to the user; the download session is held until the upload
+is done. get_func itself is not imported because importing devgagan starts
+the real clients: devgagan.core modules are loaded without running the
+package __init__, so nothing connects to Telegram or Mongo. The bot's
+dependencies (requirements.txt) must be installed.
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+import types
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# Offline placeholders so config.py validates; set before it (or .env) is read
+for _key, _value in {
+    "API_ID": "1", "API_HASH": "offline", "BOT_TOKEN": "0:offline", "OWNER_ID": "1",
+    "MONGO_DB": "mongodb://127.0.0.1:1/?serverSelectionTimeoutMS=100",
+    "LOG_GROUP": "-1000000000001", "CHANNEL_ID": "-1000000000002",
+}.items():
+    os.environ.setdefault(_key, _value)
+
+# Make devgagan.core importable without executing devgagan/__init__.py (it boots the bot)
+for _name, _path in (("devgagan", os.path.join(ROOT, "devgagan")),
+                     ("devgagan.core", os.path.join(ROOT, "devgagan", "core"))):
+    if _name not in sys.modules:
+        _pkg = types.ModuleType(_name)
+        _pkg.__path__ = [_path]
+        sys.modules[_name] = _pkg
+
+from config import LOG_GROUP  # noqa: E402
+from devgagan.core.session_pool import SessionPool, METHOD_DOWNLOAD, METHOD_UPLOAD  # noqa: E402
+from devgagan.core.transfer import MediaFetch, request_pool_session  # noqa: E402
+from devgagan.core.message_cache import message_cache  # noqa: E402
+from devgagan.core.memory_budget import memory_budget, is_buffer  # noqa: E402
+from devgagan.core.disk_budget import DiskBudget  # noqa: E402
+from devgagan.core.download_queue import DownloadQueueManager  # noqa: E402
+from devgagan.core.cancel import cancel_manager  # noqa: E402
+from devgagan.core.metrics import metrics  # noqa: E402
+from devgagan.core.loop_monitor import loop_monitor  # noqa: E402
+
+from fake_telegram import FakeClient, FakeTelegram, PROFILES  # noqa: E402
+
+_MB = 1024 * 1024
+
+SCENARIOS: Dict[str, Dict[str, object]] = {
+    "smoke": dict(users=4, files=3, sessions=2, premium=0.5, sizes="1:70,8:30", profile="lan"),
+    "mixed": dict(users=12, files=6, sessions=4, premium=0.3, sizes="1:60,8:30,64:10", profile="dc"),
+    "heavy": dict(users=8, files=4, sessions=4, premium=0.5, sizes="64:50,256:40,1024:10", profile="dc"),
+    "flood": dict(users=10, files=6, sessions=4, premium=0.3, sizes="1:60,8:40", profile="flaky"),
+    "storm": dict(users=6, files=4, sessions=4, premium=0.5, sizes="1:60,8:40", profile="storm"),
+}
+
+
+class _VirtualDiskBudget(DiskBudget):
+    """DiskBudget over a virtual disk of `limit` bytes: accounting only, no placeholders"""
+    def __init__(self, directory: str, limit: int):
+        super().__init__(directory)
+        self.limit = limit
+
+    def _watermark(self) -> int:
+        return self.limit
+
+    def _free_bytes(self) -> int:
+        return self.limit - self.reserved_bytes
+
+    def _preallocate(self, res) -> None:
+        pass
+
+
+def _parse_sizes(spec: str) -> List[Tuple[int, int]]:
+    """'1:60,8:30,64:10' -> [(1 MB, 60), (8 MB, 30), (64 MB, 10)]"""
+    out = []
+    for part in spec.split(","):
+        size, _, weight = part.partition(":")
+        out.append((int(float(size) * _MB), int(weight or 1)))
+    return out
+
+
+def _percentile(values: List[float], q: float) -> Optional[float]:
+    if not values:
+        return None
+    ordered = sorted(values)
+    return round(ordered[min(len(ordered) - 1, int(q * len(ordered)))], 3)
+
+
+class Bench:
+    def __init__(self, args):
+        self.args = args
+        self.profile = PROFILES[args.profile]
+        self.world = FakeTelegram(seed=args.seed)
+        self.rng = random.Random(args.seed)
+        self.pool = SessionPool()
+        self.pool.session_concurrency = args.concurrency
+        self.pool.cooldown_period = args.cooldown
+        self.pool_clients: List[FakeClient] = []
+        for i in range(args.sessions):
+            sid = f"bench{i}"
+            self.pool._register(sid, "bench", 0.0)
+            # Pool clients run with sleep_threshold=60 like SessionPool._start_client
+            client = FakeClient(self.world, sid, self.profile, me_id=1000 + i, sleep_threshold=60)
+            self.pool.sessions[sid] = client
+            self.pool.session_stats[sid].client_started = True
+            self.pool._cached_usernames[sid] = sid
+            self.pool_clients.append(client)
+        self.bot = FakeClient(self.world, "bot", self.profile, me_id=1, sleep_threshold=60)
+        self.userbot = FakeClient(self.world, "userbot", self.profile, me_id=2, sleep_threshold=60)
+        self.clients = self.pool_clients + [self.bot, self.userbot]
+        self.tmp = tempfile.mkdtemp(prefix="bench_transfers_")
+        self.disk = _VirtualDiskBudget(self.tmp, args.disk_mb * _MB)
+        self.free_queue = DownloadQueueManager(args.free_slots)
+        self.premium_slots = asyncio.Semaphore(args.premium_slots)
+        self.latencies: Dict[str, List[float]] = {"premium": [], "free": []}
+        self.results: Counter = Counter()
+        self.bytes = 0
+
+    # --- one file ---------------------------------------------------------
+
+    async def _upload(self, user_id: int, is_premium: bool, src, kind: str, progress):
+        """upload_with_telethon for a pool session: send to LOG_GROUP, bot forwards to the user"""
+        client, sid = await request_pool_session(is_premium, METHOD_UPLOAD, pool=self.pool)
+        if client is None:
+            raise TimeoutError("No available upload sessions")
+        session_error = None
+        try:
+            send = client.send_video if kind == "video" else client.send_document
+            uploaded = await send(LOG_GROUP, src, progress=progress)
+        except Exception as e:
+            session_error = e
+            raise
+        finally:
+            await self.pool.release_session(sid, error=session_error, method_class=METHOD_UPLOAD)
+        await self.bot.forward_messages(chat_id=user_id, from_chat_id=LOG_GROUP,
+                                        message_ids=uploaded.id, drop_author=True)
+
+    async def _handle(self, user_id: int, tier: str, chat_id: int, msg_id: int) -> int:
+        is_premium = tier == "premium"
+        task_id = await metrics.start_task("download", user_id, f"user{user_id}", f"bench/{chat_id}/{msg_id}", tier=tier)
+        status, size = "done", 0
+        fetch: Optional[MediaFetch] = None
+        file_path = None
+        session_error = None
+
+        async def _progress(current, total):
+            if cancel_manager.cancelled(user_id):
+                raise asyncio.CancelledError("download canceled")
+
+        pooled_client, session_id = await request_pool_session(is_premium, METHOD_DOWNLOAD, pool=self.pool)
+        client = pooled_client or self.userbot
+        try:
+            msg = await message_cache.get_message(client, chat_id, msg_id)
+            size = FakeClient._size_of(msg)
+            kind = "video" if getattr(msg, "video", None) else "document"
+            fetch = MediaFetch(os.path.join(self.tmp, f"{chat_id}_{msg_id}_{user_id}"), size, disk=self.disk)
+            file_path = await fetch.run(
+                client, msg, progress=_progress,
+                refresh=lambda: message_cache.refresh_message(client, chat_id, msg_id),
+                in_memory=memory_budget.eligible(kind, size, kind),
+            )
+            await self._upload(user_id, is_premium, file_path, kind, _progress)
+            self.bytes += size
+        except asyncio.CancelledError:
+            status = "canceled"
+            raise
+        except Exception as e:
+            status, session_error = "error", e
+            raise
+        finally:
+            if pooled_client is not None:
+                await self.pool.release_session(session_id, error=session_error, method_class=METHOD_DOWNLOAD)
+            if file_path is not None and not is_buffer(file_path):
+                with contextlib.suppress(OSError):
+                    os.remove(file_path)
+            if fetch:
+                fetch.release()
+            await metrics.finish_task(task_id, status=status, size=size)
+        return size
+
+    async def _file(self, user_id: int, tier: str, chat_id: int, msg_id: int) -> None:
+        started = time.monotonic()
+        try:
+            # Free users hold a global slot; premium users go through the bounded priority workers
+            if tier == "free":
+                await self.free_queue.acquire(user_id, f"bench/{chat_id}/{msg_id}")
+                try:
+                    await cancel_manager.run(user_id, self._handle(user_id, tier, chat_id, msg_id))
+                finally:
+                    await self.free_queue.release()
+            else:
+                async with self.premium_slots:
+                    await cancel_manager.run(user_id, self._handle(user_id, tier, chat_id, msg_id))
+            self.results["ok"] += 1
+        except Exception as e:
+            self.results[f"error:{type(e).__name__}"] += 1
+        self.latencies[tier].append(time.monotonic() - started)
+
+    async def _user(self, user_id: int, tier: str, files: List[Tuple[int, int]]) -> None:
+        # A batch processes its links one after another, like the /batch loop
+        for chat_id, msg_id in files:
+            await self._file(user_id, tier, chat_id, msg_id)
+
+    # --- scenario ---------------------------------------------------------
+
+    async def run(self) -> Dict[str, object]:
+        args = self.args
+        loop_monitor.start()
+        sizes = _parse_sizes(args.sizes)
+        population = [s for s, _ in sizes]
+        weights = [w for _, w in sizes]
+        users = []
+        for u in range(args.users):
+            tier = "premium" if self.rng.random() < args.premium else "free"
+            chat_id = -1001000000000 - u
+            files = []
+            for _ in range(args.files):
+                kind = "video" if self.rng.random() < 0.5 else "document"
+                msg = self.world.add_message(chat_id, kind, self.rng.choices(population, weights)[0])
+                files.append((chat_id, msg.id))
+            users.append((10_000 + u, tier, files))
+
+        started = time.monotonic()
+        try:
+            await asyncio.gather(*(self._user(uid, tier, files) for uid, tier, files in users))
+        finally:
+            shutil.rmtree(self.tmp, ignore_errors=True)
+        wall = time.monotonic() - started
+
+        calls: Counter = Counter()
+        for client in self.clients:
+            calls.update(client.calls)
+        total_files = sum(self.results.values())
+        lag = loop_monitor.stats()
+        return {
+            "scenario": args.scenario or "custom",
+            "profile": self.profile.name,
+            "users": args.users,
+            "files_per_user": args.files,
+            "sessions": args.sessions,
+            "results": dict(self.results),
+            "wall_seconds": round(wall, 2),
+            "throughput_mb_s": round(self.bytes / _MB / wall, 2) if wall else None,
+            "files_per_s": round(total_files / wall, 2) if wall else None,
+            "latency": {
+                tier: {"n": len(v), "p50": _percentile(v, 0.5), "p99": _percentile(v, 0.99)}
+                for tier, v in self.latencies.items() if v
+            },
+            "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+            "loop_lag_ms": {"max": round(lag["max_lag"] * 1000, 1), "p99_bucket": lag["p99"] * 1000,
+                            "slow_callbacks": lag["slow_callbacks"]},
+            "flood_waits": sum(c.flood_waits for c in self.clients),
+            "flood_waits_raised": sum(c.flood_raised for c in self.clients),
+            # Pool clients stopped mid-run (drained after a failed probe); each needs a restart
+            "sessions_dropped": sum(c.stops for c in self.pool_clients),
+            "userbot_fallbacks": self.userbot.calls["download_media"],
+            "in_memory_transfers": memory_budget.in_memory_transfers,
+            "api_calls_per_file": round(sum(calls.values()) / total_files, 2) if total_files else None,
+            "api_calls": dict(calls.most_common()),
+        }
+
+
+def _print_report(report: Dict[str, object]) -> None:
+    print(f"\nScenario {report['scenario']} ({report['profile']}): {report['users']} users x "
+          f"{report['files_per_user']} files on {report['sessions']} sessions")
+    print(f"  results          {report['results']}")
+    print(f"  wall time        {report['wall_seconds']}s")
+    print(f"  throughput       {report['throughput_mb_s']} MB/s, {report['files_per_s']} files/s")
+    for tier, lat in report["latency"].items():
+        print(f"  latency {tier:<8} n={lat['n']} p50={lat['p50']}s p99={lat['p99']}s")
+    print(f"  peak RSS         {report['peak_rss_mb']} MB ({report['in_memory_transfers']} in-memory transfers)")
+    lag = report["loop_lag_ms"]
+    print(f"  loop lag         max={lag['max']}ms p99<={lag['p99_bucket']}ms slow callbacks={lag['slow_callbacks']}")
+    print(f"  FloodWaits       {report['flood_waits']} ({report['flood_waits_raised']} raised)")
+    print(f"  pool             {report['sessions_dropped']} sessions dropped, "
+          f"{report['userbot_fallbacks']} downloads fell back to the userbot")
+    print(f"  API calls/file   {report['api_calls_per_file']}  {report['api_calls']}")
+
+
+def main(argv=None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default=None)
+    parser.add_argument("--users", type=int)
+    parser.add_argument("--files", type=int, help="files per user batch")
+    parser.add_argument("--sessions", type=int, help="pool sessions")
+    parser.add_argument("--premium", type=float, help="share of premium users (0-1)")
+    parser.add_argument("--sizes", help="MB:weight list, e.g. 1:60,8:30,64:10")
+    parser.add_argument("--profile", choices=sorted(PROFILES))
+    parser.add_argument("--concurrency", type=int, default=3, help="permits per pool session")
+    parser.add_argument("--free-slots", type=int, default=1, help="free-tier global download slots")
+    parser.add_argument("--premium-slots", type=int, default=8, help="premium transfer workers")
+    parser.add_argument("--disk-mb", type=int, default=8192, help="virtual disk budget")
+    parser.add_argument("--cooldown", type=int, default=30, help="pool cooldown after repeated errors (s)")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the bot's per-operation log lines")
+    args = parser.parse_args(argv)
+
+    preset = SCENARIOS[args.scenario or "mixed"]
+    for name, value in preset.items():
+        if getattr(args, name) is None:
+            setattr(args, name, value)
+    args.scenario = args.scenario or ("mixed" if all(getattr(args, n) == v for n, v in preset.items()) else None)
+
+    # No Mongo offline: keep metrics in memory only
+    metrics._col = None
+    with contextlib.ExitStack() as stack:
+        if not args.verbose:
+            stack.enter_context(contextlib.redirect_stdout(stack.enter_context(open(os.devnull, "w"))))
+        report = asyncio.run(Bench(args).run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        _print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,239 @@
+"""
+In-process fake Telegram for offline benchmarks.
+
+FakeTelegram holds the chats and their messages; FakeClient implements the
+part of the Pyrogram/Telethon client API the transfer path uses
+(get_me, get_chat, get_messages, download_media with progress and
+in_memory, send_document/send_video, copy_message, forward_messages, and
+Telethon's send_file). Transfers are timed from a NetworkProfile - per-call
+latency, bandwidth per client shared by its concurrent transfers, and an
+injected FloodWait rate on every method, get_me included. Like Pyrogram,
+a client sleeps through FloodWaits up to its sleep_threshold and raises
+longer ones. Downloads to disk create sparse files of the media size, so
+they cost no real disk space; in-memory downloads return real buffers.
+
+Every API call is counted per client and method, so a benchmark can report
+API calls per file.
+"""
+
+import asyncio
+import io
+import os
+import random
+from collections import Counter
+from dataclasses import dataclass
+from types import SimpleNamespace
+from typing import Dict, List, Optional, Union
+
+from pyrogram.errors import FloodWait
+
+_MB = 1024 * 1024
+
+
+@dataclass
+class NetworkProfile:
+    name: str
+    latency: float = 0.02           # seconds per API call
+    jitter: float = 0.01            # +/- uniform jitter on latency
+    bandwidth: float = 100 * _MB    # bytes/s per client, shared by its transfers
+    flood_rate: float = 0.0         # probability that an API call hits a FloodWait
+    flood_seconds: int = 3
+    chunk: int = _MB                # progress callback granularity (Pyrogram uses 1 MB parts)
+
+
+PROFILES: Dict[str, NetworkProfile] = {
+    "lan": NetworkProfile("lan", latency=0.002, jitter=0.001, bandwidth=400 * _MB),
+    "dc": NetworkProfile("dc", latency=0.03, jitter=0.015, bandwidth=100 * _MB),
+    "congested": NetworkProfile("congested", latency=0.12, jitter=0.08, bandwidth=20 * _MB, flood_rate=0.005),
+    # Short waits: absorbed by the clients' sleep_threshold
+    "flaky": NetworkProfile("flaky", latency=0.05, jitter=0.04, bandwidth=60 * _MB, flood_rate=0.03, flood_seconds=2),
+    # Waits above sleep_threshold: raised to the bot, which must block the session
+    "storm": NetworkProfile("storm", latency=0.05, jitter=0.04, bandwidth=60 * _MB, flood_rate=0.01, flood_seconds=65),
+}
+
+
+def _media(kind: str, size: int, name: str, uid: str) -> SimpleNamespace:
+    return SimpleNamespace(file_size=size, file_name=name, file_unique_id=uid,
+                           mime_type="video/mp4" if kind == "video" else "application/octet-stream")
+
+
+def make_message(chat_id: int, msg_id: int, kind: str = "document", size: int = 0,
+                 username: Optional[str] = None) -> SimpleNamespace:
+    """Pyrogram-shaped Message with just the fields the bot reads"""
+    msg = SimpleNamespace(
+        id=msg_id,
+        chat=SimpleNamespace(id=chat_id, username=username, has_protected_content=False),
+        empty=False,
+        service=None,
+        text=None,
+        caption=f"file {msg_id}",
+        has_protected_content=False,
+        message_thread_id=None,
+        reply_to_message_id=None,
+        reply_to_top_message_id=None,
+        media=kind if size else None,
+    )
+    for attr in ("document", "video", "photo", "audio", "animation", "voice", "video_note", "sticker"):
+        setattr(msg, attr, None)
+    if size:
+        ext = "mp4" if kind == "video" else "bin"
+        setattr(msg, kind, _media(kind, size, f"{kind}_{chat_id}_{msg_id}.{ext}", f"u{chat_id}_{msg_id}"))
+    return msg
+
+
+class FakeTelegram:
+    """Shared state: chats -> messages"""
+    def __init__(self, seed: int = 0):
+        self.rng = random.Random(seed)
+        self.chats: Dict[int, Dict[int, SimpleNamespace]] = {}
+        self._next_id: Dict[int, int] = {}
+
+    def add_message(self, chat_id: int, kind: str, size: int) -> SimpleNamespace:
+        msg_id = self._next_id.get(chat_id, 0) + 1
+        self._next_id[chat_id] = msg_id
+        msg = make_message(chat_id, msg_id, kind, size)
+        self.chats.setdefault(chat_id, {})[msg_id] = msg
+        return msg
+
+    def get(self, chat_id: int, msg_id: int) -> SimpleNamespace:
+        msg = self.chats.get(chat_id, {}).get(msg_id)
+        if msg is None:
+            return SimpleNamespace(id=msg_id, empty=True, chat=SimpleNamespace(id=chat_id, username=None))
+        return msg
+
+
+class FakeClient:
+    def __init__(self, world: FakeTelegram, name: str, profile: NetworkProfile, me_id: int,
+                 sleep_threshold: int = 10):
+        self.world = world
+        self.name = name
+        self.profile = profile
+        self.sleep_threshold = sleep_threshold
+        self.me = SimpleNamespace(id=me_id, username=name, first_name=name)
+        self.is_connected = True
+        self.calls: Counter = Counter()
+        self.flood_waits = 0       # FloodWaits hit (slept through or raised)
+        self.flood_raised = 0      # ... of which were raised to the caller
+        self.stops = 0
+        self.bytes = 0
+        self._active = 0
+        self._rng = random.Random(f"{world.rng.random()}-{name}")
+
+    # --- simulation -------------------------------------------------------
+
+    async def _api(self, method: str) -> None:
+        self.calls[method] += 1
+        p = self.profile
+        while True:
+            await asyncio.sleep(max(0.0, p.latency + self._rng.uniform(-p.jitter, p.jitter)))
+            if not p.flood_rate or self._rng.random() >= p.flood_rate:
+                return
+            self.flood_waits += 1
+            if p.flood_seconds > self.sleep_threshold:
+                self.flood_raised += 1
+                raise FloodWait(value=p.flood_seconds)
+            # Pyrogram sleeps through short waits and retries the call
+            await asyncio.sleep(p.flood_seconds)
+
+    async def _transfer(self, size: int, progress, progress_args=()) -> None:
+        self._active += 1
+        try:
+            done = 0
+            while done < size:
+                step = min(self.profile.chunk, size - done)
+                await asyncio.sleep(step * self._active / self.profile.bandwidth)
+                done += step
+                self.bytes += step
+                if progress is not None:
+                    await progress(done, size, *progress_args)
+        finally:
+            self._active -= 1
+
+    @staticmethod
+    def _size_of(msg) -> int:
+        for attr in ("document", "video", "photo", "audio", "animation", "voice"):
+            media = getattr(msg, attr, None)
+            if media:
+                return int(getattr(media, "file_size", 0) or 0)
+        return 0
+
+    @staticmethod
+    def _source_size(src) -> int:
+        if isinstance(src, io.BytesIO):
+            return src.getbuffer().nbytes
+        return os.path.getsize(src) if src and os.path.exists(src) else 0
+
+    # --- Pyrogram API -----------------------------------------------------
+
+    async def start(self):
+        self.is_connected = True
+        return self
+
+    async def stop(self):
+        self.stops += 1
+        self.is_connected = False
+
+    async def disconnect(self):
+        self.is_connected = False
+
+    async def get_me(self):
+        await self._api("get_me")
+        return self.me
+
+    async def get_chat(self, chat_id):
+        await self._api("get_chat")
+        return SimpleNamespace(id=chat_id, username=None, type="channel",
+                               has_protected_content=False, is_forum=False)
+
+    async def get_messages(self, chat_id, message_ids: Union[int, List[int]]):
+        await self._api("get_messages")
+        if isinstance(message_ids, (list, tuple, range)):
+            return [self.world.get(chat_id, mid) for mid in message_ids]
+        return self.world.get(chat_id, message_ids)
+
+    async def download_media(self, message, file_name: Optional[str] = None, in_memory: bool = False,
+                             progress=None, progress_args=()):
+        await self._api("download_media")
+        size = self._size_of(message)
+        await self._transfer(size, progress, progress_args)
+        if in_memory:
+            buffer = io.BytesIO(bytes(size))
+            buffer.name = f"{message.chat.id}_{message.id}"
+            return buffer
+        path = file_name or os.path.join("downloads", f"{message.chat.id}_{message.id}")
+        with open(path, "wb") as f:
+            f.truncate(size)  # sparse: the size is real, the blocks are not
+        return path
+
+    async def _send(self, method: str, chat_id, src, kind: str, progress, progress_args):
+        size = self._source_size(src)
+        await self._api(method)
+        await self._transfer(size, progress, progress_args)
+        return self.world.add_message(chat_id, kind, size)
+
+    async def send_document(self, chat_id, document, progress=None, progress_args=(), **kwargs):
+        return await self._send("send_document", chat_id, document, "document", progress, progress_args)
+
+    async def send_video(self, chat_id, video, progress=None, progress_args=(), **kwargs):
+        return await self._send("send_video", chat_id, video, "video", progress, progress_args)
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        await self._api("copy_message")
+        src = self.world.get(from_chat_id, message_id)
+        kind = next((a for a in ("video", "document") if getattr(src, a, None)), "document")
+        return self.world.add_message(chat_id, kind, self._size_of(src))
+
+    async def forward_messages(self, chat_id, from_chat_id, message_ids, **kwargs):
+        await self._api("forward_messages")
+        ids = message_ids if isinstance(message_ids, (list, tuple)) else [message_ids]
+        out = []
+        for mid in ids:
+            src = self.world.get(from_chat_id, mid)
+            kind = next((a for a in ("video", "document") if getattr(src, a, None)), "document")
+            out.append(self.world.add_message(chat_id, kind, self._size_of(src)))
+        return out if isinstance(message_ids, (list, tuple)) else out[0]
+
+    # --- Telethon API -----------------------------------------------------
+
+    async def send_file(self, entity, file, progress_callback=None, **kwargs):
+        return await self._send("send_file", entity, file, "document", progress_callback, ())
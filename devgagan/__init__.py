@@ -14,6 +14,8 @@ from pyrogram.session import Session
 from pyrogram.storage import MemoryStorage
 import os
 from devgagan.core.download_queue import download_queue
+# Imported before any Mongo client is created so its command listener sees all of them
+from devgagan.core.metrics import metrics
 
 loop = asyncio.new_event_loop()
 asyncio.set_event_loop(loop)
@@ -219,7 +221,15 @@ async def restrict_bot():
 
     # Initialize session pool
     from devgagan.core.session_pool import session_pool
+    from devgagan.core.loop_monitor import loop_monitor
+    from devgagan.core.exporter import exporter
     await session_pool.initialize()
+    session_pool.start_reload_loop()
+    loop_monitor.start()
+    try:
+        await exporter.start()
+    except Exception as e:
+        logging.warning(f"Failed to start metrics exporter: {e}")
     # Reset global free-user download queue to ensure clean state after restart
     try:
         await download_queue.reset()
@@ -236,51 +246,40 @@ async def restrict_bot():
     try:
         from config import LOG_GROUP
         if LOG_GROUP:
+            from devgagan.core.identity_cache import identity_cache
             try:
-                await app.get_chat(LOG_GROUP)
+                await identity_cache.ensure_peer(app, LOG_GROUP)
             except Exception as e:
                 logging.warning(f"Bot failed to warm up LOG_GROUP: {e}")
             # Warm-up on Telethon bot client as well
             try:
-                await sex.get_me()
-                await sex.get_entity(LOG_GROUP)
+                await identity_cache.get_me(sex)
+                await identity_cache.ensure_peer(sex, LOG_GROUP)
             except Exception as e:
                 logging.warning(f"Telethon bot failed to warm up LOG_GROUP: {e}")
 
             if pro:
                 try:
-                    await pro.get_chat(LOG_GROUP)
+                    await identity_cache.ensure_peer(pro, LOG_GROUP)
                 except Exception as e:
                     logging.warning(f"Pro client failed to warm up LOG_GROUP: {e}")
             if userrbot:
                 try:
-                    await userrbot.get_chat(LOG_GROUP)
+                    await identity_cache.ensure_peer(userrbot, LOG_GROUP)
                 except Exception as e:
                     logging.warning(f"Default user session failed to warm up LOG_GROUP: {e}")
 
-            # Pre-warm all admin pool sessions as well (premium-priority, quick tries)
+            # Start every admin pool client concurrently (identity and LOG_GROUP are primed on start)
             try:
-                # Snapshot of known session IDs
-                session_ids = list(session_pool.session_stats.keys())
-                for _ in session_ids:
-                    client, sid = await session_pool.request_session(is_premium=True, timeout=5.0)
-                    if not client or not sid:
-                        continue
-                    try:
-                        await client.get_chat(LOG_GROUP)
-                        logging.info(f"Pre-warmed LOG_GROUP on pool session {sid}")
-                    except Exception as pe:
-                        logging.warning(f"Pool session {sid} failed warm-up: {pe}")
-                    finally:
-                        try:
-                            await session_pool.release_session(sid, had_error=False)
-                        except Exception:
-                            pass
+                report = await session_pool.warm_up()
+                metrics.record_boot("pool_warmup", report.get("seconds", 0.0))
             except Exception as e:
                 logging.warning(f"Error pre-warming pool sessions: {e}")
     except Exception:
         pass
 
+    metrics.record_boot("boot", time.time() - botStartTime)
+
     # Start downloads directory janitor in background (delete files older than 25 minutes)
     async def _downloads_janitor_loop():
         root = os.path.abspath(os.getcwd())
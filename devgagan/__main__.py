@@ -23,11 +23,10 @@ logging.info(f"------------------------------------")
 
 import asyncio
 import importlib
-import gc
 from pyrogram import idle
 from devgagan.modules import ALL_MODULES
-from devgagan.core.mongo.plans_db import check_and_remove_expired_users
-from aiojobs import create_scheduler
+from devgagan.core.mongo.plans_db import premium_expiry_loop
+from devgagan.core.mongo.users_db import user_profile_refresh_loop
 
 # ----------------------------Bot-Start---------------------------- #
 
@@ -55,11 +54,8 @@ except Exception:
 
 # Function to schedule expiry checks
 async def schedule_expiry_check():
-    scheduler = await create_scheduler()
-    while True:
-        await scheduler.spawn(check_and_remove_expired_users())
-        await asyncio.sleep(60)  # Check every hour
-        gc.collect()
+    # Sleeps until the next-earliest plan expiry instead of polling every 60s
+    await premium_expiry_loop()
 
 async def devggn_boot():
     for all_module in ALL_MODULES:
@@ -80,6 +76,8 @@ async def devggn_boot():
 
     asyncio.create_task(schedule_expiry_check())
     print("Auto removal started ...")
+    asyncio.create_task(user_profile_refresh_loop())
+    print("User profile refresh started ...")
     await idle()
     print("Bot stopped...")
 
@@ -0,0 +1,284 @@
+"""
+Resumable broadcast engine used by /gcast and /acast.
+
+- Pages the users collection in `user` order, one short query per chunk (no full list in memory)
+- Sends with bounded concurrency under a shared rate limiter that pauses on FloodWait
+- Edits the progress message on a timer instead of per user
+- Checkpoints the last completed user to MongoDB so a broadcast resumes after restart
+- Records per-user outcomes with bulk writes
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from typing import Awaitable, Callable, Dict, Optional, Tuple
+
+from pyrogram.enums import ParseMode
+from pyrogram.errors import FloodWait
+
+from devgagan.core.mongo.connection import get_collection
+from devgagan.core.mongo.users_db import db as users_collection
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+def _to_float(val: Optional[str], default: float) -> float:
+    try:
+        return float(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+BROADCAST_CONCURRENCY: int = _to_int(os.getenv("BROADCAST_CONCURRENCY"), 8)
+BROADCAST_RATE_PER_SEC: float = _to_float(os.getenv("BROADCAST_RATE_PER_SEC"), 25.0)
+BROADCAST_CHUNK_SIZE: int = _to_int(os.getenv("BROADCAST_CHUNK_SIZE"), 200)
+BROADCAST_PROGRESS_INTERVAL: float = _to_float(os.getenv("BROADCAST_PROGRESS_INTERVAL"), 5.0)
+BROADCAST_MAX_FLOOD_RETRIES: int = _to_int(os.getenv("BROADCAST_MAX_FLOOD_RETRIES"), 3)
+
+jobs_db = get_collection("broadcasts", "jobs")
+outcomes_db = get_collection("broadcasts", "outcomes")
+
+STAT_KEYS = (
+    "success", "failed", "bots", "blocked", "deactivated",
+    "invalid_peers", "flood_waits", "other_errors",
+)
+
+# error_type (as returned by senders) -> stats bucket
+_ERROR_BUCKETS = {
+    "bot": "bots",
+    "blocked": "blocked",
+    "deactivated": "deactivated",
+    "invalid_peer": "invalid_peers",
+    "flood_wait": "flood_waits",
+}
+
+# sender(client, user_id, from_chat_id, message_id) -> (success, error_type, error_msg)
+# FloodWait must propagate so the engine can pause every worker and retry.
+Sender = Callable[[object, int, int, int], Awaitable[Tuple[bool, Optional[str], Optional[str]]]]
+# renderer(stats, processed, total) -> HTML text
+Renderer = Callable[[Dict[str, int], int, int], str]
+
+
+@dataclass
+class BroadcastKind:
+    sender: Sender
+    render_progress: Renderer
+    render_final: Renderer
+
+
+class RateLimiter:
+    """Evenly spaced send slots shared by all workers; FloodWait blocks everyone."""
+
+    def __init__(self, rate_per_sec: float):
+        self.interval = 1.0 / rate_per_sec if rate_per_sec > 0 else 0.0
+        self._next_slot = 0.0
+        self._blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot, self._blocked_until)
+            self._next_slot = slot + self.interval
+        delay = slot - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        until = time.monotonic() + seconds
+        if until > self._blocked_until:
+            self._blocked_until = until
+
+
+class BroadcastEngine:
+    def __init__(self):
+        self._kinds: Dict[str, BroadcastKind] = {}
+        self._running: Dict[str, asyncio.Task] = {}
+        self._indexes_ready = False
+
+    def register_kind(self, kind: str, sender: Sender, render_progress: Renderer, render_final: Renderer) -> None:
+        self._kinds[kind] = BroadcastKind(sender, render_progress, render_final)
+
+    async def _ensure_indexes(self) -> None:
+        if self._indexes_ready:
+            return
+        self._indexes_ready = True
+        try:
+            await outcomes_db.create_index([("job_id", 1), ("user", 1)], unique=True)
+            await jobs_db.create_index("status")
+        except Exception as e:
+            print(f"⚠️ Warning: Could not create broadcast indexes: {e}")
+
+    async def start(self, client, kind: str, from_chat_id: int, message_id: int,
+                    progress_chat_id: int, progress_msg_id: int) -> Dict[str, int]:
+        """Create a checkpointed job and run it to completion. Returns the final stats."""
+        await self._ensure_indexes()
+        total = await users_collection.count_documents({"user": {"$gt": 0}})
+        job_id = f"{kind}-{int(time.time() * 1000)}"
+        job = {
+            "_id": job_id,
+            "kind": kind,
+            "from_chat_id": from_chat_id,
+            "message_id": message_id,
+            "progress_chat_id": progress_chat_id,
+            "progress_msg_id": progress_msg_id,
+            "status": "running",
+            "last_user": 0,
+            "processed": 0,
+            "total": total,
+            "stats": {k: 0 for k in STAT_KEYS},
+            "created_at": time.time(),
+            "updated_at": time.time(),
+        }
+        await jobs_db.insert_one(job)
+        self._running[job_id] = asyncio.current_task()
+        print(f"📢 Starting {kind} broadcast {job_id} to {total} users")
+        return await self._run(client, job)
+
+    async def resume_pending(self, client) -> int:
+        """Resume broadcasts that were interrupted by a restart."""
+        await self._ensure_indexes()
+        resumed = 0
+        async for job in jobs_db.find({"status": "running"}):
+            if job["_id"] in self._running or job.get("kind") not in self._kinds:
+                continue
+            print(f"🔁 Resuming broadcast {job['_id']} from user {job.get('last_user', 0)}")
+            task = asyncio.create_task(self._run(client, job, resumed=True))
+            self._running[job["_id"]] = task
+            resumed += 1
+        return resumed
+
+    async def _edit_progress(self, client, job: dict, text: str) -> None:
+        try:
+            await client.edit_message_text(
+                chat_id=job["progress_chat_id"],
+                message_id=job["progress_msg_id"],
+                text=text,
+                parse_mode=ParseMode.HTML,
+            )
+        except Exception:
+            pass  # Ignore edit errors (deleted message, same content, flood)
+
+    async def _deliver(self, client, spec: BroadcastKind, limiter: RateLimiter,
+                       job: dict, user_id: int) -> Tuple[str, Optional[str]]:
+        """Send to one user, honouring FloodWait. Returns (error_type or 'ok', error_msg)."""
+        for _ in range(BROADCAST_MAX_FLOOD_RETRIES + 1):
+            await limiter.acquire()
+            try:
+                success, error_type, error_msg = await spec.sender(
+                    client, user_id, job["from_chat_id"], job["message_id"]
+                )
+                return ("ok", None) if success else (error_type or "unknown", error_msg)
+            except FloodWait as fw:
+                wait = int(getattr(fw, "value", 0) or 0) + 1
+                print(f"⏳ Broadcast FloodWait: pausing all senders for {wait}s")
+                limiter.pause(wait)
+            except Exception as e:
+                return "unknown", str(e)[:200]
+        return "flood_wait", "FloodWait retries exhausted"
+
+    async def _run(self, client, job: dict, resumed: bool = False) -> Dict[str, int]:
+        spec = self._kinds[job["kind"]]
+        job_id = job["_id"]
+        stats = {k: int(job.get("stats", {}).get(k, 0)) for k in STAT_KEYS}
+        processed = int(job.get("processed", 0))
+        total = max(int(job.get("total", 0)), processed)
+        last_user = int(job.get("last_user", 0))
+        limiter = RateLimiter(BROADCAST_RATE_PER_SEC)
+        sem = asyncio.Semaphore(max(1, BROADCAST_CONCURRENCY))
+        last_edit = 0.0
+
+        def count(outcome: str) -> None:
+            if outcome == "ok":
+                stats["success"] += 1
+            else:
+                stats["failed"] += 1
+                stats[_ERROR_BUCKETS.get(outcome, "other_errors")] += 1
+
+        async def worker(uid: int):
+            async with sem:
+                outcome, error_msg = await self._deliver(client, spec, limiter, job, uid)
+            count(outcome)
+            if outcome not in ("ok", "bot", "invalid_peer", "blocked", "deactivated"):
+                print(f"⚠️ Broadcast error: {error_msg}")
+            # Record right away: a restart mid-chunk must find this user on resume
+            try:
+                await outcomes_db.update_one(
+                    {"job_id": job_id, "user": uid},
+                    {"$set": {"job_id": job_id, "user": uid, "outcome": outcome, "error": error_msg}},
+                    upsert=True,
+                )
+            except Exception as e:
+                print(f"⚠️ Broadcast outcome write failed: {e}")
+
+        first_chunk = True
+
+        async def next_chunk():
+            # A fresh query per chunk: no server cursor is held across sends or FloodWait pauses
+            docs = await users_collection.find(
+                {"user": {"$gt": last_user}}, {"user": 1}
+            ).sort("user", 1).limit(BROADCAST_CHUNK_SIZE).to_list(BROADCAST_CHUNK_SIZE)
+            if not docs:
+                return None, None
+            ids = [int(d["user"]) for d in docs if d.get("user") and str(d["user"]).isdigit()]
+            return ids, docs[-1]["user"]
+
+        async def flush(chunk_ids, chunk_last):
+            nonlocal processed, last_user, last_edit, first_chunk
+            ids = chunk_ids
+            if resumed and first_chunk:
+                # The chunk in flight at restart may be partly done: skip recorded users
+                # (their outcomes were written but not yet checkpointed into stats)
+                done = set()
+                async for o in outcomes_db.find({"job_id": job_id, "user": {"$in": ids}}, {"user": 1, "outcome": 1}):
+                    done.add(o["user"])
+                    count(o.get("outcome") or "unknown")
+                processed += len(done)
+                ids = [u for u in ids if u not in done]
+            first_chunk = False
+
+            await asyncio.gather(*(worker(uid) for uid in ids))
+            processed += len(ids)
+            last_user = chunk_last
+
+            try:
+                await jobs_db.update_one({"_id": job_id}, {"$set": {
+                    "last_user": last_user,
+                    "processed": processed,
+                    "stats": stats,
+                    "updated_at": time.time(),
+                }})
+            except Exception as e:
+                print(f"⚠️ Broadcast checkpoint failed: {e}")
+
+            now = time.monotonic()
+            if now - last_edit >= BROADCAST_PROGRESS_INTERVAL:
+                last_edit = now
+                await self._edit_progress(client, job, spec.render_progress(stats, processed, max(total, processed)))
+
+        try:
+            while True:
+                chunk, chunk_last = await next_chunk()
+                if chunk is None:
+                    break
+                await flush(chunk, chunk_last)
+
+            total = max(total, processed)
+            await jobs_db.update_one({"_id": job_id}, {"$set": {
+                "status": "completed", "total": total, "finished_at": time.time(),
+            }})
+            await self._edit_progress(client, job, spec.render_final(stats, processed, total))
+            print(f"📢 Broadcast {job_id} completed: {stats['success']}/{total} successful")
+            return stats
+        finally:
+            self._running.pop(job_id, None)
+
+
+# Global instance
+broadcast_engine = BroadcastEngine()
@@ -1,23 +1,117 @@
-from typing import Set
-from asyncio import Lock
+"""
+Per-user cancellation.
+
+Each user has a CancelToken (an asyncio.Event plus a generation counter)
+that polling code checks without taking a lock, and a registry of the
+transfer tasks started through CancelManager.run. cancel() sets the token
+and cancels those tasks directly, so a running download/upload stops at its
+next await instead of at the next progress callback; session permits, queue
+slots and partial files are released by the tasks' own finally handlers.
+"""
+
+import asyncio
+from dataclasses import dataclass, field
+from typing import Awaitable, Dict, Optional, Set, TypeVar
+
+T = TypeVar("T")
+
+
+class OperationCancelled(Exception):
+    """Raised by CancelManager.run when the user cancelled the operation"""
+
+
+@dataclass
+class CancelToken:
+    user_id: int
+    event: asyncio.Event = field(default_factory=asyncio.Event)
+    generation: int = 0  # bumped on every cancel(), survives clear()
+
+    @property
+    def cancelled(self) -> bool:
+        return self.event.is_set()
+
+    def raise_if_cancelled(self) -> None:
+        if self.event.is_set():
+            raise OperationCancelled(f"Canceled by user {self.user_id}")
+
 
 class CancelManager:
-    """Simple per-user cancel flag manager."""
+    """Per-user cancel flags and running transfer tasks."""
     def __init__(self) -> None:
-        self._cancelled: Set[int] = set()
-        self._lock = Lock()
+        self._tokens: Dict[int, CancelToken] = {}
+        self._tasks: Dict[int, Set[asyncio.Task]] = {}
+
+    def token(self, user_id: int) -> CancelToken:
+        tok = self._tokens.get(user_id)
+        if tok is None:
+            tok = CancelToken(user_id=user_id)
+            self._tokens[user_id] = tok
+        return tok
+
+    def cancelled(self, user_id: int) -> bool:
+        """Lock-free check, safe to call from progress callbacks"""
+        tok = self._tokens.get(user_id)
+        return tok is not None and tok.event.is_set()
 
-    async def cancel(self, user_id: int) -> None:
-        async with self._lock:
-            self._cancelled.add(user_id)
+    async def cancel(self, user_id: int) -> int:
+        """Set the user's flag and interrupt their running transfers; returns how many were interrupted"""
+        tok = self.token(user_id)
+        tok.generation += 1
+        tok.event.set()
+        current = asyncio.current_task()
+        tasks = [t for t in self._tasks.get(user_id, ()) if not t.done() and t is not current]
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            print(f"🚫 CANCEL: interrupted {len(tasks)} running transfer(s) for user {user_id}")
+        return len(tasks)
 
     async def clear(self, user_id: int) -> None:
-        async with self._lock:
-            self._cancelled.discard(user_id)
+        tok = self._tokens.get(user_id)
+        if tok is not None:
+            tok.event.clear()
 
     async def is_cancelled(self, user_id: int) -> bool:
-        async with self._lock:
-            return user_id in self._cancelled
+        return self.cancelled(user_id)
+
+    def active(self, user_id: int) -> int:
+        return sum(1 for t in self._tasks.get(user_id, ()) if not t.done())
+
+    async def run(self, user_id: int, coro: Awaitable[T], generation: Optional[int] = None) -> T:
+        """Run coro as a cancellable transfer task of user_id.
+
+        Raises OperationCancelled when cancel(user_id) was called while it ran
+        (even if the coroutine swallowed the CancelledError itself). If the
+        caller is cancelled instead, the transfer is cancelled with it.
+        Pass the token generation read when the job was queued so that a
+        cancel() sent while it waited also counts; coro is then not started.
+        """
+        tok = self.token(user_id)
+        if generation is None:
+            generation = tok.generation
+        elif tok.generation != generation:
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise OperationCancelled(f"Canceled by user {user_id}")
+        task = asyncio.ensure_future(coro)
+        tasks = self._tasks.setdefault(user_id, set())
+        tasks.add(task)
+        try:
+            # wait() does not cancel the task when it returns, only when we are cancelled
+            await asyncio.wait({task})
+        except asyncio.CancelledError:
+            task.cancel()
+            raise
+        finally:
+            tasks.discard(task)
+            if not tasks and self._tasks.get(user_id) is tasks:
+                self._tasks.pop(user_id, None)
+        if task.cancelled() or tok.generation != generation:
+            if not task.cancelled():
+                task.exception()  # retrieved: the cancel may have surfaced as another error
+            raise OperationCancelled(f"Canceled by user {user_id}")
+        return task.result()
+
 
 # Singleton instance
 cancel_manager = CancelManager()
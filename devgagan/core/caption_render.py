@@ -0,0 +1,89 @@
+"""
+Markdown -> Telegram HTML rendering used by CaptionFormatter.
+
+The patterns are compiled once at import, text without any markdown marker
+characters is returned untouched, and results for strings up to
+MARKDOWN_CACHE_MAX_LEN are memoised in an LRU (status texts and batch captions
+repeat constantly). Progress messages are built as HTML directly and do not go
+through here at all.
+
+This module only depends on the standard library so benchmarks/ can load it
+without starting the bot.
+"""
+
+import os
+import re
+from functools import lru_cache
+from typing import Optional
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+MARKDOWN_CACHE_SIZE: int = _to_int(os.getenv("MARKDOWN_CACHE_SIZE"), 1024)
+# Longer strings are rendered but not memoised
+MARKDOWN_CACHE_MAX_LEN: int = _to_int(os.getenv("MARKDOWN_CACHE_MAX_LEN"), 4096)
+
+# Pre-rendered status texts
+PREPARING_DOWNLOAD_HTML = "📥 <b>Preparing...</b>"
+PREPARING_UPLOAD_HTML = "📤 <b>Preparing...</b>"
+
+# Links are handled first (non-greedy) so other rules cannot break long embedded links
+_LINK_RE = re.compile(r'\[(.*?)\]\((https?://[^\s\)]+|tg://[^\s\)]+|www\.[^\s\)]+)\)', re.DOTALL)
+
+_RULES = tuple(
+    (re.compile(pattern, re.MULTILINE | re.DOTALL), replacement)
+    for pattern, replacement in (
+        (r"```([a-zA-Z0-9_+\-.]+)\n([\s\S]*?)```", r"<pre language=\"\1\">\2</pre>"),
+        (r"```([\s\S]*?)```", r"<pre>\1</pre>"),
+        (r"^>>> (.*)", r"<blockquote expandable>\1</blockquote>"),
+        (r"^>> (.*)", r"<blockquote expandable>\1</blockquote>"),
+        (r"^> (.*)", r"<blockquote>\1</blockquote>"),
+        (r"(?<!`)`([^`\n]+)`(?!`)", r"<code>\1</code>"),
+        (r"\*\*(.+?)\*\*", r"<b>\1</b>"),
+        (r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<i>\1</i>"),
+        (r"__(.+?)__", r"<u>\1</u>"),
+        (r"_(.+?)_", r"<i>\1</i>"),
+        (r"~~(.+?)~~", r"<s>\1</s>"),
+        (r"\|\|(.+?)\|\|", r"<tg-spoiler>\1</tg-spoiler>"),
+    )
+)
+
+# Every rule above needs at least one of these characters
+_MARKER_RE = re.compile(r"[\[`>*_~|]")
+
+
+def _link_replacer(match) -> str:
+    text, url = match.groups()
+    if url.startswith('www.'):
+        url = 'http://' + url
+    return f'<a href="{url}">{text}</a>'
+
+
+def _render(text: str) -> str:
+    if not _MARKER_RE.search(text):
+        return text.strip()
+    result = _LINK_RE.sub(_link_replacer, text)
+    for pattern, replacement in _RULES:
+        result = pattern.sub(replacement, result)
+    return result.strip()
+
+
+_render_cached = lru_cache(maxsize=MARKDOWN_CACHE_SIZE)(_render)
+
+
+def render_markdown(text: str) -> str:
+    """Convert markdown formatting to Telegram HTML"""
+    if not text:
+        return ""
+    if len(text) > MARKDOWN_CACHE_MAX_LEN:
+        return _render(text)
+    return _render_cached(text)
+
+
+def cache_info():
+    return _render_cached.cache_info()
@@ -9,10 +9,11 @@ import asyncio
 import shutil
 import glob
 from pathlib import Path
-from typing import List, Dict, Set, Optional
+from typing import List, Dict, Set, Optional, Tuple
 import psutil
 import gc
 from datetime import datetime, timedelta
+from devgagan.core.disk_budget import disk_budget
 
 class FileCleanupManager:
     """Manages cleanup of downloaded files, thumbnails, and temporary files"""
@@ -201,6 +202,7 @@ class FileCleanupManager:
             os.path.join(self.downloads_dir, "thumb_*.jpg"),
             os.path.join(self.downloads_dir, "*.tmp"),
             os.path.join(self.downloads_dir, "temp_*"),
+            os.path.join(self.downloads_dir, "*.reserve"),
             os.path.join(self.thumbnails_dir, "*.tmp"),
         ]
         
@@ -263,6 +265,7 @@ class FileCleanupManager:
                     return False
                     
                 await asyncio.to_thread(os.remove, file_path)
+                disk_budget.release(file_path)
                 return True
         except Exception as e:
             print(f"❌ Error removing file {file_path}: {e}")
@@ -279,31 +282,32 @@ class FileCleanupManager:
         except (IOError, OSError):
             return True
             
-    def get_cleanup_stats(self) -> Dict:
+    @staticmethod
+    def _scan_dir(directory: str) -> Tuple[int, int]:
+        """(file count, total bytes) of the regular files directly in directory"""
+        count = 0
+        size = 0
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            count += 1
+                            size += entry.stat(follow_symlinks=False).st_size
+                    except OSError:
+                        pass
+        except OSError:
+            pass
+        return count, size
+
+    async def get_cleanup_stats(self) -> Dict:
         """Get current cleanup statistics"""
         total_temp_files = sum(len(files) for files in self.temp_files.values())
         
-        downloads_size = 0
-        downloads_count = 0
-        if os.path.exists(self.downloads_dir):
-            for file_path in glob.glob(os.path.join(self.downloads_dir, "*")):
-                if os.path.isfile(file_path):
-                    downloads_count += 1
-                    try:
-                        downloads_size += os.path.getsize(file_path)
-                    except:
-                        pass
-                        
-        thumbnails_size = 0
-        thumbnails_count = 0
-        if os.path.exists(self.thumbnails_dir):
-            for file_path in glob.glob(os.path.join(self.thumbnails_dir, "*")):
-                if os.path.isfile(file_path):
-                    thumbnails_count += 1
-                    try:
-                        thumbnails_size += os.path.getsize(file_path)
-                    except:
-                        pass
+        # Files actually on disk (orphans from a crash included), scanned off the event loop
+        downloads_count, downloads_size = await asyncio.to_thread(self._scan_dir, self.downloads_dir)
+        thumbnails_count, thumbnails_size = await asyncio.to_thread(self._scan_dir, self.thumbnails_dir)
+        budget = disk_budget.stats()
         
         return {
             "tracked_temp_files": total_temp_files,
@@ -314,6 +318,10 @@ class FileCleanupManager:
             "thumbnails_size_mb": thumbnails_size / (1024 * 1024),
             "total_files": downloads_count + thumbnails_count,
             "total_size_mb": (downloads_size + thumbnails_size) / (1024 * 1024),
+            "disk_budget_reservations": budget["reservations"],
+            "disk_budget_reserved_mb": budget["reserved_mb"],
+            "disk_budget_watermark_mb": budget["watermark_mb"],
+            "disk_budget_waiting": budget["waiting"],
             "linked_thumbnails": len(self.thumbnail_links),
             "videos_with_thumbnails": len(self.video_thumbnails)
         }
@@ -448,9 +456,9 @@ class ComprehensiveCleanupManager:
             "memory_results": memory_results
         }
         
-    def get_comprehensive_stats(self) -> Dict:
+    async def get_comprehensive_stats(self) -> Dict:
         """Get comprehensive cleanup statistics"""
-        file_stats = self.file_cleanup.get_cleanup_stats()
+        file_stats = await self.file_cleanup.get_cleanup_stats()
         memory_stats = self.memory_cleanup.get_memory_stats()
         
         return {
@@ -7,6 +7,7 @@ import os
 import time
 from typing import Optional, Dict, Any, Tuple
 from devgagan.core.mongo.file_hash_db import file_hash_manager
+from devgagan.core.memory_budget import is_buffer, source_exists, source_name, source_size
 from devgagan import app
 
 class DeduplicationManager:
@@ -74,11 +75,11 @@ class DeduplicationManager:
         Returns:
             Dictionary with existing file info if duplicate found, None otherwise
         """
-        if not self.enabled or not os.path.exists(file_path):
+        if not self.enabled or not source_exists(file_path):
             return None
             
         try:
-            file_size = os.path.getsize(file_path)
+            file_size = source_size(file_path)
             
             # Check by file hash (most accurate)
             existing_file = await file_hash_manager.check_file_exists(file_path=file_path)
@@ -125,7 +126,9 @@ class DeduplicationManager:
                 self.stats["duplicates_forwarded"] += 1
                 
                 # Clean up the duplicate downloaded file if it exists
-                if original_file_path and os.path.exists(original_file_path):
+                if original_file_path and is_buffer(original_file_path):
+                    original_file_path.close()
+                elif original_file_path and os.path.exists(original_file_path):
                     try:
                         os.remove(original_file_path)
                         print(f"🧹 Cleaned up duplicate downloaded file: {os.path.basename(original_file_path)}")
@@ -179,7 +182,7 @@ class DeduplicationManager:
             )
             
             if success:
-                print(f"💾 Stored file hash for future deduplication: {os.path.basename(file_path)}")
+                print(f"💾 Stored file hash for future deduplication: {source_name(file_path)}")
             
             return success
             
@@ -0,0 +1,197 @@
+"""
+Disk budget admission control for downloads.
+
+Before a download starts its expected size (the media's file_size) is reserved.
+Where the filesystem supports it the reservation is backed by a preallocated
+placeholder file (posix_fallocate) that is shrunk as bytes arrive, so other
+writers cannot take the space mid-transfer. Transfers that would push the
+reserved total past the watermark, or leave less than DISK_MIN_FREE_MB free,
+wait until earlier reservations are released.
+
+The reserved byte count is maintained incrementally, so stats never need to
+scan the downloads directory.
+"""
+
+import asyncio
+import os
+import shutil
+import time
+from dataclasses import dataclass, field
+from typing import Awaitable, Callable, Dict, Optional
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+# Max bytes reserved by in-flight downloads (0 = derive from DISK_BUDGET_PERCENT of the volume)
+DISK_BUDGET_MB: int = _to_int(os.getenv("DISK_BUDGET_MB"), 0)
+DISK_BUDGET_PERCENT: int = _to_int(os.getenv("DISK_BUDGET_PERCENT"), 80)
+# Always keep at least this much free on the volume
+DISK_MIN_FREE_MB: int = _to_int(os.getenv("DISK_MIN_FREE_MB"), 1024)
+# How long a download may wait for budget before failing
+DISK_WAIT_TIMEOUT: int = _to_int(os.getenv("DISK_WAIT_TIMEOUT"), 900)
+# Shrink the placeholder once at least this many bytes have landed
+_SHRINK_STEP = 8 * 1024 * 1024
+
+
+class DiskBudgetExceeded(Exception):
+    """Raised when a download cannot be admitted within DISK_WAIT_TIMEOUT."""
+
+
+@dataclass
+class Reservation:
+    key: str
+    size: int
+    placeholder: Optional[str] = None
+    preallocated: bool = False
+    released_to_disk: int = 0  # bytes given back from the placeholder so far
+    created_at: float = field(default_factory=time.time)
+
+    def progress(self, current: int) -> None:
+        """Hand placeholder space back as the real file grows (call from progress callbacks)."""
+        if not self.placeholder or not self.preallocated:
+            return
+        if current - self.released_to_disk < _SHRINK_STEP:
+            return
+        try:
+            remaining = max(self.size - current, 0)
+            os.truncate(self.placeholder, remaining)
+            self.released_to_disk = current
+        except Exception:
+            pass
+
+
+class DiskBudget:
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(self.directory, exist_ok=True)
+        self._reservations: Dict[str, Reservation] = {}
+        self._reserved_bytes = 0
+        self._cond: Optional[asyncio.Condition] = None
+        self.waiting = 0
+
+    @property
+    def reserved_bytes(self) -> int:
+        return self._reserved_bytes
+
+    def _watermark(self) -> int:
+        if DISK_BUDGET_MB > 0:
+            return DISK_BUDGET_MB * 1024 * 1024
+        try:
+            return int(shutil.disk_usage(self.directory).total * DISK_BUDGET_PERCENT / 100)
+        except Exception:
+            return 1 << 62
+
+    def _free_bytes(self) -> int:
+        try:
+            free = shutil.disk_usage(self.directory).free
+        except Exception:
+            return 1 << 62
+        # Reservations without a preallocated placeholder have not claimed their space yet
+        pending = sum(r.size for r in self._reservations.values() if not r.preallocated)
+        return free - pending
+
+    def _fits(self, size: int) -> bool:
+        if self._reserved_bytes + size > self._watermark():
+            # A single oversized transfer is admitted when nothing else is reserved
+            if self._reservations:
+                return False
+        return self._free_bytes() - size >= DISK_MIN_FREE_MB * 1024 * 1024
+
+    def _preallocate(self, res: Reservation) -> None:
+        if not hasattr(os, "posix_fallocate") or res.size <= 0:
+            return
+        placeholder = f"{res.key}.reserve"
+        try:
+            fd = os.open(placeholder, os.O_CREAT | os.O_WRONLY, 0o600)
+            try:
+                os.posix_fallocate(fd, 0, res.size)
+            finally:
+                os.close(fd)
+            res.placeholder = placeholder
+            res.preallocated = True
+        except Exception:
+            # Unsupported filesystem (or ENOSPC race) - fall back to accounting only
+            try:
+                os.remove(placeholder)
+            except Exception:
+                pass
+
+    async def reserve(self, key: str, size: int,
+                      cancel_check: Optional[Callable[[], Awaitable[bool]]] = None) -> Reservation:
+        """Wait until `size` bytes fit in the budget, then reserve them under `key`.
+
+        A reservation already held under `key` (a retried download of the same
+        target) is released first, so its bytes are never counted twice.
+        """
+        size = max(int(size or 0), 0)
+        self.release(key)
+        if self._cond is None:
+            self._cond = asyncio.Condition()
+        deadline = time.monotonic() + DISK_WAIT_TIMEOUT
+        async with self._cond:
+            self.waiting += 1
+            try:
+                while not self._fits(size):
+                    if cancel_check is not None:
+                        try:
+                            if await cancel_check():
+                                raise asyncio.CancelledError("download canceled while waiting for disk")
+                        except asyncio.CancelledError:
+                            raise
+                        except Exception:
+                            pass
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise DiskBudgetExceeded(
+                            f"Not enough disk space for {size / (1024 * 1024):.1f} MB, please try again later"
+                        )
+                    try:
+                        # Re-check periodically too: other processes can free space
+                        await asyncio.wait_for(self._cond.wait(), timeout=min(5.0, remaining))
+                    except asyncio.TimeoutError:
+                        pass
+            finally:
+                self.waiting -= 1
+            res = Reservation(key=key, size=size)
+            self.release(key)  # a concurrent reserve() of the same key got in while we waited
+            self._reservations[key] = res
+            self._reserved_bytes += size
+        await asyncio.to_thread(self._preallocate, res)
+        return res
+
+    def release(self, key: Optional[str]) -> None:
+        """Drop a reservation (no-op for unknown keys) and wake waiting downloads."""
+        if not key:
+            return
+        res = self._reservations.pop(key, None)
+        if res is None:
+            return
+        self._reserved_bytes -= res.size
+        if res.placeholder:
+            try:
+                os.remove(res.placeholder)
+            except Exception:
+                pass
+        if self._cond is not None:
+            asyncio.ensure_future(self._notify())
+
+    async def _notify(self) -> None:
+        async with self._cond:
+            self._cond.notify_all()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "reservations": len(self._reservations),
+            "reserved_mb": self._reserved_bytes / (1024 * 1024),
+            "watermark_mb": self._watermark() / (1024 * 1024),
+            "waiting": self.waiting,
+        }
+
+
+# Global instance (downloads/ relative to the working directory, like the cleanup manager)
+disk_budget = DiskBudget(os.path.join(os.getcwd(), "downloads"))
@@ -0,0 +1,200 @@
+"""
+Prometheus exporter.
+
+Serves GET /metrics (text exposition format 0.0.4) on METRICS_EXPORTER_HOST:
+METRICS_EXPORTER_PORT with aiohttp. Everything is read from in-process
+state on each scrape - metrics registry, session pool, request/download
+queues, disk and memory budgets, Mongo command listener and loop monitor -
+so a scrape makes no Telegram or database calls. Set METRICS_EXPORTER_PORT=0
+to disable.
+"""
+
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from aiohttp import web
+
+from devgagan.core.metrics import metrics, mongo_commands, Histogram
+from devgagan.core.session_pool import session_pool, ALL_METHODS
+from devgagan.core.request_queue import request_dispatcher
+from devgagan.core.download_queue import download_queue
+from devgagan.core.disk_budget import disk_budget
+from devgagan.core.memory_budget import memory_budget
+from devgagan.core.loop_monitor import loop_monitor
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+METRICS_EXPORTER_HOST: str = os.getenv("METRICS_EXPORTER_HOST", "127.0.0.1")
+METRICS_EXPORTER_PORT: int = _to_int(os.getenv("METRICS_EXPORTER_PORT"), 9108)
+
+Labels = Dict[str, object]
+
+
+def _escape(value: object) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _fmt_labels(labels: Optional[Labels]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+def _fmt_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Exposition:
+    def __init__(self):
+        self.lines: List[str] = []
+
+    def _header(self, name: str, kind: str, help_text: str) -> None:
+        self.lines.append(f"# HELP {name} {help_text}")
+        self.lines.append(f"# TYPE {name} {kind}")
+
+    def metric(self, name: str, kind: str, help_text: str, samples: Iterable[Tuple[Optional[Labels], float]]) -> None:
+        self._header(name, kind, help_text)
+        for labels, value in samples:
+            self.lines.append(f"{name}{_fmt_labels(labels)} {_fmt_value(value)}")
+
+    def histogram(self, name: str, help_text: str, series: Iterable[Tuple[Optional[Labels], Histogram]]) -> None:
+        self._header(name, "histogram", help_text)
+        for labels, hist in series:
+            labels = dict(labels or {})
+            cumulative = 0
+            for bound, count in zip(list(hist.bounds) + [float("inf")], hist.counts):
+                cumulative += count
+                self.lines.append(f"{name}_bucket{_fmt_labels({**labels, 'le': _fmt_value(bound)})} {cumulative}")
+            self.lines.append(f"{name}_sum{_fmt_labels(labels)} {_fmt_value(float(hist.total))}")
+            self.lines.append(f"{name}_count{_fmt_labels(labels)} {hist.n}")
+
+    def text(self) -> str:
+        return "\n".join(self.lines) + "\n"
+
+
+def render() -> str:
+    out = _Exposition()
+
+    # Transfers
+    out.metric("rb_tasks_running", "gauge", "Transfer tasks in progress",
+               (({"kind": kind}, n) for kind, n in metrics.running_by_kind().items()))
+    series = metrics.histograms()
+    out.metric("rb_tasks_finished_total", "counter", "Finished transfer tasks",
+               (({"tier": tier, "status": status}, n)
+                for tier, s in series["tier"].items() for status, n in s.statuses.items()))
+    out.histogram("rb_task_duration_seconds", "Transfer task duration",
+                  (({"tier": tier}, s.duration) for tier, s in series["tier"].items()))
+    out.metric("rb_transfer_bytes_total", "counter", "Bytes of finished transfers per session",
+               (({"session": sid}, int(s.size.total)) for sid, s in series["session"].items()))
+    out.histogram("rb_transfer_throughput_bytes_per_second", "Per-task transfer throughput per session",
+                  (({"session": sid}, s.throughput) for sid, s in series["session"].items()))
+
+    # Queues
+    depth, waits = metrics.queues()
+    out.metric("rb_queue_depth", "gauge", "Requests waiting in a queue",
+               (({"queue": q, "tier": tier}, n) for (q, tier), n in depth.items()))
+    out.histogram("rb_queue_wait_seconds", "Time spent waiting in a queue",
+                  (({"queue": q, "tier": tier}, h) for (q, tier), h in waits.items()))
+    out.metric("rb_free_queue_running", "gauge", "Free-tier downloads holding a global slot",
+               [(None, download_queue.running)])
+    out.metric("rb_free_queue_capacity", "gauge", "Free-tier global download slots",
+               [(None, download_queue.capacity)])
+    queues = request_dispatcher.stats()
+    out.metric("rb_request_queue_depth", "gauge", "Telegram API calls queued per session",
+               (({"session": name}, q["queued"]) for name, q in queues.items()))
+    out.metric("rb_request_queue_interval_seconds", "gauge", "Adaptive spacing between API calls per session",
+               (({"session": name}, q["interval"]) for name, q in queues.items()))
+
+    # Session pool
+    permits = []
+    blocked = []
+    for sid, sem in session_pool.session_permits.items():
+        value = getattr(sem, "_value", None)
+        if isinstance(value, int):
+            permits.append(({"session": sid}, session_pool.session_concurrency - value))
+        stats = session_pool.session_stats.get(sid)
+        if stats is not None:
+            for cls in stats.blocked_until:
+                blocked.append(({"session": sid, "method": cls}, round(stats.blocked_for(cls), 1)))
+    out.metric("rb_pool_permits_in_use", "gauge", "Pool permits held per session", permits)
+    out.metric("rb_pool_permits_per_session", "gauge", "Pool permits per session",
+               [(None, session_pool.session_concurrency)])
+    out.metric("rb_pool_waiters", "gauge", "Requests waiting for a pool session",
+               (({"tier": tier}, n) for tier, n in session_pool.waiter_counts().items()))
+    out.metric("rb_pool_blocked_seconds", "gauge", "Remaining FloodWait/cooldown block per session and method",
+               blocked)
+    floods = dict(session_pool.flood_waits)
+    floods["request"] = sum(q["flood_waits"] for q in queues.values())
+    out.metric("rb_floodwait_total", "counter", "FloodWaits seen, by method class",
+               (({"method": "all" if m == ALL_METHODS else m}, n) for m, n in floods.items()))
+
+    # Mongo
+    out.histogram("rb_mongo_command_seconds", "Mongo command latency",
+                  (({"command": name}, h) for name, h in list(mongo_commands.latency.items())))
+    out.metric("rb_mongo_command_failures_total", "counter", "Failed Mongo commands",
+               (({"command": name}, n) for name, n in list(mongo_commands.failures.items())))
+    out.metric("rb_metrics_pending_writes", "gauge", "Metrics documents waiting for the bulk flush",
+               [(None, metrics.pending_writes)])
+
+    # Event loop
+    lag = loop_monitor.stats()
+    out.metric("rb_event_loop_lag_seconds", "gauge", "Last measured event-loop lag", [(None, lag["lag"])])
+    out.metric("rb_event_loop_lag_max_seconds", "gauge", "Largest event-loop lag since start", [(None, lag["max_lag"])])
+    out.histogram("rb_event_loop_lag_sample_seconds", "Event-loop lag samples", [(None, loop_monitor.histogram)])
+
+    # Disk and memory
+    try:
+        usage = shutil.disk_usage(disk_budget.directory)
+        out.metric("rb_disk_total_bytes", "gauge", "Size of the downloads filesystem", [(None, usage.total)])
+        out.metric("rb_disk_free_bytes", "gauge", "Free space on the downloads filesystem", [(None, usage.free)])
+    except Exception:
+        pass
+    out.metric("rb_disk_reserved_bytes", "gauge", "Disk bytes reserved by running downloads",
+               [(None, disk_budget.reserved_bytes)])
+    out.metric("rb_disk_waiting", "gauge", "Downloads waiting for disk budget", [(None, disk_budget.waiting)])
+    out.metric("rb_memory_reserved_bytes", "gauge", "Bytes reserved for in-memory transfers",
+               [(None, memory_budget.reserved_bytes)])
+    return out.text()
+
+
+class PrometheusExporter:
+    def __init__(self):
+        self._runner: Optional[web.AppRunner] = None
+
+    async def _handle(self, request: web.Request) -> web.Response:
+        return web.Response(text=render(), content_type="text/plain", charset="utf-8",
+                            headers={"X-Content-Type-Options": "nosniff"})
+
+    async def start(self) -> None:
+        if self._runner is not None or METRICS_EXPORTER_PORT <= 0:
+            return
+        app = web.Application()
+        app.router.add_get("/metrics", self._handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        try:
+            await web.TCPSite(runner, METRICS_EXPORTER_HOST, METRICS_EXPORTER_PORT).start()
+        except OSError as e:
+            await runner.cleanup()
+            print(f"⚠️ METRICS EXPORTER: could not bind {METRICS_EXPORTER_HOST}:{METRICS_EXPORTER_PORT}: {e}")
+            return
+        self._runner = runner
+        print(f"📈 METRICS EXPORTER: serving http://{METRICS_EXPORTER_HOST}:{METRICS_EXPORTER_PORT}/metrics")
+
+    async def stop(self) -> None:
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+
+# Global instance
+exporter = PrometheusExporter()
@@ -34,57 +34,84 @@ async def gen_link(app, chat_id):
        # Bot might not be admin or channel id invalid/not cached yet
        return None
 
-async def subscribe(app, message):
-   """Enhanced subscription system - requires joining both main channel and AlienxSaver channel"""
-   user_id = message.from_user.id
-   
-   # Main channel (existing configuration)
+# Force-join membership cache: user_id -> {channel: (state, expires_at)}
+# state is "joined", "left", "banned" or "unknown" (could not verify -> allowed).
+# Invalidated by ChatMemberUpdated for the channels and by "Verify Membership".
+MEMBERSHIP_CACHE_TTL = int(os.getenv("MEMBERSHIP_CACHE_TTL", "900"))
+MEMBERSHIP_NEGATIVE_TTL = int(os.getenv("MEMBERSHIP_NEGATIVE_TTL", "60"))
+ALIENX_CHANNEL = "@AlienxSaver"
+_membership_cache = {}
+
+
+def required_channels():
+   """Channels a user must join: (main channel or None, AlienxSaver)"""
    main_channel = CHANNEL if CHANNEL else CHANNEL_ID
-   # AlienxSaver channel (hardcoded as requested)
-   alienx_channel = "@AlienxSaver"
-   
-   # Check if user is banned from main channel
-   if main_channel:
-      try:
-         user = await app.get_chat_member(main_channel, user_id)
-         if user.status == "kicked":
-            await message.reply_text("🚫 <b>You are Banned!</b>\n\n📞 Contact: @ZeroTrace0x", parse_mode=ParseMode.HTML)
-            return 1
-      except Exception:
-         pass  # Continue with membership check
-   
-   # Check membership in both channels
-   main_joined = False
-   alienx_joined = False
-   
-   # Check main channel membership
-   if main_channel:
-      try:
-         user = await app.get_chat_member(main_channel, user_id)
-         if user.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-            main_joined = True
-      except UserNotParticipant:
-         main_joined = False
-      except ChatAdminRequired:
-         # Bot is not admin in the channel, skip this check
-         main_joined = True  # Allow access since we can't verify
-      except Exception:
-         main_joined = True  # Allow access on error to prevent blocking users
+   return (main_channel or None), ALIENX_CHANNEL
+
+
+def invalidate_membership(user_id=None):
+   if user_id is None:
+      _membership_cache.clear()
    else:
-      main_joined = True  # If no main channel configured, skip this check
-   
-   # Check AlienxSaver channel membership
+      _membership_cache.pop(user_id, None)
+
+
+async def _fetch_membership(app, channel, user_id):
    try:
-      user = await app.get_chat_member(alienx_channel, user_id)
+      user = await app.get_chat_member(channel, user_id)
       if user.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-         alienx_joined = True
+         return "joined"
+      if user.status == ChatMemberStatus.BANNED or user.status == "kicked":
+         return "banned"
+      return "left"
    except UserNotParticipant:
-      alienx_joined = False
+      return "left"
    except ChatAdminRequired:
-      # Bot is not admin in AlienxSaver channel, allow access
-      alienx_joined = True  # Allow access since we can't verify
+      # Bot is not admin in the channel, allow access since we can't verify
+      return "unknown"
    except Exception:
-      alienx_joined = True  # Allow access on error
+      # Allow access on error to prevent blocking users
+      return "unknown"
+
+
+async def _membership_state(app, channel, user_id, refresh=False):
+   now = time.time()
+   per_user = _membership_cache.setdefault(user_id, {})
+   hit = per_user.get(channel)
+   if hit and not refresh and hit[1] > now:
+      return hit[0]
+   state = await _fetch_membership(app, channel, user_id)
+   ttl = MEMBERSHIP_CACHE_TTL if state == "joined" else MEMBERSHIP_NEGATIVE_TTL
+   per_user[channel] = (state, now + ttl)
+   return state
+
+
+async def check_membership(app, user_id, refresh=False):
+   """Return (main_state, alienx_state); cache misses are checked concurrently"""
+   main_channel, alienx_channel = required_channels()
+   if main_channel:
+      return tuple(await asyncio.gather(
+         _membership_state(app, main_channel, user_id, refresh),
+         _membership_state(app, alienx_channel, user_id, refresh),
+      ))
+   return "joined", await _membership_state(app, alienx_channel, user_id, refresh)
+
+
+async def subscribe(app, message):
+   """Enhanced subscription system - requires joining both main channel and AlienxSaver channel"""
+   user_id = message.from_user.id
+   
+   main_channel, _ = required_channels()
+   main_state, alienx_state = await check_membership(app, user_id)
+   
+   # Check if user is banned from main channel
+   if main_state == "banned":
+      await message.reply_text("🚫 <b>You are Banned!</b>\n\n📞 Contact: @ZeroTrace0x", parse_mode=ParseMode.HTML)
+      return 1
+   
+   # "unknown" means we could not verify (bot not admin / API error) - allow access
+   main_joined = main_state in ("joined", "unknown")
+   alienx_joined = alienx_state in ("joined", "unknown")
    
    # If user hasn't joined both channels, show subscription message
    if not (main_joined and alienx_joined):
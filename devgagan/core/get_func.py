@@ -25,7 +25,7 @@ THUMB_SKIP_SIZE_MB = int(os.getenv("THUMB_SKIP_SIZE_MB", "700"))
 from telethon.tl.types import DocumentAttributeVideo, DocumentAttributeAnimated
 from telethon import events, Button
 from telethon.tl.functions.channels import JoinChannelRequest
-from devgagan import app, sex as gf
+from devgagan import app, sex as gf, botStartTime
 from devgagan.core.download_queue import download_queue
 from devgagan.core.task_registry import registry
 from devgagan.core.cancel import cancel_manager
@@ -33,6 +33,11 @@ from devgagan.core.func import *
 from devgagan.core.mongo import db as odb
 from devgagan.core.mongo.plans_db import check_premium
 from devgagan.core.cleanup import cleanup_manager
+from devgagan.core.word_filter import WordFilter, EMPTY_FILTER
+from devgagan.core.caption_render import render_markdown, PREPARING_DOWNLOAD_HTML, PREPARING_UPLOAD_HTML
+from devgagan.core.memory_budget import memory_budget, is_buffer, source_exists, source_name, source_size
+from devgagan.core.message_cache import message_cache, is_file_reference_error
+from devgagan.core.identity_cache import identity_cache, is_peer_error
 from devgagan.core.deduplication import (
     check_duplicate_before_download,
     check_duplicate_after_download, 
@@ -40,7 +45,8 @@ from devgagan.core.deduplication import (
     store_file_for_deduplication
 )
 from config import MONGO_DB as MONGODB_CONNECTION_STRING, LOG_GROUP, OWNER_ID, STRING, API_ID, API_HASH, GLOBAL_BATCH_PROCESSING_TIMER
-from devgagan.core.session_pool import session_pool
+from devgagan.core.session_pool import session_pool, METHOD_DOWNLOAD, METHOD_UPLOAD
+from devgagan.core.transfer import MediaFetch, request_pool_session
 from devgagan.core.auto_flood_detection import auto_flood_detector
 
 # Import pro userbot if STRING is available
@@ -123,6 +129,8 @@ class DatabaseManager:
         self.client = None
         self.collection = None
         self._cache = {}
+        # user_id -> compiled WordFilter, dropped whenever the words change
+        self._word_filters = {}
         self._connect()
     
     def _connect(self):
@@ -211,6 +219,8 @@ class DatabaseManager:
                     upsert=True
                 )
                 self._cache[cache_key] = value
+                if key in ("delete_words", "replacement_words"):
+                    self._word_filters.pop(user_id, None)
                 return True
             except Exception as e:
                 print(f"❌ Database save error for {key} (attempt {attempt + 1}/{max_retries}): {e}")
@@ -224,6 +234,18 @@ class DatabaseManager:
         keys_to_remove = [key for key in self._cache.keys() if key.startswith(f"{user_id}:")]
         for key in keys_to_remove:
             del self._cache[key]
+        self._word_filters.pop(user_id, None)
+
+    def get_word_filter(self, user_id: int) -> WordFilter:
+        """Compiled delete/replace filter for a user, rebuilt only after the words change"""
+        word_filter = self._word_filters.get(user_id)
+        if word_filter is None:
+            delete_words = self.get_user_data(user_id, "delete_words", []) or []
+            replacements = self.get_user_data(user_id, "replacement_words", {}) or {}
+            # Users without filters share one no-op instance
+            word_filter = WordFilter(delete_words, replacements) if delete_words or replacements else EMPTY_FILTER
+            self._word_filters[user_id] = word_filter
+        return word_filter
     
     def get_protected_channels(self) -> Set[int]:
         try:
@@ -525,50 +547,8 @@ class CaptionFormatter:
     
     @staticmethod
     async def markdown_to_html(caption: str) -> str:
-        """Convert markdown formatting to HTML with improved link handling"""
-        if not caption:
-            return ""
-        
-        # First, handle links with a more robust approach to prevent missing embedded links in long text
-        # This uses a non-greedy pattern and processes links first to avoid interference with other formatting
-        def replace_links(text):
-            # Use a more specific pattern for links that handles various URL formats better
-            link_pattern = r'\[(.*?)\]\((https?://[^\s\)]+|tg://[^\s\)]+|www\.[^\s\)]+)\)'
-            
-            # Process all links in the text
-            def link_replacer(match):
-                text, url = match.groups()
-                # Ensure URL is properly formatted
-                if url.startswith('www.'):
-                    url = 'http://' + url
-                return f'<a href="{url}">{text}</a>'
-            
-            return re.sub(link_pattern, link_replacer, text, flags=re.DOTALL)
-        
-        # Process links first
-        result = replace_links(caption)
-        
-        # Then handle other markdown formatting
-        replacements = [
-            (r"```([a-zA-Z0-9_+\-.]+)\n([\s\S]*?)```", r"<pre language=\"\1\">\2</pre>"),
-            (r"```([\s\S]*?)```", r"<pre>\1</pre>"),
-            (r"^>>> (.*)", r"<blockquote expandable>\1</blockquote>"),
-            (r"^>> (.*)", r"<blockquote expandable>\1</blockquote>"),
-            (r"^> (.*)", r"<blockquote>\1</blockquote>"),
-            (r"(?<!`)`([^`\n]+)`(?!`)", r"<code>\1</code>"),
-            (r"\*\*(.+?)\*\*", r"<b>\1</b>"),
-            (r"(?<!\*)\*(?!\*)(.+?)(?<!\*)\*(?!\*)", r"<i>\1</i>"),
-            (r"__(.+?)__", r"<u>\1</u>"),
-            (r"_(.+?)_", r"<i>\1</i>"),
-            (r"~~(.+?)~~", r"<s>\1</s>"),
-            (r"\|\|(.+?)\|\|", r"<tg-spoiler>\1</tg-spoiler>")
-            # Links are already processed above
-        ]
-        
-        for pattern, replacement in replacements:
-            result = re.sub(pattern, replacement, result, flags=re.MULTILINE | re.DOTALL)
-        
-        return result.strip()
+        """Convert markdown formatting to HTML with improved link handling (compiled + memoised)"""
+        return render_markdown(caption)
 
 class FileOperations:
     """File operations with enhanced error handling"""
@@ -585,33 +565,41 @@ class FileOperations:
             await self._cleanup_file(file_path)
     
     async def _cleanup_file(self, file_path: str):
-        """Safely remove file"""
+        """Safely remove file (in-memory buffers are just closed)"""
+        if is_buffer(file_path):
+            file_path.close()
+            return
         if file_path and os.path.exists(file_path):
             try:
                 await asyncio.to_thread(os.remove, file_path)
             except Exception as e:
                 print(f"Error removing file {file_path}: {e}")
     
-    async def process_filename(self, file_path: str, user_id: int) -> str:
-        """Process filename with user preferences"""
-        delete_words = set(self.db.get_user_data(user_id, "delete_words", []))
-        replacements = self.db.get_user_data(user_id, "replacement_words", {})
+    def renamed_parts(self, file_name: str, user_id: int) -> Tuple[str, str, str]:
+        """(name, rename_tag, extension) after the user's word filters, tag and video extension rules"""
         rename_tag = self.db.get_user_data(user_id, "rename_tag", "Restrict Bot Saver")
         
-        path = Path(file_path)
+        path = Path(file_name)
         name = path.stem
         extension = path.suffix.lstrip('.')
         
-        # Process filename
-        for word in delete_words:
-            name = name.replace(word, "")
-        
-        for word, replacement in replacements.items():
-            name = name.replace(word, replacement)
+        # Process filename (delete + replace words in one pass)
+        name = self.db.get_word_filter(user_id).apply(name)
         
         # Normalize extension for videos
         if extension.lower() in self.config.VIDEO_EXTS and extension.lower() not in ['mp4']:
             extension = 'mp4'
+        return name, rename_tag, extension
+
+    def keeps_file_name(self, file_name: str, user_id: int) -> bool:
+        """True when process_filename would leave this name as it is"""
+        name, rename_tag, extension = self.renamed_parts(file_name, user_id)
+        return not rename_tag and f"{name.strip()}.{extension}" == file_name
+
+    async def process_filename(self, file_path: str, user_id: int) -> str:
+        """Process filename with user preferences"""
+        path = Path(file_path)
+        name, rename_tag, extension = self.renamed_parts(path.name, user_id)
         
         new_name = f"{name.strip()} {rename_tag}.{extension}"
         new_path = path.parent / new_name
@@ -715,8 +703,7 @@ class FileOperations:
                                             f"{modern_bar}"
                                         )
                                         async def _edit_progress():
-                                            html_progress = await CaptionFormatter.markdown_to_html(progress_text)
-                                            await edit_msg.edit(html_progress, parse_mode=ParseMode.HTML)
+                                            await edit_msg.edit(progress_text, parse_mode=ParseMode.HTML)
                                         asyncio.create_task(_edit_progress())
                                     except Exception as e:
                                         print(f"Part progress update error: {e}")
@@ -800,7 +787,8 @@ class SmartTelegramBot:
     async def _queue_worker(self):
         """Continuously pull tasks from the queue and execute them under concurrency semaphore."""
         while True:
-            priority, order, fut, coro = await self._task_queue.get()
+            priority, order, fut, coro, enqueued_at = await self._task_queue.get()
+            metrics.queue_leave("transfer", "premium" if priority == 0 else "free", time.monotonic() - enqueued_at)
             try:
                 print(f"[QUEUE] Start task (priority={priority}, order={order})")
             except Exception:
@@ -831,7 +819,8 @@ class SmartTelegramBot:
         fut = asyncio.get_event_loop().create_future()
         # Increase counter to keep FIFO order for equal priorities
         self._queue_counter += 1
-        await self._task_queue.put((priority, self._queue_counter, fut, coro_factory))
+        metrics.queue_enter("transfer", "premium" if priority == 0 else "free")
+        await self._task_queue.put((priority, self._queue_counter, fut, coro_factory, time.monotonic()))
         return await fut
     
     def get_thumbnail_path(self, user_id: int) -> Optional[str]:
@@ -937,19 +926,9 @@ class SmartTelegramBot:
     async def process_user_caption(self, original_caption: str, user_id: int) -> str:
         """Process caption with user preferences"""
         custom_caption = self.user_caption_prefs.get(str(user_id), "") or self.db.get_user_data(user_id, "custom_caption", "")
-        delete_words = set(self.db.get_user_data(user_id, "delete_words", []))
-        replacements = self.db.get_user_data(user_id, "replacement_words", {})
-        
-        # Process original caption
-        processed = original_caption or ""
         
-        # Remove delete words
-        for word in delete_words:
-            processed = processed.replace(word, "")
-        
-        # Apply replacements
-        for word, replacement in replacements.items():
-            processed = processed.replace(word, replacement)
+        # Remove delete words and apply replacements in one pass
+        processed = self.db.get_word_filter(user_id).apply(original_caption or "")
         
         # Add custom caption
         if custom_caption:
@@ -998,7 +977,7 @@ class SmartTelegramBot:
         try:
             # This is a placeholder - you'll need to implement based on your user session system
             # For now, fallback to admin session from pool
-            admin_session_client, admin_session_id = await session_pool.get_session()
+            admin_session_client, admin_session_id = await session_pool.get_session(method_class=METHOD_UPLOAD)
             if admin_session_client:
                 return admin_session_client
             
@@ -1012,14 +991,14 @@ class SmartTelegramBot:
             print(f"Error getting user session client: {e}")
             return None
 
-    async def upload_with_telethon(self, file_path: str, user_id: int, target_chat_id: int, caption: str, topic_id: Optional[int] = None, edit_msg=None, client=None, original_thumb_path: Optional[str] = None, original_thumb_is_temp: bool = False, caption_entities: Optional[Any] = None, reply_markup: Optional[Any] = None, created_progress_msg: bool = False, is_batch_operation: bool = False):
+    async def upload_with_telethon(self, file_path: str, user_id: int, target_chat_id: int, caption: str, topic_id: Optional[int] = None, edit_msg=None, client=None, original_thumb_path: Optional[str] = None, original_thumb_is_temp: bool = False, caption_entities: Optional[Any] = None, reply_markup: Optional[Any] = None, created_progress_msg: bool = False, is_batch_operation: bool = False, is_premium: Optional[bool] = None):
         # Record start time for upload tracking
         start_time = time.time()
         # Guard to avoid sending duplicate error messages to user
         sent_user_error = False
         
         # Calculate file size
-        file_size = os.path.getsize(file_path)
+        file_size = source_size(file_path)
         file_size_str = self._format_bytes(file_size)
         # Match download thresholds: 20MB for single, 50MB for batch
         show_progress = False
@@ -1045,20 +1024,23 @@ class SmartTelegramBot:
         session_type = ""
         pooled_acquired = False
         pooled_session_id = None
+        session_error = None
         
         # Import necessary clients
         from telethon.sync import TelegramClient
         from devgagan import telethon_client, app, sex, pro
         
         # Acquire an admin session fairly with premium-aware priority/timeout
-        is_premium_user = False
-        try:
-            prem_doc = await check_premium(user_id)
-            is_premium_user = bool(prem_doc) or (user_id in OWNER_ID)
-        except Exception:
-            is_premium_user = user_id in OWNER_ID
-        acquire_timeout = 120.0 if is_premium_user else 300.0
-        admin_session_client, admin_session_id = await session_pool.request_session(is_premium=is_premium_user, timeout=acquire_timeout)
+        # (tier is resolved once per request by get_msg and passed down)
+        if is_premium is not None:
+            is_premium_user = is_premium
+        else:
+            try:
+                prem_doc = await check_premium(user_id)
+                is_premium_user = bool(prem_doc) or (user_id in OWNER_ID)
+            except Exception:
+                is_premium_user = user_id in OWNER_ID
+        admin_session_client, admin_session_id = await request_pool_session(is_premium_user, METHOD_UPLOAD)
         if admin_session_client:
             upload_client = admin_session_client
             session_type = f"admin_{admin_session_id}"
@@ -1077,8 +1059,8 @@ class SmartTelegramBot:
             raise Exception("No available upload sessions")
         
         try:
-            me = await upload_client.get_me()
-            username = me.username or f"user_{me.id}"
+            ident = await identity_cache.get_me(upload_client)
+            username = ident.username or f"user_{ident.me_id}"
             print(f"📤 UPLOAD: Using {session_type} (@{username}) for upload to LOG_GROUP")
         except Exception:
             print(f"📤 UPLOAD: Using {session_type} (username unknown) for upload to LOG_GROUP")
@@ -1090,17 +1072,8 @@ class SmartTelegramBot:
         # This prevents intermittent [400 CHANNEL_INVALID] caused by unresolved/unauthorized peers.
         try:
             try:
-                # Warm-up depends on client library
-                try:
-                    from telethon.sync import TelegramClient as _TeleClient
-                except Exception:
-                    _TeleClient = None
-                if _TeleClient and isinstance(upload_client, _TeleClient):
-                    # Telethon: resolve entity (works for IDs and usernames)
-                    await upload_client.get_entity(log_group_id)
-                else:
-                    # Pyrogram
-                    await upload_client.get_chat(log_group_id)
+                # Resolved once per client (SessionPool primes it at start); no call when cached
+                await identity_cache.ensure_peer(upload_client, log_group_id)
             except (ChannelInvalid, ChatIdInvalid, ChannelPrivate, PeerIdInvalid) as _lg_err:
                 # If we're using an admin pool session, try to rotate to another one quickly
                 if session_type.startswith("admin_"):
@@ -1112,14 +1085,11 @@ class SmartTelegramBot:
                         pass
                     # Attempt a few replacements
                     for _ in range(3):
-                        replacement_client, replacement_id = await session_pool.get_session()
+                        replacement_client, replacement_id = await session_pool.get_session(method_class=METHOD_UPLOAD)
                         if not replacement_client:
                             break
                         try:
-                            if _TeleClient and isinstance(replacement_client, _TeleClient):
-                                await replacement_client.get_entity(log_group_id)
-                            else:
-                                await replacement_client.get_chat(log_group_id)
+                            await identity_cache.ensure_peer(replacement_client, log_group_id)
                             upload_client = replacement_client
                             session_type = f"admin_{replacement_id}"
                             admin_session_client = replacement_client
@@ -1163,16 +1133,14 @@ class SmartTelegramBot:
             # Optimized upload status - create progress message only when needed (will be updated with progress bar)
             if edit_msg and show_progress:
                 try:
-                    init_text = await CaptionFormatter.markdown_to_html("📤 **Preparing...**")
-                    await edit_msg.edit(init_text, parse_mode=ParseMode.HTML)
+                    await edit_msg.edit(PREPARING_UPLOAD_HTML, parse_mode=ParseMode.HTML)
                 except Exception:
                     pass
             elif show_progress and not edit_msg:
                 # Create new progress message only for large files (will be updated with progress bar)
                 try:
                     from devgagan import app
-                    init_text = await CaptionFormatter.markdown_to_html("📤 **Preparing...**")
-                    edit_msg = await app.send_message(user_id, init_text, parse_mode=ParseMode.HTML)
+                    edit_msg = await app.send_message(user_id, PREPARING_UPLOAD_HTML, parse_mode=ParseMode.HTML)
                 except Exception:
                     edit_msg = None
             # For small files: NO upload status message to save API calls
@@ -1201,17 +1169,14 @@ class SmartTelegramBot:
             async def admin_progress_callback(done, total):
                 nonlocal last_update_time
                 current_time = time.time()
-                # Cancellation check
-                try:
-                    if await cancel_manager.is_cancelled(user_id):
-                        if show_progress and edit_msg:
-                            try:
-                                await edit_msg.edit("🚫 Upload canceled by user.")
-                            except Exception:
-                                pass
-                        raise asyncio.CancelledError("upload canceled")
-                except Exception:
-                    pass
+                # Cancellation check (lock-free; the raise must reach the transfer)
+                if cancel_manager.cancelled(user_id):
+                    if show_progress and edit_msg:
+                        try:
+                            await edit_msg.edit("🚫 Upload canceled by user.")
+                        except Exception:
+                            pass
+                    raise asyncio.CancelledError("upload canceled")
                 
                 # Optimized update intervals: 8s for single uploads, 15s for batch uploads to reduce API calls
                 if not show_progress:
@@ -1236,7 +1201,7 @@ class SmartTelegramBot:
                     eta_str = self.progress_manager._format_time(eta_seconds) if eta_seconds > 0 else "Calculating..."
                     
                     # Use unified progress bar for uploads
-                    filename = os.path.basename(file_path)
+                    filename = source_name(file_path)
                     percentage = (done / total) * 100 if total > 0 else 0
                     # Update central task registry to reflect uploading stage
                     try:
@@ -1250,13 +1215,12 @@ class SmartTelegramBot:
                     # Update progress message
                     try:
                         if show_progress and edit_msg:
-                            html_progress = await CaptionFormatter.markdown_to_html(progress_text)
-                            await edit_msg.edit(html_progress, parse_mode=ParseMode.HTML)
+                            await edit_msg.edit(progress_text, parse_mode=ParseMode.HTML)
                     except Exception as e:
                         # Silently handle progress update failures to avoid spam
                         pass
                     
-                    self.progress_manager.calculate_progress(done, total, user_id, os.path.basename(file_path), "Admin Session Upload")
+                    self.progress_manager.calculate_progress(done, total, user_id, source_name(file_path), "Admin Session Upload")
             
             # Upload to LOG_GROUP using admin session
             print(f"📤 Starting admin session upload to LOG_GROUP {log_group_id}")
@@ -1265,13 +1229,16 @@ class SmartTelegramBot:
             
             # Prepare attributes based on file type
             attributes = []
-            file_type = self.media_processor.get_file_type(file_path)
+            file_type = self.media_processor.get_file_type(source_name(file_path))
+            if is_buffer(file_path):
+                # In-memory upload: start from the beginning of the buffer
+                file_path.seek(0)
             # Suppress progress for GIFs/animations and stickers regardless of size
             if file_type in ["animation", "sticker"]:
                 show_progress = False
             else:
                 try:
-                    ext = Path(file_path).suffix.lower().lstrip('.')
+                    ext = Path(source_name(file_path)).suffix.lower().lstrip('.')
                     # Treat common sticker formats as non-progress regardless of size
                     if ext in ["webp", "tgs", "webm"]:
                         show_progress = False
@@ -1688,7 +1655,7 @@ class SmartTelegramBot:
             
             # 💾 DEDUPLICATION: Store file hash for future deduplication
             try:
-                if file_path and os.path.exists(file_path) and uploaded_message and hasattr(uploaded_message, 'id'):
+                if file_path and source_exists(file_path) and uploaded_message and hasattr(uploaded_message, 'id'):
                     # Extract original message info if available
                     original_chat_id = getattr(self, '_current_chat_id', None)
                     original_message_id = getattr(self, '_current_message_id', None)
@@ -1716,6 +1683,7 @@ class SmartTelegramBot:
                     drop_author=True
                 )
                 print(f"✅ Successfully forwarded message to user {user_id}")
+                metrics.record_boot("time_to_first_upload", time.time() - botStartTime, once=True)
                 # If we split the caption due to length, send it to the user as
                 # a separate message (independent, not a reply), preserving formatting
                 if user_caption_text:
@@ -1834,7 +1802,11 @@ class SmartTelegramBot:
             print(f"ℹ️ Suppressed user error message: {error_message}")
             
         except Exception as e:
+            session_error = e
             error_message = str(e)
+            if is_peer_error(e):
+                # Cached LOG_GROUP peer went stale; resolve it again next time
+                identity_cache.invalidate_peer(upload_client, log_group_id)
             html_error_rbs = await self.caption_formatter.markdown_to_html(f"<b>{session_type.title()} Upload Failed:</b> {error_message}")
             await app.send_message(log_group_id, html_error_rbs, parse_mode=ParseMode.HTML)
             
@@ -1858,15 +1830,14 @@ class SmartTelegramBot:
             # Release session back to pool if it was obtained from there
             # Always release pooled sessions if acquired
             if pooled_acquired and pooled_session_id:
-                had_error = 'e' in locals()
-                await session_pool.release_session(pooled_session_id, had_error=had_error)
+                await session_pool.release_session(pooled_session_id, error=session_error, method_class=METHOD_UPLOAD)
                 print(f"📤 UPLOAD: Released pooled session {pooled_session_id}")
             else:
                 # Last-resort: if client is tagged with a session id, release it
                 try:
                     tag_sid = getattr(upload_client, "_rbs_sid", None)
                     if tag_sid:
-                        await session_pool.release_session(str(tag_sid), had_error='e' in locals())
+                        await session_pool.release_session(str(tag_sid), error=session_error, method_class=METHOD_UPLOAD)
                         print(f"📤 UPLOAD: Released tagged pooled session {tag_sid}")
                 except Exception:
                     pass
@@ -1908,27 +1879,29 @@ class SmartTelegramBot:
             except Exception:
                 pass
 
-    async def handle_large_file_upload(self, file_path: str, sender: int, edit_msg, caption: str, client=None, original_thumb_path: Optional[str] = None, original_thumb_is_temp: bool = False):
+    async def handle_large_file_upload(self, file_path: str, sender: int, edit_msg, caption: str, client=None, original_thumb_path: Optional[str] = None, original_thumb_is_temp: bool = False, is_premium: Optional[bool] = None):
         # Get a session from the pool if no client is provided
         pooled_client = None
         session_id = None
+        session_error = None
         if not client:
             # Premium-aware, fair session request with timeout
-            is_premium_user = False
-            try:
-                prem_doc = await check_premium(sender)
-                is_premium_user = bool(prem_doc) or (sender in OWNER_ID)
-            except Exception:
-                is_premium_user = sender in OWNER_ID
-            acquire_timeout = 120.0 if is_premium_user else 300.0
-            pooled_client, session_id = await session_pool.request_session(is_premium=is_premium_user, timeout=acquire_timeout)
+            if is_premium is not None:
+                is_premium_user = is_premium
+            else:
+                try:
+                    prem_doc = await check_premium(sender)
+                    is_premium_user = bool(prem_doc) or (sender in OWNER_ID)
+                except Exception:
+                    is_premium_user = sender in OWNER_ID
+            pooled_client, session_id = await request_pool_session(is_premium_user, METHOD_UPLOAD)
             client = pooled_client if pooled_client else self.pro_client
             
             # Log which client is being used
             if pooled_client and session_id:
                 try:
-                    me = await pooled_client.get_me()
-                    username = me.username or f"user_{me.id}"
+                    ident = await identity_cache.get_me(pooled_client)
+                    username = ident.username or f"user_{ident.me_id}"
                     print(f"📤 LARGE UPLOAD: Using session {session_id} (@{username}) for large file upload")
                 except Exception:
                     print(f"📤 LARGE UPLOAD: Using session {session_id} (username unknown) for large file upload")
@@ -2025,8 +1998,7 @@ class SmartTelegramBot:
                             f"⏱ <b>ETA:</b> {eta_str}\n\n"
                             f"{self.progress_manager._create_modern_progress_bar(percentage, 10, 'rainbow')}"
                         )
-                        html_progress = await CaptionFormatter.markdown_to_html(progress_text)
-                        await edit_msg.edit(html_progress, parse_mode=ParseMode.HTML)
+                        await edit_msg.edit(progress_text, parse_mode=ParseMode.HTML)
                 except Exception as e:
                     print(f"Progress update error: {e}")
                     pass
@@ -2113,8 +2085,9 @@ class SmartTelegramBot:
                 # Do not copy via bot session here (logging handled by admin/pro uploader elsewhere)
 
             # Check if user is premium or free
-            free_check = 0
-            if 'chk_user' in globals():
+            if is_premium is not None:
+                free_check = 0 if is_premium else 1
+            else:
                 free_check = await chk_user(sender, sender)
 
             if free_check == 1:
@@ -2134,6 +2107,7 @@ class SmartTelegramBot:
                 pass
 
         except Exception as e:
+            session_error = e
             error_message = str(e)
             print(f"Large file upload error: {error_message}")
             html_error_2gb = await self.caption_formatter.markdown_to_html(f"<b>2GB Upload Error:</b> {error_message}")
@@ -2153,8 +2127,7 @@ class SmartTelegramBot:
             
             # Release the session back to the pool if it was obtained from there
             if pooled_client and session_id:
-                had_error = 'e' in locals()
-                await session_pool.release_session(session_id, had_error=had_error)
+                await session_pool.release_session(session_id, error=session_error, method_class=METHOD_UPLOAD)
                 print(f"📤 LARGE UPLOAD: Finished large file upload using session {session_id}")
             else:
                 print(f"📤 LARGE UPLOAD: Finished large file upload using default pro client")
@@ -2255,14 +2228,20 @@ class SmartTelegramBot:
                 
         return False
 
-    async def handle_message_download(self, userbot, sender: int, edit_id: int | None, msg_link: str, offset: int, message):
+    async def handle_message_download(self, userbot, sender: int, edit_id: int | None, msg_link: str, offset: int, message, is_premium: Optional[bool] = None):
         """Main message processing function with enhanced error handling"""
+        # Resolve the tier once for this request; callers (get_msg) normally pass it in
+        if is_premium is None:
+            is_premium = (await chk_user(message, sender)) == 0
         edit_msg = None
         created_progress_msg = False
         file_path = None
+        target_path = None
         pooled_client = None
         session_id = None
+        session_error = None
         user_session_client = None
+        fetch: Optional[MediaFetch] = None
         file_info = {"size": 0, "name": "Unknown", "type": "unknown"}
         # Metrics instrumentation
         dl_task_id = None
@@ -2275,11 +2254,11 @@ class SmartTelegramBot:
         try:
             uname = ""
             try:
-                u = await app.get_users(sender)
-                uname = (u.username or u.first_name or "") if u else ""
+                # The requesting message already carries the user; get_users only for unseen ids
+                uname = await identity_cache.username_for(app, sender, hint=getattr(message, "from_user", None))
             except Exception:
                 pass
-            dl_task_id = await metrics.start_task("download", sender, uname, link=msg_link)
+            dl_task_id = await metrics.start_task("download", sender, uname, link=msg_link, tier="premium" if is_premium else "free")
         except Exception:
             pass
         
@@ -2293,7 +2272,7 @@ class SmartTelegramBot:
             if not chat_id:
                 # _parse_message_link returns None for successfully processed special cases
                 # (public links, story links, protected channels) - these are not errors
-                return
+                return {"file_info": file_info}
             
             # Store current message info for deduplication
             self._current_chat_id = chat_id
@@ -2310,8 +2289,8 @@ class SmartTelegramBot:
                 if not requires_user_session and self._is_public_group_link(msg_link):
                     # Avoid copying from protected content sources
                     try:
-                        src_chat = await app.get_chat(chat_id)
-                        if getattr(src_chat, "has_protected_content", False):
+                        src_chat = await message_cache.get_chat_facts(app, chat_id)
+                        if src_chat.protected:
                             raise Exception("protected")
                     except Exception:
                         # If chat info cannot be fetched or is protected, skip fast path
@@ -2327,7 +2306,7 @@ class SmartTelegramBot:
                             # Add delay after copy to prevent flood wait in batch processing
                             print(f"[BATCH-COPY] Applying {GLOBAL_BATCH_PROCESSING_TIMER}-second delay after copy for user {sender}")
                             await asyncio.sleep(GLOBAL_BATCH_PROCESSING_TIMER)
-                            return
+                            return {"file_info": file_info}
                         except Exception:
                             # Fallback: forward single message
                             try:
@@ -2339,7 +2318,7 @@ class SmartTelegramBot:
                                 # Add delay after forward to prevent flood wait in batch processing
                                 print(f"[BATCH-FORWARD] Applying {GLOBAL_BATCH_PROCESSING_TIMER}-second delay after forward for user {sender}")
                                 await asyncio.sleep(GLOBAL_BATCH_PROCESSING_TIMER)
-                                return
+                                return {"file_info": file_info}
                             except Exception:
                                 pass
             except Exception:
@@ -2387,8 +2366,8 @@ class SmartTelegramBot:
                     
                     # Log user session usage
                     try:
-                        me = await user_session_client.get_me()
-                        username = me.username or f"user_{me.id}"
+                        ident = await identity_cache.get_me(user_session_client)
+                        username = ident.username or f"user_{ident.me_id}"
                         print(f"[SESSION] DOWNLOAD using USER session: @{username} chat={chat_id}")
                     except Exception:
                         print(f"[SESSION] DOWNLOAD using USER session: <unknown> chat={chat_id}")
@@ -2413,20 +2392,14 @@ class SmartTelegramBot:
             # If user session failed, try admin session pool as fallback (only for non-group chats)
             if not user_session_client and not requires_user_session:
                 # Premium-aware fair acquisition
-                is_premium_user = False
-                try:
-                    prem_doc = await check_premium(sender)
-                    is_premium_user = bool(prem_doc) or (sender in OWNER_ID)
-                except Exception:
-                    is_premium_user = sender in OWNER_ID
-                acquire_timeout = 120.0 if is_premium_user else 300.0
-                pooled_client, session_id = await session_pool.request_session(is_premium=is_premium_user, timeout=acquire_timeout)
+                is_premium_user = is_premium
+                pooled_client, session_id = await request_pool_session(is_premium_user, METHOD_DOWNLOAD)
                 
                 # Log which client is being used
                 if pooled_client and session_id:
                     try:
-                        me = await pooled_client.get_me()
-                        username = me.username or f"user_{me.id}"
+                        ident = await identity_cache.get_me(pooled_client)
+                        username = ident.username or f"user_{ident.me_id}"
                         print(f"[SESSION] DOWNLOAD using POOL session: {session_id} (@{username}) chat={chat_id}")
                     except Exception:
                         print(f"[SESSION] DOWNLOAD using POOL session: {session_id} (<unknown>) chat={chat_id}")
@@ -2467,13 +2440,14 @@ class SmartTelegramBot:
             
             if not client_to_use:
                 await app.edit_message_text(sender, edit_id, "❌ No available user sessions. Please login or contact admin: @ZeroTrace0x")
-                return
+                return {"file_info": file_info}
             
             # Warm up public username chats to avoid CHANNEL_INVALID by resolving via Pyrogram first
             try:
                 if isinstance(chat_id, str):
                     # This will cache the peer for the bot client and often resolves transient CHANNEL_INVALID
-                    await app.get_chat(chat_id)
+                    # (only needed the first time: chat facts are cached once resolved)
+                    await message_cache.get_chat_facts(app, chat_id)
             except Exception:
                 pass
 
@@ -2483,7 +2457,7 @@ class SmartTelegramBot:
                 # Detect client type by module path
                 if getattr(client_to_use.__class__, "__module__", "").startswith("pyrogram"):
                     # Pyrogram: chat_id can be int(-100...) or username
-                    msg = await client_to_use.get_messages(chat_id, msg_id)
+                    msg = await message_cache.get_message(client_to_use, chat_id, msg_id)
                 else:
                     # Telethon: resolve entity and use ids parameter
                     entity = chat_id
@@ -2585,16 +2559,6 @@ class SmartTelegramBot:
             
             filename, file_size, media_type = self.media_processor.get_media_info(msg)
             
-            # Try to extract the original thumbnail from the message before downloading media
-            original_thumb_path = None
-            original_thumb_is_temp = False
-            try:
-                original_thumb_path, original_thumb_is_temp = await self._extract_original_thumbnail(msg, client_to_use, sender)
-                if original_thumb_path:
-                    print(f"🖼️ Extracted original thumbnail: {original_thumb_path}")
-            except Exception as _:
-                original_thumb_path, original_thumb_is_temp = None, False
-            
             # Extract original caption, entities and reply markup from original message
             if msg.caption:
                 if hasattr(msg.caption, 'text'):
@@ -2631,6 +2595,11 @@ class SmartTelegramBot:
                         file_info["name"] = existing_file.get("file_name", file_info.get("name", "cached_file"))
                         file_info["type"] = existing_file.get("file_type", file_info.get("type", "cached"))
                         print(f"✅ DEDUPLICATION: Successfully forwarded cached file to user {sender}")
+                        try:
+                            if dl_task_id:
+                                await metrics.record_strategy(dl_task_id, "dedup_cache")
+                        except Exception:
+                            pass
                         return {"file_info": file_info}
                     else:
                         print(f"⚠️ DEDUPLICATION: Failed to forward cached file, proceeding with download")
@@ -2638,69 +2607,49 @@ class SmartTelegramBot:
                 print(f"⚠️ DEDUPLICATION: Error in pre-download check: {dedup_err}")
                 # Continue with normal download if deduplication fails
             
-            # FAST-PATH: attempt server-side forward/copy to LOG_GROUP to preserve all formatting/buttons
-            try:
-                log_group_id = LOG_GROUP
-                uploaded_message = None
-                # Prefer a Telethon admin/pro client for best compatibility
-                from telethon.sync import TelegramClient as _TeleClient
-                upload_candidate = None
-                # Use pooled admin session if available from earlier selection
-                if pooled_client and isinstance(pooled_client, _TeleClient):
-                    upload_candidate = pooled_client
-                elif self.pro_client and isinstance(self.pro_client, _TeleClient):
-                    upload_candidate = self.pro_client
-                elif gf and isinstance(gf, _TeleClient):
-                    upload_candidate = gf
-                # If we have a Telethon client, try forwarding with full preservation
-                if upload_candidate is not None:
-                    try:
-                        # Resolve source entity for Telethon
-                        src_entity = chat_id
-                        if hasattr(upload_candidate, 'get_entity'):
-                            try:
-                                src_entity = await upload_candidate.get_entity(chat_id)
-                            except Exception:
-                                src_entity = chat_id
-                        # Try a true forward first (keeps buttons and native formatting)
-                        fwd = await upload_candidate.forward_messages(
-                            entity=log_group_id,
-                            messages=msg_id,
-                            from_peer=src_entity,
-                            as_copy=False
-                        )
-                        uploaded_message = fwd
-                    except Exception as _fwd_err:
-                        try:
-                            # Fallback to copy (no forward header); may drop inline buttons, but preserves entities
-                            fwd_copy = await upload_candidate.forward_messages(
-                                entity=log_group_id,
-                                messages=msg_id,
-                                from_peer=src_entity,
-                                as_copy=True
-                            )
-                            uploaded_message = fwd_copy
-                        except Exception:
-                            uploaded_message = None
-                # Do NOT use user Pyrogram session to copy to LOG_GROUP to avoid architectural violation
-                # If server-side transfer worked, forward result to user and finish early
-                if uploaded_message is not None:
+            # Transfer strategy 1: server-side copy into LOG_GROUP (no bytes through the VPS).
+            # Only when the result matches download+upload: a renamed file or custom thumbnail means re-uploading.
+            if self._server_copy_eligible(sender, msg):
+                log_group_msg_id = None
+                try:
+                    log_group_msg_id = await self._server_side_copy(
+                        client_to_use, msg, chat_id, msg_id, pooled_client,
+                        is_user_session=(client_to_use is user_session_client and user_session_client is not None),
+                    )
+                except Exception as copy_err:
+                    # Not allowed or failed: fall back to download + upload
+                    print(f"ℹ️ Server-side copy unavailable, using download+upload: {copy_err}")
+                if log_group_msg_id:
+                    # The file is in LOG_GROUP now; a failed delivery must not transfer it a second time
+                    await self._deliver_server_copy(
+                        log_group_msg_id, sender, target_chat_id, topic_id,
+                        caption, caption_entities, is_premium,
+                    )
                     try:
-                        forwarded_message = await app.forward_messages(
-                            chat_id=sender,
-                            from_chat_id=log_group_id,
-                            message_ids=getattr(uploaded_message, 'id', None) or uploaded_message.id,
-                            drop_author=True
-                        )
-                        # Update metrics and return the info
-                        file_info["type"] = file_info.get("type") or ("text" if not msg.media else "media")
-                        return {"file_info": file_info}
+                        if dl_task_id:
+                            await metrics.record_strategy(dl_task_id, "server_copy")
                     except Exception:
                         pass
+                    file_info["type"] = file_info.get("type") or ("text" if not msg.media else "media")
+                    return {"file_info": file_info}
+
+            # Try to extract the original thumbnail from the message before downloading media
+            original_thumb_path = None
+            original_thumb_is_temp = False
+            try:
+                original_thumb_path, original_thumb_is_temp = await self._extract_original_thumbnail(msg, client_to_use, sender)
+                if original_thumb_path:
+                    print(f"🖼️ Extracted original thumbnail: {original_thumb_path}")
+            except Exception as _:
+                original_thumb_path, original_thumb_is_temp = None, False
+            
+            # Transfer strategy 2: download + upload
+            try:
+                if dl_task_id:
+                    await metrics.record_strategy(dl_task_id, "download_upload")
             except Exception:
-                # Ignore fast-path errors; fall back to download and re-upload
                 pass
-            
+
             # Ensure media is downloaded locally before any upload step
             try:
                 # Prepare a downloads directory for better organization
@@ -2721,26 +2670,23 @@ class SmartTelegramBot:
                     # For batch downloads: show progress for files >=50MB (start with progress bar directly)
                     if not edit_id and file_size and file_size >= 50 * 1024 * 1024:
                         # Create initial progress message that will be updated with progress bar
-                        init_text = await CaptionFormatter.markdown_to_html("📥 <b>Preparing...</b>")
-                        edit_msg = await app.send_message(sender, init_text, parse_mode=ParseMode.HTML)
+                        edit_msg = await app.send_message(sender, PREPARING_DOWNLOAD_HTML, parse_mode=ParseMode.HTML)
                         created_progress_msg = True
                     # For single downloads: show progress for files >=20MB (start with progress bar directly)
                     elif edit_id and file_size and file_size >= 20 * 1024 * 1024:
                         try:
                             # Edit existing message to show initial progress
-                            init_text = await CaptionFormatter.markdown_to_html("📥 <b>Preparing...</b>")
                             edit_msg = await app.edit_message_text(
                                 sender,
                                 edit_id,
-                                init_text,
+                                PREPARING_DOWNLOAD_HTML,
                                 parse_mode=ParseMode.HTML
                             )
                             if not edit_msg or not hasattr(edit_msg, 'id'):
                                 raise Exception("edit_message_text returned None or invalid object")
                         except Exception:
                             # Fallback: create new progress message if editing fails
-                            init_text = await CaptionFormatter.markdown_to_html("📥 **Preparing...**")
-                            edit_msg = await app.send_message(sender, init_text, parse_mode=ParseMode.HTML)
+                            edit_msg = await app.send_message(sender, PREPARING_DOWNLOAD_HTML, parse_mode=ParseMode.HTML)
                             created_progress_msg = True
                     # For small files (<20MB single, <50MB batch): NO download status message to save API calls
                 except Exception:
@@ -2771,21 +2717,18 @@ class SmartTelegramBot:
                 async def pr_dl_cb(current: int, total: int):
                     nonlocal last_update_time, last_percent
                     now = time.time()
+                    # Cancellation check (lock-free, also when progress is hidden; the raise must reach the transfer)
+                    if cancel_manager.cancelled(sender):
+                        try:
+                            if edit_msg:
+                                await edit_msg.edit("🚫 Download canceled by user.")
+                            elif edit_id:
+                                await app.edit_message_text(sender, edit_id, "🚫 Download canceled by user.")
+                        except Exception:
+                            pass
+                        raise asyncio.CancelledError("download canceled")
                     if not show_dl_progress:
                         return
-                    # Cancellation check
-                    try:
-                        if await cancel_manager.is_cancelled(sender):
-                            try:
-                                if edit_msg:
-                                    await edit_msg.edit("🚫 Download canceled by user.")
-                                elif edit_id:
-                                    await app.edit_message_text(sender, edit_id, "🚫 Download canceled by user.")
-                            except Exception:
-                                pass
-                            raise asyncio.CancelledError("download canceled")
-                    except Exception:
-                        pass
                     # Optimized update intervals: 8s for single downloads, 15s for batch downloads to reduce API calls
                     update_interval = 15 if not edit_id else 8
                     if now - last_update_time < update_interval and current != total:
@@ -2809,17 +2752,16 @@ class SmartTelegramBot:
                         # Always update UI (removed the 2% threshold that was preventing updates)
                         if total > 0:
                             progress_text = UnifiedProgressBar.format_progress_message(percent, current, total, speed_display, eta_str, "download")
-                            html_progress = await CaptionFormatter.markdown_to_html(progress_text)
                             if edit_msg:
                                 await edit_msg.edit(
-                                    html_progress,
+                                    progress_text,
                                     parse_mode=ParseMode.HTML
                                 )
                             elif edit_id:
                                 await app.edit_message_text(
                                     sender,
                                     edit_id,
-                                    html_progress,
+                                    progress_text,
                                     parse_mode=ParseMode.HTML
                                 )
                             last_percent = percent
@@ -2831,24 +2773,31 @@ class SmartTelegramBot:
                     except Exception:
                         pass
 
-                # Download with the selected client (user/admin pool/userbot)
-                downloaded_path = await client_to_use.download_media(
+                # Download with the selected client (user/admin pool/userbot): RAM when the
+                # memory budget allows, otherwise disk under a disk budget reservation
+                async def _dl_cancel_check():
+                    return await cancel_manager.is_cancelled(sender)
+                fetch = MediaFetch(target_path, file_size or 0)
+                downloaded_path = await fetch.run(
+                    client_to_use,
                     msg,
-                    file_name=target_path,
-                    progress=pr_dl_cb
+                    progress=pr_dl_cb,
+                    refresh=lambda: message_cache.refresh_message(client_to_use, chat_id, msg_id),
+                    in_memory=memory_budget.eligible(media_type, file_size, self.media_processor.get_file_type(base_name)),
+                    name=base_name,
+                    cancel_check=_dl_cancel_check,
                 )
-
-                if not downloaded_path or not os.path.exists(downloaded_path):
-                    raise Exception("Download failed: path not created")
+                msg = fetch.msg
+                if not is_buffer(downloaded_path):
+                    # Register downloaded file for cleanup tracking
+                    cleanup_manager.file_cleanup.register_active_download(sender, downloaded_path)
 
                 file_path = downloaded_path
                 
-                # Register downloaded file for cleanup tracking
-                cleanup_manager.file_cleanup.register_active_download(sender, file_path)
-                # Refresh file info from disk (size/name)
+                # Refresh file info from the downloaded file (size/name)
                 try:
-                    file_info["name"] = os.path.basename(file_path)
-                    file_info["size"] = os.path.getsize(file_path)
+                    file_info["name"] = source_name(file_path)
+                    file_info["size"] = source_size(file_path)
                 except Exception:
                     pass
                 
@@ -2904,8 +2853,9 @@ class SmartTelegramBot:
                         reply_markup=reply_markup,
                         created_progress_msg=created_progress_msg,
                         is_batch_operation=(edit_id is None),
+                        is_premium=is_premium,
                     )
-                    return
+                    return {"file_info": file_info}
                 except Exception as photo_error:
                     print(f"Photo upload error: {photo_error}")
                     html_photo_error = await self.caption_formatter.markdown_to_html(f"**Photo Upload Error:** {str(photo_error)}")
@@ -2921,19 +2871,15 @@ class SmartTelegramBot:
             upload_method = "Telethon"  # Force Telethon as default uploader
             
             if file_size > self.config.SIZE_LIMIT:
-                free_check = 0
-                if 'chk_user' in globals():
-                    free_check = await chk_user(chat_id, sender)
-                
-                if free_check == 1 or not self.pro_client:
+                if not is_premium or not self.pro_client:
                     # Split file for free users or when pro client unavailable
                     await edit_msg.delete()
                     await self.file_ops.split_large_file(file_path, app, sender, target_chat_id, caption, topic_id)
-                    return
+                    return {"file_info": file_info}
                 else:
                     # Use 2GB uploader
-                    await self.handle_large_file_upload(file_path, sender, edit_msg, caption, original_thumb_path=original_thumb_path, original_thumb_is_temp=original_thumb_is_temp)
-                    return
+                    await self.handle_large_file_upload(file_path, sender, edit_msg, caption, original_thumb_path=original_thumb_path, original_thumb_is_temp=original_thumb_is_temp, is_premium=is_premium)
+                    return {"file_info": file_info}
             
             # Regular upload — preserve native media types for group chat batch
             # If we were able to determine media_type and have a file_path, try native send_* first
@@ -2964,6 +2910,7 @@ class SmartTelegramBot:
                     reply_markup=reply_markup,
                     created_progress_msg=created_progress_msg,
                     is_batch_operation=(edit_id is None),
+                    is_premium=is_premium,
                 )
             else:
                 # Fallback error message if Telethon client not available
@@ -2977,6 +2924,7 @@ class SmartTelegramBot:
             await app.edit_message_text(sender, edit_id, "❌ Access denied. Have you joined the channel?")
             raise Exception(f"Access denied: {str(e)}")
         except Exception as e:
+            session_error = e
             print(f"Error in message handling: {e}")
             try:
                 await app.edit_message_text(sender, edit_id, f"❌ Error: {str(e)[:100]}...")
@@ -2985,7 +2933,7 @@ class SmartTelegramBot:
             # Mark metrics as error
             try:
                 if dl_task_id:
-                    await metrics.finish_task(dl_task_id, status="error")
+                    await metrics.finish_task(dl_task_id, status="error", size=file_info.get("size", 0))
             except Exception:
                 pass
             raise  # Re-raise the exception so batch processing can handle it properly
@@ -3017,8 +2965,7 @@ class SmartTelegramBot:
                     print(f"⚠️ Error stopping user session client: {e}")
             # Release the admin session back to the pool if we got one
             elif pooled_client and session_id:
-                had_error = 'e' in locals()
-                await session_pool.release_session(session_id, had_error=had_error)
+                await session_pool.release_session(session_id, error=session_error, method_class=METHOD_DOWNLOAD)
                 print(f"📥 DOWNLOAD: Finished downloading using admin session {session_id} from {chat_id}")
             else:
                 print(f"📥 DOWNLOAD: Finished downloading using default client from {chat_id}")
@@ -3026,11 +2973,17 @@ class SmartTelegramBot:
             # Cleanup
             if file_path:
                 await self.file_ops._cleanup_file(file_path)
+            elif dl_status == "canceled" and target_path:
+                # Interrupted mid-transfer: drop whatever part of the file was written
+                for partial in (target_path, f"{target_path}.temp"):
+                    await self.file_ops._cleanup_file(partial)
+            if fetch:
+                fetch.release()
             gc.collect()
             # Finish metrics
             try:
                 if dl_task_id:
-                    await metrics.finish_task(dl_task_id, status=dl_status)
+                    await metrics.finish_task(dl_task_id, status=dl_status, size=file_info.get("size", 0))
             except Exception:
                 pass
             # Clear cancel flag if set (avoid stale cancellation across next attempts)
@@ -3039,9 +2992,97 @@ class SmartTelegramBot:
                     await cancel_manager.clear(sender)
             except Exception:
                 pass
-            
-            # Return file information for batch processing
-            return {"file_info": file_info}
+
+        # Return file information for batch processing (outside the finally, so
+        # errors and cancellation reach the caller)
+        return {"file_info": file_info}
+
+    def _server_copy_eligible(self, sender: int, msg) -> bool:
+        """A copy keeps the source file name and thumbnail, so it is only used when the
+        download path would not change them: no custom thumbnail, and for named media
+        the user's rename tag (default included) and word filters leave the name as is"""
+        if self.get_thumbnail_path(sender):
+            return False
+        for attr in ("document", "video", "audio", "animation"):
+            media = getattr(msg, attr, None)
+            if media:
+                file_name = getattr(media, "file_name", None)
+                return bool(file_name) and self.file_ops.keeps_file_name(file_name, sender)
+        # Photos, voice notes, stickers, text: no visible file name
+        return True
+
+    async def _deliver_server_copy(self, log_group_msg_id: int, sender: int, target_chat_id: int, topic_id: Optional[int],
+                                   caption: str, caption_entities: Optional[Any], is_premium: Optional[bool]) -> None:
+        """Copy a LOG_GROUP message to the user's target chat/topic with their caption settings applied"""
+        kwargs = {"message_thread_id": topic_id} if topic_id else {}
+        processed = await self.process_user_caption(caption, sender)
+        if processed != (caption or None):
+            # Word filters or a custom caption changed the text: send it the way uploads do
+            kwargs["caption"] = await self.caption_formatter.markdown_to_html(processed) if processed else ""
+            kwargs["parse_mode"] = ParseMode.HTML
+        elif caption_entities:
+            kwargs["caption_entities"] = caption_entities
+        if is_premium is None:
+            is_premium = await chk_user(sender, sender) != 1
+        if not is_premium:
+            kwargs["protect_content"] = True
+            kwargs["reply_markup"] = InlineKeyboardMarkup([[
+                InlineKeyboardButton("💎 Get Premium to Forward", url="https://t.me/ZeroTrace0x")
+            ]])
+        await app.copy_message(target_chat_id, LOG_GROUP, log_group_msg_id, **kwargs)
+
+    async def _server_side_copy(self, client_to_use, msg, chat_id, msg_id, pooled_client, is_user_session: bool = False) -> Optional[int]:
+        """Copy the source message into LOG_GROUP without downloading it.
+
+        Returns the LOG_GROUP message id, or None when a server-side copy is not
+        allowed (protected content, or no admin-tier session can read the source).
+        The user's own session never writes to LOG_GROUP; pool/userbot sessions
+        and the Telethon admin/pro clients do.
+        """
+        if getattr(msg, "has_protected_content", False):
+            return None
+        if getattr(getattr(msg, "chat", None), "has_protected_content", False):
+            return None
+
+        # Pyrogram pool/userbot session that already read the message: copy_message keeps caption/entities
+        if client_to_use is not None and not is_user_session and \
+                getattr(client_to_use.__class__, "__module__", "").startswith("pyrogram"):
+            try:
+                src_chat = getattr(getattr(msg, "chat", None), "id", None) or chat_id
+                copied = await client_to_use.copy_message(LOG_GROUP, src_chat, int(getattr(msg, "id", None) or msg_id))
+                if copied is not None and getattr(copied, "id", None):
+                    return copied.id
+            except Exception as e:
+                print(f"ℹ️ Server-side copy via reading session failed: {e}")
+
+        # Telethon admin/pro client: forward (the bot drops the author when delivering)
+        from telethon.sync import TelegramClient as _TeleClient
+        upload_candidate = None
+        if pooled_client and isinstance(pooled_client, _TeleClient):
+            upload_candidate = pooled_client
+        elif self.pro_client and isinstance(self.pro_client, _TeleClient):
+            upload_candidate = self.pro_client
+        elif gf and isinstance(gf, _TeleClient):
+            upload_candidate = gf
+        if upload_candidate is None:
+            return None
+        try:
+            src_entity = chat_id
+            try:
+                src_entity = await upload_candidate.get_entity(chat_id)
+            except Exception:
+                src_entity = chat_id
+            fwd = await upload_candidate.forward_messages(
+                entity=LOG_GROUP,
+                messages=int(msg_id),
+                from_peer=src_entity
+            )
+            if isinstance(fwd, list):
+                fwd = fwd[0] if fwd else None
+            return getattr(fwd, "id", None)
+        except Exception as e:
+            print(f"ℹ️ Server-side forward via admin client failed: {e}")
+            return None
 
     async def _parse_message_link(self, msg_link: str, offset: int, protected_channels: Set[int], sender: int, edit_id: int) -> Tuple[Optional[int], Optional[int]]:
         """Parse different types of message links"""
@@ -3391,8 +3432,8 @@ class SmartTelegramBot:
                     
                     # Log user session usage
                     try:
-                        me = await user_session_client.get_me()
-                        username = me.username or f"user_{me.id}"
+                        ident = await identity_cache.get_me(user_session_client)
+                        username = ident.username or f"user_{ident.me_id}"
                         print(f"📥 DOWNLOAD: Using user's own session (@{username}) for downloading story from {chat_id}")
                     except Exception:
                         print(f"📥 DOWNLOAD: Using user's own session (username unknown) for downloading story from {chat_id}")
@@ -3406,13 +3447,13 @@ class SmartTelegramBot:
             
             # If user session failed, try admin session pool as fallback
             if not user_session_client:
-                pooled_client, session_id = await session_pool.get_session()
+                pooled_client, session_id = await session_pool.get_session(method_class=METHOD_DOWNLOAD)
                 
                 # Log which client is being used
                 if pooled_client and session_id:
                     try:
-                        me = await pooled_client.get_me()
-                        username = me.username or f"user_{me.id}"
+                        ident = await identity_cache.get_me(pooled_client)
+                        username = ident.username or f"user_{ident.me_id}"
                         print(f"📥 DOWNLOAD: Using admin session {session_id} (@{username}) as fallback for downloading story from {chat_id}")
                     except Exception:
                         print(f"📥 DOWNLOAD: Using admin session {session_id} (username unknown) as fallback for downloading story from {chat_id}")
@@ -3524,7 +3565,7 @@ class SmartTelegramBot:
                         print(f"🔍 USER SESSION: Fetching from topic {self._source_topic_id} in group {chat_id}")
                         try:
                             # Get message directly and verify it belongs to the topic
-                            msg = await user_session_client.get_messages(chat_id, message_id)
+                            msg = await message_cache.get_message(user_session_client, chat_id, message_id)
                             if msg:
                                 # Check if message belongs to the topic thread
                                 # In Pyrogram, topic messages have reply_to_message_id pointing to the topic root
@@ -3535,16 +3576,14 @@ class SmartTelegramBot:
                                 else:
                                     # Try to get the message history around this ID to verify topic membership
                                     try:
-                                        # Get a few messages around this ID to check topic context
-                                        context_msgs = await user_session_client.get_messages(chat_id, list(range(max(1, message_id-2), message_id+3)))
-                                        topic_found = False
-                                        for ctx_msg in context_msgs:
-                                            if ctx_msg and hasattr(ctx_msg, 'reply_to_message_id') and ctx_msg.reply_to_message_id == self._source_topic_id:
-                                                topic_found = True
-                                                break
-                                            elif ctx_msg and hasattr(ctx_msg, 'message_thread_id') and ctx_msg.message_thread_id == self._source_topic_id:
-                                                topic_found = True
-                                                break
+                                        # Check a few messages around this ID for topic context (cached metadata; only unknown ids are fetched)
+                                        context_metas = await message_cache.get_metas(
+                                            user_session_client, chat_id, range(max(1, message_id-2), message_id+3)
+                                        )
+                                        topic_found = any(
+                                            meta.thread_id == self._source_topic_id or meta.reply_to_id == self._source_topic_id
+                                            for meta in context_metas.values()
+                                        )
                                         
                                         if topic_found:
                                             print(f"✅ USER SESSION: Message {message_id} verified in topic {self._source_topic_id} via context")
@@ -3561,7 +3600,7 @@ class SmartTelegramBot:
                             print(f"⚠️ USER SESSION: Topic message access failed: {topic_err}")
                             msg = None
                     else:
-                        msg = await user_session_client.get_messages(chat_id, message_id)
+                        msg = await message_cache.get_message(user_session_client, chat_id, message_id)
                     client_to_use = user_session_client
                     print(f"✅ User session successfully accessed public group {chat_id}")
                     
@@ -3578,14 +3617,14 @@ class SmartTelegramBot:
             if not msg:
                 try:
                     print(f"🔄 Trying session pool for public group {chat_id}")
-                    pooled_client, session_id = await session_pool.get_session()
+                    pooled_client, session_id = await session_pool.get_session(method_class=METHOD_DOWNLOAD)
                     if pooled_client:
                         # Handle topic groups consistently
                         if hasattr(self, '_source_topic_id') and self._source_topic_id:
                             print(f"🔍 SESSION POOL: Fetching from topic {self._source_topic_id} in group {chat_id}")
                             try:
                                 # Get message and verify topic membership
-                                msg = await pooled_client.get_messages(chat_id, message_id)
+                                msg = await message_cache.get_message(pooled_client, chat_id, message_id)
                                 if msg:
                                     # Check topic membership using available attributes
                                     if hasattr(msg, 'reply_to_message_id') and msg.reply_to_message_id == self._source_topic_id:
@@ -3602,7 +3641,7 @@ class SmartTelegramBot:
                                 print(f"⚠️ SESSION POOL: Topic verification failed: {topic_err}")
                                 msg = None
                         else:
-                            msg = await pooled_client.get_messages(chat_id, message_id)
+                            msg = await message_cache.get_message(pooled_client, chat_id, message_id)
                         client_to_use = pooled_client
                         print(f"✅ Session pool successfully accessed public group {chat_id}")
                         if msg:
@@ -3623,9 +3662,9 @@ class SmartTelegramBot:
                         pooled_client = None
                         session_id = None
                 except FloodWait as fw:
-                    print(f"⏳ Session pool: FloodWait {fw.x}s for {chat_id}")
+                    print(f"⏳ Session pool: FloodWait {fw.value}s for {chat_id}")
                     if pooled_client and session_id:
-                        await session_pool.release_session(session_id, had_error=True, flood_wait_seconds=fw.x)
+                        await session_pool.release_session(session_id, had_error=True, flood_wait_seconds=fw.value, method_class=METHOD_DOWNLOAD)
                         pooled_client = None
                         session_id = None
                 except Exception as pool_err:
@@ -3742,19 +3781,6 @@ class SmartTelegramBot:
                         session_type = "user session" if user_session_client else "bot"
                         print(f"📥 Processing media message using {session_type} from {chat_id}")
                         
-                        # Premium-only: Handle albums/media groups in one shot
-                        try:
-                            is_premium_user = False
-                            try:
-                                prem_doc = await check_premium(sender)
-                                is_premium_user = bool(prem_doc) or (sender in OWNER_ID)
-                            except Exception:
-                                is_premium_user = sender in OWNER_ID
-                            # Album handling removed: always treat as single message
-                        except Exception:
-                            # Ignore album branch errors and continue with single message flow
-                            pass
-                        
                         # Try to copy the media message directly
                         try:
                             # If message is part of a media group, skip copy to avoid preserving album grouping
@@ -3804,12 +3830,11 @@ class SmartTelegramBot:
                                         if total > threshold:
                                             percent = (current / total) * 100 if total else 0
                                             progress_text = (
-                                                f"📥 **Downloading from public group**\n\n"
-                                                f"📊 **Progress**: {percent:.1f}%\n"
-                                                f"📦 **Size**: {self.progress_manager._format_bytes(current)} / {self.progress_manager._format_bytes(total)}"
+                                                f"📥 <b>Downloading from public group</b>\n\n"
+                                                f"📊 <b>Progress</b>: {percent:.1f}%\n"
+                                                f"📦 <b>Size</b>: {self.progress_manager._format_bytes(current)} / {self.progress_manager._format_bytes(total)}"
                                             )
-                                            html_progress = await self.caption_formatter.markdown_to_html(progress_text)
-                                            await app.edit_message_text(sender, edit_id, html_progress, parse_mode=ParseMode.HTML)
+                                            await app.edit_message_text(sender, edit_id, progress_text, parse_mode=ParseMode.HTML)
                                     except Exception:
                                         pass
                             try:
@@ -3829,7 +3854,13 @@ class SmartTelegramBot:
                                 if not download_client:
                                     raise Exception("No client available for download")
                                     
-                                file_path = await download_client.download_media(msg, progress=dl_cb)
+                                try:
+                                    file_path = await download_client.download_media(msg, progress=dl_cb)
+                                except Exception as ref_err:
+                                    if not is_file_reference_error(ref_err):
+                                        raise
+                                    msg = await message_cache.refresh_message(download_client, chat_id, message_id)
+                                    file_path = await download_client.download_media(msg, progress=dl_cb)
                                 
                                 # Update session_type to reflect actual client used
                                 if download_client == user_session_client:
@@ -4056,8 +4087,7 @@ class SmartTelegramBot:
                                 eta = eta / 2 if eta > 0 else 0
                                 eta_str = self.progress_manager._format_time(eta) if eta > 0 else "Calculating..."
                                 progress_text = UnifiedProgressBar.format_progress_message(percent, current, total, speed_display, eta_str, "download")
-                                html_progress = await CaptionFormatter.markdown_to_html(progress_text)
-                                await app.edit_message_text(sender, edit_id, html_progress, parse_mode=ParseMode.HTML)
+                                await app.edit_message_text(sender, edit_id, progress_text, parse_mode=ParseMode.HTML)
                             except Exception:
                                 pass
                     try:
@@ -4254,8 +4284,7 @@ class SmartTelegramBot:
                                         # Show progress for files above threshold
                                         if total > threshold:
                                             progress_text = UnifiedProgressBar.format_progress_message(percent, current, total, speed_display, eta_str, "download")
-                                            html_progress = await CaptionFormatter.markdown_to_html(progress_text)
-                                            await app.edit_message_text(sender, edit_id, html_progress, parse_mode=ParseMode.HTML)
+                                            await app.edit_message_text(sender, edit_id, progress_text, parse_mode=ParseMode.HTML)
                                     except Exception:
                                         pass
                             try:
@@ -4312,15 +4341,7 @@ class SmartTelegramBot:
 
     async def _format_caption_with_custom(self, original_caption: str, sender: int, custom_caption: str) -> str:
         """Format caption with user preferences"""
-        delete_words = set(self.db.get_user_data(sender, "delete_words", []))
-        replacements = self.db.get_user_data(sender, "replacement_words", {})
-        
-        processed = original_caption
-        for word in delete_words:
-            processed = processed.replace(word, '  ')
-        
-        for word, replace_word in replacements.items():
-            processed = processed.replace(word, replace_word)
+        processed = self.db.get_word_filter(sender).apply(original_caption, deleted='  ')
         
         if custom_caption:
             return f"{processed}\n\n__**{custom_caption}**__" if processed else f"__**{custom_caption}**__"
@@ -4424,23 +4445,14 @@ class DashboardManager:
     
     async def get_user_stats(self) -> Dict[str, any]:
         """Get user-related statistics"""
-        from devgagan.core.mongo.users_db import get_users, get_users_excluding_bots
+        from devgagan.core.mongo.users_db import get_user_counts
         from devgagan.core.mongo.plans_db import premium_users
         
-        # Get accurate user count excluding bots
-        try:
-            real_users = await get_users_excluding_bots()
-            real_user_count = len(real_users)
-            all_users = await get_users()
-            total_entries = len(all_users)
-            bot_count = total_entries - real_user_count
-        except Exception as e:
-            # Fallback to old method if new function fails
-            print(f"⚠️ Bot filtering failed in dashboard, using fallback: {e}")
-            all_users = await get_users()
-            real_user_count = len(all_users)
-            total_entries = real_user_count
-            bot_count = 0
+        # Indexed counts over the stored is_bot classification
+        counts = await get_user_counts()
+        real_user_count = counts["real"]
+        total_entries = counts["total"]
+        bot_count = counts["bots"]
         
         premium_list = await premium_users()
         premium_count = len(premium_list)
@@ -4833,14 +4845,15 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
         except Exception:
             priority = 1
 
-        # Derive a human-readable tier label for logging
-        try:
-            if sender in OWNER_ID:
-                tier_label = "owner"
-            else:
-                tier_label = "premium" if await check_premium(sender) else "free"
-        except Exception:
-            tier_label = "unknown"
+        # Derive a human-readable tier label for logging (no extra lookup: chk_user already resolved it)
+        is_premium = priority == 0
+        if sender in OWNER_ID:
+            tier_label = "owner"
+        else:
+            tier_label = "premium" if is_premium else "free"
+
+        # A /cancel sent while this link is still queued must count against it
+        cancel_generation = cancel_manager.token(sender).generation
 
         # For FREE users, acquire a slot in the brutal global download queue BEFORE internal enqueue
         queue_acquired = False
@@ -4895,7 +4908,12 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                     return await cancel_manager.is_cancelled(sender)
                 except Exception:
                     return False
-            await download_queue.acquire(sender, msg_link, _update_cb, cancel_check=_cancel_check)
+            queue_wait_started = time.monotonic()
+            metrics.queue_enter("free", "free")
+            try:
+                await download_queue.acquire(sender, msg_link, _update_cb, cancel_check=_cancel_check)
+            finally:
+                metrics.queue_leave("free", "free", time.monotonic() - queue_wait_started)
             queue_acquired = True
             # Once acquired, restore the downloading UI if we had an edit_id
             try:
@@ -4910,7 +4928,10 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
         try:
             if priority == 1:
                 # Run the download directly now that we hold a global slot
-                result = await telegram_bot.handle_message_download(userbot, sender, edit_id, msg_link, i, message)
+                result = await cancel_manager.run(
+                    sender, telegram_bot.handle_message_download(userbot, sender, edit_id, msg_link, i, message, is_premium=is_premium),
+                    generation=cancel_generation,
+                )
             else:
                 try:
                     print(f"[QUEUE] Enqueue user={sender} tier={tier_label} priority={priority} link={msg_link}")
@@ -4918,7 +4939,10 @@ async def get_msg(userbot, sender, edit_id, msg_link, i, message):
                     pass
                 result = await telegram_bot.enqueue_download(
                     priority,
-                    lambda: telegram_bot.handle_message_download(userbot, sender, edit_id, msg_link, i, message)
+                    lambda: cancel_manager.run(
+                        sender, telegram_bot.handle_message_download(userbot, sender, edit_id, msg_link, i, message, is_premium=is_premium),
+                        generation=cancel_generation,
+                    )
                 )
         finally:
             # Release global queue slot for free tier and cleanup temp status
@@ -0,0 +1,164 @@
+"""
+Per-client identity and peer cache.
+
+Upload and download paths used to call get_me() for a log line and
+get_chat/get_entity(LOG_GROUP) as a "warm-up" on every file, and
+app.get_users(sender) just to label metrics. Those answers do not change
+while a client is running, so they are cached per client object:
+
+- `me` (id/username) - Pyrogram already stores it on start(), Telethon is
+  asked once
+- peers that were resolved successfully (LOG_GROUP in particular); an entry
+  is only dropped when a call fails with CHANNEL_INVALID / PEER_ID_INVALID
+- recently seen users (id -> username), shared by all clients
+- when the client last answered a liveness probe (probe()), so the pool's
+  health check costs at most one get_me per client per interval
+
+SessionPool primes each client when it starts it, so the hot path makes no
+warm-up calls at all. Entries live as long as the client object does.
+"""
+
+import os
+import time
+import weakref
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Optional, Set
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+SEEN_USERS_CACHE_SIZE: int = _to_int(os.getenv("SEEN_USERS_CACHE_SIZE"), 10000)
+
+_PEER_ERRORS = ("CHANNEL_INVALID", "PEER_ID_INVALID", "CHAT_ID_INVALID", "CHANNEL_PRIVATE")
+
+
+def is_peer_error(err: BaseException) -> bool:
+    """Errors that mean a cached peer is no longer usable (Pyrogram and Telethon spellings)"""
+    text = f"{type(err).__name__} {err}".upper()
+    return any(code in text or code.replace("_", "") in text for code in _PEER_ERRORS)
+
+
+def _is_telethon(client) -> bool:
+    return getattr(client.__class__, "__module__", "").startswith("telethon")
+
+
+@dataclass
+class ClientIdentity:
+    me_id: Optional[int] = None
+    username: Optional[str] = None
+    peers: Set[object] = field(default_factory=set)
+    updated_at: float = field(default_factory=time.time)
+    checked_at: float = 0.0  # last time the client was known to answer (start or probe)
+
+    @property
+    def display(self) -> str:
+        if self.username:
+            return f"@{self.username}"
+        return f"@user_{self.me_id}" if self.me_id else "(username unknown)"
+
+
+class IdentityCache:
+    def __init__(self):
+        self._clients: "weakref.WeakKeyDictionary[object, ClientIdentity]" = weakref.WeakKeyDictionary()
+        self._users: "OrderedDict[int, str]" = OrderedDict()
+
+    def _entry(self, client) -> ClientIdentity:
+        entry = self._clients.get(client)
+        if entry is None:
+            entry = ClientIdentity()
+            self._clients[client] = entry
+        return entry
+
+    # --- identity ---------------------------------------------------------
+
+    async def get_me(self, client) -> ClientIdentity:
+        entry = self._entry(client)
+        if entry.me_id is None:
+            me = None if _is_telethon(client) else getattr(client, "me", None)
+            if me is None:
+                me = await client.get_me()
+            entry.me_id = getattr(me, "id", None)
+            entry.username = getattr(me, "username", None)
+            entry.updated_at = time.time()
+        return entry
+
+    async def probe(self, client, max_age: float) -> ClientIdentity:
+        """Liveness check: one get_me() unless the client answered within max_age seconds; errors propagate"""
+        entry = self._entry(client)
+        if time.time() - entry.checked_at < max_age:
+            return entry
+        me = await client.get_me()
+        entry.me_id = getattr(me, "id", entry.me_id)
+        entry.username = getattr(me, "username", entry.username)
+        entry.updated_at = entry.checked_at = time.time()
+        return entry
+
+    async def display_name(self, client) -> str:
+        """'@username' of the client's account, never raises"""
+        try:
+            return (await self.get_me(client)).display
+        except Exception:
+            return "(username unknown)"
+
+    # --- peers ------------------------------------------------------------
+
+    async def ensure_peer(self, client, chat_id) -> None:
+        """Resolve chat_id once per client (get_entity / get_chat); errors propagate and are not cached"""
+        entry = self._entry(client)
+        if chat_id in entry.peers:
+            return
+        if _is_telethon(client):
+            await client.get_entity(chat_id)
+        else:
+            await client.get_chat(chat_id)
+        entry.peers.add(chat_id)
+
+    def invalidate_peer(self, client, chat_id) -> None:
+        entry = self._clients.get(client)
+        if entry is not None:
+            entry.peers.discard(chat_id)
+
+    async def prime(self, client, *chat_ids) -> None:
+        """Fill identity and peers for a freshly started client (best effort)"""
+        self._entry(client).checked_at = time.time()  # it just connected
+        try:
+            await self.get_me(client)
+        except Exception:
+            pass
+        for chat_id in chat_ids:
+            try:
+                await self.ensure_peer(client, chat_id)
+            except Exception as e:
+                print(f"⚠️ IDENTITY CACHE: could not resolve {chat_id}: {e}")
+
+    # --- users ------------------------------------------------------------
+
+    def remember_user(self, user) -> None:
+        user_id = getattr(user, "id", None)
+        if not user_id:
+            return
+        self._users[int(user_id)] = getattr(user, "username", None) or getattr(user, "first_name", None) or ""
+        self._users.move_to_end(int(user_id))
+        while len(self._users) > SEEN_USERS_CACHE_SIZE:
+            self._users.popitem(last=False)
+
+    async def username_for(self, client, user_id: int, hint=None) -> str:
+        """Username (or first name) of a user; uses the hint/cache before calling get_users"""
+        if hint is not None and getattr(hint, "id", None) == user_id:
+            self.remember_user(hint)
+        name = self._users.get(int(user_id))
+        if name is None:
+            user = await client.get_users(user_id)
+            self.remember_user(user)
+            name = self._users.get(int(user_id), "")
+        return name
+
+
+# Global instance
+identity_cache = IdentityCache()
@@ -0,0 +1,165 @@
+"""
+Event-loop lag sampler, slow-callback detector and sampling profiler.
+
+- Lag: a background task sleeps LOOP_LAG_INTERVAL seconds and measures how
+  late it wakes up (scheduled vs actual monotonic time). The difference is
+  time the loop spent running something else without yielding: blocking
+  calls, hashing, sync database drivers.
+- Slow callbacks: a watchdog thread notices when that task has not woken up
+  for SLOW_CALLBACK_THRESHOLD seconds past its deadline and captures the loop
+  thread's stack while it is still blocked. Stalls are kept in a ring buffer
+  of SLOW_CALLBACK_HISTORY entries.
+- Profiling: profile(seconds) samples every thread's stack from a helper
+  thread and returns them in collapsed-stack form ("a;b;c count" per line),
+  ready for flamegraph.pl / speedscope.
+"""
+
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from devgagan.core.metrics import Histogram
+
+
+def _to_float(val: Optional[str], default: float) -> float:
+    try:
+        return float(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+LOOP_LAG_INTERVAL: float = _to_float(os.getenv("LOOP_LAG_INTERVAL"), 0.5)
+SLOW_CALLBACK_THRESHOLD: float = _to_float(os.getenv("SLOW_CALLBACK_THRESHOLD"), 0.25)
+SLOW_CALLBACK_HISTORY: int = _to_int(os.getenv("SLOW_CALLBACK_HISTORY"), 20)
+PROFILE_SAMPLE_INTERVAL: float = _to_float(os.getenv("PROFILE_SAMPLE_INTERVAL"), 0.005)
+PROFILE_MAX_SECONDS: int = 120
+LAG_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})".replace(";", ":")
+
+
+def _collapse(frame, root: str) -> str:
+    labels = []
+    while frame is not None:
+        code = frame.f_code
+        labels.append(f"{code.co_name} ({os.path.basename(code.co_filename)})".replace(";", ":"))
+        frame = frame.f_back
+    labels.append(root)
+    return ";".join(reversed(labels))
+
+
+class LoopMonitor:
+    def __init__(self):
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.histogram = Histogram(LAG_BUCKETS)
+        self.slow_callbacks: Deque[Dict[str, object]] = deque(maxlen=SLOW_CALLBACK_HISTORY)
+        self._task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._loop_thread: Optional[int] = None
+        self._deadline = 0.0  # monotonic time the sampler should wake up by
+        self._profiling = threading.Lock()
+
+    def start(self) -> None:
+        if self._task is None or self._task.done():
+            self._loop_thread = threading.get_ident()
+            self._deadline = time.monotonic() + LOOP_LAG_INTERVAL
+            self._task = asyncio.get_running_loop().create_task(self._sample_loop())
+            print(f"🩺 LOOP MONITOR: sampling event-loop lag every {LOOP_LAG_INTERVAL}s, "
+                  f"capturing stacks of stalls over {SLOW_CALLBACK_THRESHOLD}s")
+        if SLOW_CALLBACK_THRESHOLD > 0 and (self._watchdog is None or not self._watchdog.is_alive()):
+            self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+            self._watchdog.start()
+
+    async def _sample_loop(self) -> None:
+        while True:
+            expected = time.monotonic() + LOOP_LAG_INTERVAL
+            self._deadline = expected
+            await asyncio.sleep(LOOP_LAG_INTERVAL)
+            self.lag = max(0.0, time.monotonic() - expected)
+            self.max_lag = max(self.max_lag, self.lag)
+            self.histogram.observe(self.lag)
+            if self.lag >= SLOW_CALLBACK_THRESHOLD and self.slow_callbacks:
+                last = self.slow_callbacks[-1]
+                if last.get("deadline") == expected:
+                    # The watchdog caught this stall; now we know how long it lasted
+                    last["duration"] = round(self.lag, 3)
+
+    def _watch(self) -> None:
+        reported = 0.0
+        while True:
+            time.sleep(max(SLOW_CALLBACK_THRESHOLD / 2, 0.01))
+            deadline = self._deadline
+            overdue = time.monotonic() - deadline
+            if overdue < SLOW_CALLBACK_THRESHOLD or deadline == reported:
+                continue
+            frame = sys._current_frames().get(self._loop_thread)
+            if frame is None:
+                continue
+            reported = deadline
+            stack = traceback.format_stack(frame, limit=12)
+            self.slow_callbacks.append({
+                "at": time.time(),
+                "deadline": deadline,
+                "duration": round(overdue, 3),  # updated once the loop wakes up
+                "where": _frame_label(frame),
+                "stack": "".join(stack),
+            })
+            print(f"🐢 LOOP MONITOR: event loop blocked for {overdue:.2f}s+ in {_frame_label(frame)}")
+
+    # --- profiler ---------------------------------------------------------
+
+    def _sample(self, seconds: float) -> Dict[str, int]:
+        skip = {threading.get_ident(), getattr(self._watchdog, "ident", None)}
+        names = {t.ident: t.name for t in threading.enumerate()}
+        stacks: Dict[str, int] = {}
+        end = time.monotonic() + seconds
+        while time.monotonic() < end:
+            for ident, frame in sys._current_frames().items():
+                if ident in skip:
+                    continue
+                root = "event-loop" if ident == self._loop_thread else names.get(ident, f"thread-{ident}")
+                key = _collapse(frame, root)
+                stacks[key] = stacks.get(key, 0) + 1
+            time.sleep(PROFILE_SAMPLE_INTERVAL)
+        return stacks
+
+    async def profile(self, seconds: float) -> str:
+        """Sample all threads for `seconds`; returns collapsed stacks, hottest first"""
+        seconds = min(max(float(seconds), 1.0), PROFILE_MAX_SECONDS)
+        if not self._profiling.acquire(blocking=False):
+            raise RuntimeError("A profile is already running")
+        try:
+            stacks = await asyncio.to_thread(self._sample, seconds)
+        finally:
+            self._profiling.release()
+        lines: List[str] = [f"{stack} {count}" for stack, count in sorted(stacks.items(), key=lambda kv: -kv[1])]
+        return "\n".join(lines) + "\n"
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "lag": round(self.lag, 4),
+            "max_lag": round(self.max_lag, 4),
+            "p99": self.histogram.quantile(0.99) or 0.0,
+            "samples": self.histogram.n,
+            "slow_callbacks": len(self.slow_callbacks),
+        }
+
+
+# Global instance
+loop_monitor = LoopMonitor()
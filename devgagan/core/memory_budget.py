@@ -0,0 +1,122 @@
+"""
+RAM-only transfer path for small media.
+
+Photos, voice notes, audio and small documents are downloaded with
+`download_media(in_memory=True)` and uploaded straight from the returned
+BytesIO, skipping the write -> reopen -> remove round trip through
+downloads/. The buffer's `name` carries the logical filename, and hashing and
+sizes are computed from the buffer.
+
+All in-memory transfers share a global byte budget. When a burst would exceed
+it, the transfer falls back to the regular disk path instead of waiting, so
+RSS stays bounded without slowing anything down.
+"""
+
+import io
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+# Largest media (MB) transferred through RAM; 0 disables the in-memory path
+IN_MEMORY_MAX_MB: int = _to_int(os.getenv("IN_MEMORY_MAX_MB"), 20)
+# Total bytes (MB) that in-flight in-memory transfers may hold at once
+MEMORY_BUDGET_MB: int = _to_int(os.getenv("MEMORY_BUDGET_MB"), 256)
+
+# Telegram media kinds, and upload file types (by extension), that may skip the disk.
+# Videos and animations stay on disk: metadata and thumbnails need a real path.
+IN_MEMORY_MEDIA = ("photo", "sticker", "voice", "audio", "document")
+IN_MEMORY_FILE_TYPES = ("photo", "voice", "audio", "document")
+
+
+def is_buffer(src) -> bool:
+    return isinstance(src, io.BytesIO)
+
+
+def source_name(src) -> str:
+    """Filename of a path or an in-memory buffer"""
+    if is_buffer(src):
+        return getattr(src, "name", None) or ""
+    return os.path.basename(src)
+
+
+def source_size(src) -> int:
+    if is_buffer(src):
+        return src.getbuffer().nbytes
+    return os.path.getsize(src)
+
+
+def source_exists(src) -> bool:
+    if is_buffer(src):
+        return not src.closed
+    return bool(src) and os.path.exists(src)
+
+
+@dataclass
+class MemoryReservation:
+    key: str
+    size: int
+    created_at: float = field(default_factory=time.time)
+
+
+class MemoryBudget:
+    def __init__(self, max_file_bytes: int, limit_bytes: int):
+        self.max_file_bytes = max_file_bytes
+        self.limit_bytes = limit_bytes
+        self._reservations: Dict[str, MemoryReservation] = {}
+        self._reserved_bytes = 0
+        self.in_memory_transfers = 0
+        self.fallbacks = 0
+
+    @property
+    def reserved_bytes(self) -> int:
+        return self._reserved_bytes
+
+    def eligible(self, media_type: Optional[str], file_size: Optional[int], file_type: Optional[str]) -> bool:
+        """Whether a transfer may use the in-memory path at all (size must be known)"""
+        if self.max_file_bytes <= 0 or not file_size:
+            return False
+        if file_size > self.max_file_bytes:
+            return False
+        return media_type in IN_MEMORY_MEDIA and file_type in IN_MEMORY_FILE_TYPES
+
+    def try_reserve(self, key: str, size: int) -> Optional[MemoryReservation]:
+        """Reserve `size` bytes without waiting; None means use the disk path instead."""
+        size = max(int(size or 0), 0)
+        if key in self._reservations or self._reserved_bytes + size > self.limit_bytes:
+            self.fallbacks += 1
+            return None
+        res = MemoryReservation(key=key, size=size)
+        self._reservations[key] = res
+        self._reserved_bytes += size
+        self.in_memory_transfers += 1
+        return res
+
+    def release(self, key: Optional[str]) -> None:
+        """Drop a reservation (no-op for unknown keys)"""
+        if not key:
+            return
+        res = self._reservations.pop(key, None)
+        if res is not None:
+            self._reserved_bytes -= res.size
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "reservations": len(self._reservations),
+            "reserved_mb": self._reserved_bytes / (1024 * 1024),
+            "limit_mb": self.limit_bytes / (1024 * 1024),
+            "in_memory_transfers": self.in_memory_transfers,
+            "fallbacks": self.fallbacks,
+        }
+
+
+# Global instance
+memory_budget = MemoryBudget(IN_MEMORY_MAX_MB * 1024 * 1024, MEMORY_BUDGET_MB * 1024 * 1024)
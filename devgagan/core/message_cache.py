@@ -0,0 +1,269 @@
+"""
+Source message / chat metadata cache.
+
+Two tiers shared by the link handlers and the batch planner:
+
+- Message metadata keyed on (chat, message_id): media type, size, file name,
+  file_unique_id, thread ids and the protected flag, in an LRU with a short
+  TTL. Parsed Message objects are kept in a smaller LRU per account and
+  rebound to the calling client on a hit, so retries and repeated links
+  skip get_messages; when a download fails with FILE_REFERENCE_EXPIRED the
+  object is dropped and fetched again (refresh_message).
+- Chat facts (id, username, type, protected, forum) with a longer TTL, plus
+  a username -> id alias map, replacing the get_chat calls made per link.
+
+Chats are keyed by numeric id when known, otherwise by lower-cased username.
+Cache misses are fetched through the session's request queue.
+"""
+
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from devgagan.core.request_queue import request_dispatcher
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+MESSAGE_META_CACHE_SIZE: int = _to_int(os.getenv("MESSAGE_META_CACHE_SIZE"), 20000)
+MESSAGE_META_TTL: int = _to_int(os.getenv("MESSAGE_META_TTL"), 900)
+MESSAGE_OBJECT_CACHE_SIZE: int = _to_int(os.getenv("MESSAGE_OBJECT_CACHE_SIZE"), 512)
+MESSAGE_OBJECT_TTL: int = _to_int(os.getenv("MESSAGE_OBJECT_TTL"), 300)
+CHAT_FACTS_CACHE_SIZE: int = _to_int(os.getenv("CHAT_FACTS_CACHE_SIZE"), 5000)
+CHAT_FACTS_TTL: int = _to_int(os.getenv("CHAT_FACTS_TTL"), 6 * 3600)
+
+# Pyrogram media attributes, in the order the handlers check them
+_MEDIA_ATTRS = ("document", "video", "photo", "audio", "animation", "voice", "video_note", "sticker")
+
+ChatRef = Union[int, str]
+
+
+@dataclass
+class MessageMeta:
+    chat_id: ChatRef
+    message_id: int
+    empty: bool = False
+    service: bool = False
+    media_type: Optional[str] = None
+    file_size: int = 0
+    file_name: Optional[str] = None
+    file_unique_id: Optional[str] = None
+    thread_id: Optional[int] = None
+    reply_to_id: Optional[int] = None
+    protected: bool = False
+    cached_at: float = field(default_factory=time.time)
+
+    @property
+    def has_media(self) -> bool:
+        return self.media_type is not None
+
+    def in_thread(self, topic_id: int) -> bool:
+        return topic_id in (self.thread_id, self.reply_to_id) or self.message_id == topic_id
+
+
+@dataclass
+class ChatFacts:
+    chat_id: Optional[int]
+    username: Optional[str] = None
+    chat_type: Optional[object] = None  # pyrogram.enums.ChatType
+    protected: bool = False
+    forum: bool = False
+    cached_at: float = field(default_factory=time.time)
+
+
+def is_file_reference_error(err: BaseException) -> bool:
+    return "FILE_REFERENCE_" in str(err)
+
+
+def _account_key(client) -> object:
+    # File references and access hashes belong to the account, not the Client object
+    me = getattr(client, "me", None)
+    return getattr(me, "id", None) or id(client)
+
+
+class _TTLCache:
+    def __init__(self, maxsize: int, ttl: int):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[object, Tuple[float, object]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        item = self._data.get(key)
+        if item is None or time.time() - item[0] > self.ttl:
+            if item is not None:
+                self._data.pop(key, None)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return item[1]
+
+    def put(self, key, value) -> None:
+        self._data[key] = (time.time(), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key) -> None:
+        self._data.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class MessageCache:
+    def __init__(self):
+        self._meta = _TTLCache(MESSAGE_META_CACHE_SIZE, MESSAGE_META_TTL)
+        self._objects = _TTLCache(MESSAGE_OBJECT_CACHE_SIZE, MESSAGE_OBJECT_TTL)
+        self._chats = _TTLCache(CHAT_FACTS_CACHE_SIZE, CHAT_FACTS_TTL)
+        self._aliases: Dict[str, int] = {}  # lower-cased username -> chat id
+
+    # --- keys -------------------------------------------------------------
+
+    def chat_key(self, chat: ChatRef) -> ChatRef:
+        if isinstance(chat, str):
+            name = chat.lstrip("@").lower()
+            if name.lstrip("-").isdigit():
+                return int(name)
+            return self._aliases.get(name, name)
+        return chat
+
+    # --- chat facts -------------------------------------------------------
+
+    def peek_chat(self, chat: ChatRef) -> Optional[ChatFacts]:
+        return self._chats.get(self.chat_key(chat))
+
+    def put_chat(self, chat_obj) -> ChatFacts:
+        username = getattr(chat_obj, "username", None)
+        facts = ChatFacts(
+            chat_id=getattr(chat_obj, "id", None),
+            username=username,
+            chat_type=getattr(chat_obj, "type", None),
+            protected=bool(getattr(chat_obj, "has_protected_content", False)),
+            forum=bool(getattr(chat_obj, "is_forum", False)),
+        )
+        if facts.chat_id is not None:
+            self._chats.put(facts.chat_id, facts)
+        if username:
+            self._aliases[username.lower()] = facts.chat_id
+            self._chats.put(username.lower(), facts)
+        return facts
+
+    async def get_chat_facts(self, client, chat: ChatRef) -> ChatFacts:
+        """Cached chat facts; falls back to client.get_chat (errors propagate, nothing is cached)"""
+        facts = self.peek_chat(chat)
+        if facts is None:
+            facts = self.put_chat(await client.get_chat(chat))
+        return facts
+
+    # --- message metadata -------------------------------------------------
+
+    def peek_meta(self, chat: ChatRef, message_id: int) -> Optional[MessageMeta]:
+        return self._meta.get((self.chat_key(chat), int(message_id)))
+
+    def put_message(self, chat: ChatRef, msg, client=None) -> Optional[MessageMeta]:
+        if msg is None:
+            return None
+        message_id = getattr(msg, "id", None)
+        if message_id is None:
+            return None
+        src_chat = getattr(msg, "chat", None)
+        if isinstance(chat, str) and getattr(src_chat, "id", None) and getattr(src_chat, "username", None):
+            # Learn username -> id from the message itself
+            self._aliases[src_chat.username.lower()] = src_chat.id
+        meta = MessageMeta(
+            chat_id=self.chat_key(chat),
+            message_id=int(message_id),
+            empty=bool(getattr(msg, "empty", False)),
+            service=bool(getattr(msg, "service", False)),
+            thread_id=getattr(msg, "message_thread_id", None) or getattr(msg, "reply_to_top_message_id", None),
+            reply_to_id=getattr(msg, "reply_to_message_id", None),
+            protected=bool(getattr(msg, "has_protected_content", False)),
+        )
+        for attr in _MEDIA_ATTRS:
+            media = getattr(msg, attr, None)
+            if media:
+                meta.media_type = attr
+                meta.file_size = int(getattr(media, "file_size", 0) or 0)
+                meta.file_name = getattr(media, "file_name", None)
+                meta.file_unique_id = getattr(media, "file_unique_id", None)
+                break
+        self._meta.put((meta.chat_id, meta.message_id), meta)
+        if client is not None and not meta.empty:
+            self._objects.put((_account_key(client), meta.chat_id, meta.message_id), msg)
+        return meta
+
+    async def get_message(self, client, chat: ChatRef, message_id: int, refresh: bool = False):
+        """Pyrogram get_messages for one id, served from the per-account object tier when fresh"""
+        key = (_account_key(client), self.chat_key(chat), int(message_id))
+        if not refresh:
+            msg = self._objects.get(key)
+            if msg is not None:
+                # Bound methods (copy, download) use msg._client: the caching
+                # client may have been a per-request session that is now stopped
+                if getattr(msg, "_client", client) is not client:
+                    msg._client = client
+                return msg
+        else:
+            self._objects.pop(key)
+        msg = await request_dispatcher.get_messages(client, chat, int(message_id), label=f"message {message_id}")
+        self.put_message(chat, msg, client)
+        return msg
+
+    async def refresh_message(self, client, chat: ChatRef, message_id: int):
+        """Re-fetch a message whose file reference expired"""
+        print(f"🔁 MESSAGE CACHE: refreshing file reference for {chat}/{message_id}")
+        return await self.get_message(client, chat, message_id, refresh=True)
+
+    async def get_metas(self, client, chat: ChatRef, message_ids: Iterable[int]) -> Dict[int, MessageMeta]:
+        """Metadata for several ids; only ids missing from the cache are fetched (one call)"""
+        out: Dict[int, MessageMeta] = {}
+        missing: List[int] = []
+        for mid in message_ids:
+            meta = self.peek_meta(chat, mid)
+            if meta is None:
+                missing.append(int(mid))
+            else:
+                out[int(mid)] = meta
+        if missing:
+            msgs = await request_dispatcher.get_messages(client, chat, missing, label=f"{len(missing)} metas")
+            if not isinstance(msgs, list):
+                msgs = [msgs]
+            for msg in msgs:
+                meta = self.put_message(chat, msg, client)
+                if meta is not None:
+                    out[meta.message_id] = meta
+        return out
+
+    def invalidate(self, chat: ChatRef, message_id: Optional[int] = None) -> None:
+        key = self.chat_key(chat)
+        if message_id is None:
+            self._chats.pop(key)
+            return
+        self._meta.pop((key, int(message_id)))
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "meta_entries": len(self._meta),
+            "meta_hits": self._meta.hits,
+            "meta_misses": self._meta.misses,
+            "object_entries": len(self._objects),
+            "object_hits": self._objects.hits,
+            "object_misses": self._objects.misses,
+            "chat_entries": len(self._chats),
+            "chat_hits": self._chats.hits,
+            "chat_misses": self._chats.misses,
+        }
+
+
+# Global instance
+message_cache = MessageCache()
@@ -1,15 +1,177 @@
+"""
+Transfer metrics.
+
+Running tasks live in a dict; finished tasks move to a fixed-size ring
+buffer (METRICS_HISTORY_SIZE) and are folded into per-tier and per-session
+aggregates: status counters plus duration, size and throughput histograms.
+Memory stays bounded however long the bot runs, and snapshot() only walks
+the running tasks.
+
+Mongo persistence is write-behind: every change is merged into a pending
+upsert for its task, and a background flusher sends them as one unordered
+bulk_write every METRICS_FLUSH_INTERVAL seconds, so the transfer path never
+awaits the database.
+
+Also kept here: queue depths and wait-time histograms per (queue, tier), and
+Mongo command latency from a pymongo CommandListener. The listener only sees
+clients created after this module is imported, so devgagan imports it first.
+"""
+
 import asyncio
+import os
 import time
-from typing import Dict, Any, List, Optional
+from bisect import bisect_left
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Any, Deque, Dict, List, Optional, Sequence, Tuple
+
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, monitoring
 from config import MONGO_DB
 
 
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+def _to_float(val: Optional[str], default: float) -> float:
+    try:
+        return float(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+METRICS_HISTORY_SIZE: int = _to_int(os.getenv("METRICS_HISTORY_SIZE"), 500)
+METRICS_FLUSH_INTERVAL: float = _to_float(os.getenv("METRICS_FLUSH_INTERVAL"), 5.0)
+# Pending upserts kept while Mongo is unreachable; the oldest are dropped beyond this
+METRICS_MAX_PENDING: int = _to_int(os.getenv("METRICS_MAX_PENDING"), 10000)
+
+_MB = 1024 * 1024
+DURATION_BUCKETS: Tuple[float, ...] = (1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+SIZE_BUCKETS: Tuple[float, ...] = (_MB, 10 * _MB, 50 * _MB, 100 * _MB, 500 * _MB, 1024 * _MB, 2048 * _MB, 4096 * _MB)
+THROUGHPUT_BUCKETS: Tuple[float, ...] = (64 * 1024, 256 * 1024, _MB, 5 * _MB, 10 * _MB, 25 * _MB, 50 * _MB)
+WAIT_BUCKETS: Tuple[float, ...] = (0.1, 0.5, 1, 5, 15, 30, 60, 120, 300, 600)
+MONGO_LATENCY_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+
+@dataclass(slots=True)
+class Histogram:
+    bounds: Sequence[float]
+    counts: List[int] = field(default_factory=list)  # one per bound, plus +Inf
+    total: float = 0.0
+    n: int = 0
+
+    def __post_init__(self):
+        if not self.counts:
+            self.counts = [0] * (len(self.bounds) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.total += value
+        self.n += 1
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bound of the bucket holding the q-quantile (None when empty)"""
+        if not self.n:
+            return None
+        rank = q * self.n
+        seen = 0
+        for i, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.bounds[i] if i < len(self.bounds) else float("inf")
+        return float("inf")
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "bounds": list(self.bounds),
+            "counts": list(self.counts),
+            "sum": round(self.total, 3),
+            "count": self.n,
+        }
+
+
+@dataclass(slots=True)
+class SeriesStats:
+    """Aggregates for one tier or one session"""
+    statuses: Dict[str, int] = field(default_factory=dict)
+    duration: Histogram = field(default_factory=lambda: Histogram(DURATION_BUCKETS))
+    size: Histogram = field(default_factory=lambda: Histogram(SIZE_BUCKETS))
+    throughput: Histogram = field(default_factory=lambda: Histogram(THROUGHPUT_BUCKETS))
+
+    def observe(self, status: str, seconds: float, size: int) -> None:
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        self.duration.observe(seconds)
+        if status == "done" and size > 1:
+            self.size.observe(size)
+            if seconds >= 1:  # sub-second tasks (cache hits, server copies) say nothing about bandwidth
+                self.throughput.observe(size / seconds)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "statuses": dict(self.statuses),
+            "duration_p50": self.duration.quantile(0.5),
+            "duration_p95": self.duration.quantile(0.95),
+            "avg_duration": round(self.duration.total / self.duration.n, 2) if self.duration.n else None,
+            "avg_throughput": round(self.throughput.total / self.throughput.n) if self.throughput.n else None,
+            "bytes": int(self.size.total),
+        }
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    """Latency per Mongo command name (find, insert, update, ...).
+
+    Motor runs pymongo on worker threads; the updates are single dict/list
+    operations, which is good enough for counters.
+    """
+    def __init__(self) -> None:
+        self.latency: Dict[str, Histogram] = {}
+        self.failures: Dict[str, int] = {}
+
+    def _observe(self, event) -> Histogram:
+        hist = self.latency.get(event.command_name)
+        if hist is None:
+            hist = self.latency.setdefault(event.command_name, Histogram(MONGO_LATENCY_BUCKETS))
+        hist.observe(event.duration_micros / 1_000_000)
+        return hist
+
+    def started(self, event) -> None:
+        pass
+
+    def succeeded(self, event) -> None:
+        self._observe(event)
+
+    def failed(self, event) -> None:
+        self._observe(event)
+        self.failures[event.command_name] = self.failures.get(event.command_name, 0) + 1
+
+
+mongo_commands = MongoCommandListener()
+monitoring.register(mongo_commands)
+
+
 class MetricsRegistry:
     def __init__(self) -> None:
-        self._lock = asyncio.Lock()
-        self._tasks: Dict[str, Dict[str, Any]] = {}
         self._seq = 0
+        self._running: Dict[str, Dict[str, Any]] = {}
+        self._recent: Deque[Dict[str, Any]] = deque(maxlen=METRICS_HISTORY_SIZE)
+        self._by_tier: Dict[str, SeriesStats] = {}
+        self._by_session: Dict[str, SeriesStats] = {}
+        # Transfer strategy -> number of tasks that used it (server_copy, download_upload, ...)
+        self._strategies: Dict[str, int] = {}
+        # Startup timings in seconds (boot, pool_warmup, time_to_first_upload)
+        self._boot: Dict[str, float] = {}
+        # (queue, tier) -> waiting now / time spent waiting
+        self._queue_depth: Dict[Tuple[str, str], int] = {}
+        self._queue_wait: Dict[Tuple[str, str], Histogram] = {}
+        # Write-behind persistence: task id -> fields to $set on the next flush
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._flusher: Optional[asyncio.Task] = None
+        self.flushed = 0
+        self.dropped = 0
         # Persistence (best-effort)
         try:
             self._mongo = AsyncIOMotorClient(MONGO_DB)
@@ -20,67 +182,161 @@ class MetricsRegistry:
             self._db = None
             self._col = None
 
-    async def start_task(self, kind: str, user_id: int, username: str, link: str) -> str:
-        async with self._lock:
-            self._seq += 1
-            task_id = f"t{self._seq}-{int(time.time())}"
-            doc = {
-                "_id": task_id,
-                "kind": kind,  # 'download' | 'upload'
-                "user_id": user_id,
-                "username": username,
-                "link": link,
-                "started_at": time.time(),
-                "status": "running",
-                "session_id": None,
-            }
-            self._tasks[task_id] = doc
-            # Persist best-effort
+    # --- persistence ------------------------------------------------------
+
+    def _persist(self, task_id: str, fields: Dict[str, Any]) -> None:
+        if self._col is None:
+            return
+        pending = self._pending.get(task_id)
+        if pending is None:
+            self._pending[task_id] = dict(fields)
+            while len(self._pending) > METRICS_MAX_PENDING:
+                self._pending.pop(next(iter(self._pending)))
+                self.dropped += 1
+        else:
+            pending.update(fields)
+        # Started lazily: the registry is created before the event loop runs
+        if self._flusher is None or self._flusher.done():
             try:
-                if self._col:
-                    await self._col.insert_one(doc)
+                self._flusher = asyncio.get_running_loop().create_task(self._flush_loop())
+            except RuntimeError:
+                pass
+
+    async def flush(self) -> int:
+        """Write all pending changes in one bulk_write; returns the number of documents"""
+        if not self._pending or self._col is None:
+            return 0
+        batch, self._pending = self._pending, {}
+        ops = [UpdateOne({"_id": tid}, {"$set": fields}, upsert=True) for tid, fields in batch.items()]
+        try:
+            await self._col.bulk_write(ops, ordered=False)
+            self.flushed += len(ops)
+        except Exception as e:
+            print(f"⚠️ METRICS: bulk flush of {len(ops)} task(s) failed: {e}")
+            # Keep them for the next round, newer changes win
+            for tid, fields in batch.items():
+                if tid in self._pending:
+                    fields.update(self._pending[tid])
+                self._pending[tid] = fields
+        return len(ops)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await asyncio.sleep(METRICS_FLUSH_INTERVAL)
+            try:
+                await self.flush()
             except Exception:
                 pass
-            return task_id
+
+    # --- task lifecycle ---------------------------------------------------
+
+    async def start_task(self, kind: str, user_id: int, username: str, link: str, tier: Optional[str] = None) -> str:
+        self._seq += 1
+        task_id = f"t{self._seq}-{int(time.time())}"
+        doc = {
+            "kind": kind,  # 'download' | 'upload'
+            "user_id": user_id,
+            "username": username,
+            "link": link,
+            "tier": tier or "-",
+            "started_at": time.time(),
+            "status": "running",
+            "session_id": None,
+        }
+        self._running[task_id] = doc
+        self._persist(task_id, doc)
+        return task_id
 
     async def bind_session(self, task_id: str, session_id: Optional[str]) -> None:
-        async with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["session_id"] = session_id
-        try:
-            if self._col and session_id:
-                await self._col.update_one({"_id": task_id}, {"$set": {"session_id": session_id}})
-        except Exception:
-            pass
+        t = self._running.get(task_id)
+        if t is not None:
+            t["session_id"] = session_id
+            if session_id:
+                self._persist(task_id, {"session_id": session_id})
 
-    async def finish_task(self, task_id: str, status: str = "done") -> None:
-        async with self._lock:
-            if task_id in self._tasks:
-                self._tasks[task_id]["status"] = status
-                self._tasks[task_id]["finished_at"] = time.time()
-        try:
-            if self._col:
-                await self._col.update_one({"_id": task_id}, {"$set": {"status": status, "finished_at": time.time()}})
-        except Exception:
-            pass
+    async def record_strategy(self, task_id: Optional[str], strategy: str) -> None:
+        """Record which transfer strategy a task ended up using"""
+        self._strategies[strategy] = self._strategies.get(strategy, 0) + 1
+        t = self._running.get(task_id)
+        if t is not None:
+            t["strategy"] = strategy
+            self._persist(task_id, {"strategy": strategy})
+
+    def record_boot(self, name: str, seconds: float, once: bool = False) -> None:
+        """Record a startup timing; with once=True only the first value is kept"""
+        if once and name in self._boot:
+            return
+        self._boot[name] = round(seconds, 3)
+        print(f"⏱️ METRICS: {name} = {seconds:.2f}s")
+
+    async def finish_task(self, task_id: str, status: str = "done", size: int = 0) -> None:
+        """Close a running task (later calls for the same id are ignored)"""
+        t = self._running.pop(task_id, None)
+        if t is None:
+            return
+        now = time.time()
+        t["status"] = status
+        t["finished_at"] = now
+        t["size"] = int(size or 0)
+        seconds = max(0.0, now - t["started_at"])
+        self._recent.append({"id": task_id, **t})
+        tier = t.get("tier") or "-"
+        self._by_tier.setdefault(tier, SeriesStats()).observe(status, seconds, t["size"])
+        self._by_session.setdefault(t.get("session_id") or "-", SeriesStats()).observe(status, seconds, t["size"])
+        self._persist(task_id, {"status": status, "finished_at": now, "size": t["size"]})
+
+    # --- queues -----------------------------------------------------------
+
+    def queue_enter(self, queue: str, tier: str) -> None:
+        key = (queue, tier)
+        self._queue_depth[key] = self._queue_depth.get(key, 0) + 1
+
+    def queue_leave(self, queue: str, tier: str, waited: float) -> None:
+        key = (queue, tier)
+        self._queue_depth[key] = max(0, self._queue_depth.get(key, 0) - 1)
+        hist = self._queue_wait.get(key)
+        if hist is None:
+            hist = self._queue_wait[key] = Histogram(WAIT_BUCKETS)
+        hist.observe(max(0.0, waited))
+
+    def queues(self) -> Tuple[Dict[Tuple[str, str], int], Dict[Tuple[str, str], Histogram]]:
+        return self._queue_depth, self._queue_wait
+
+    # --- reads ------------------------------------------------------------
+
+    def recent(self, limit: int = 50) -> List[Dict[str, Any]]:
+        """Most recently finished tasks, newest first"""
+        return [self._recent[-i] for i in range(1, min(limit, len(self._recent)) + 1)]
+
+    def running_by_kind(self) -> Dict[str, int]:
+        counts: Dict[str, int] = {}
+        for t in self._running.values():
+            kind = t.get("kind") or "-"
+            counts[kind] = counts.get(kind, 0) + 1
+        return counts
+
+    @property
+    def pending_writes(self) -> int:
+        return len(self._pending)
+
+    def histograms(self) -> Dict[str, Dict[str, SeriesStats]]:
+        return {"tier": self._by_tier, "session": self._by_session}
 
     async def snapshot(self) -> Dict[str, Any]:
-        async with self._lock:
-            tasks = list(self._tasks.items())
-        active = [t for tid, t in tasks if t.get("status") == "running"]
-        downloads = [t for tid, t in tasks if t.get("kind") == "download" and t.get("status") == "running"]
-        uploads = [t for tid, t in tasks if t.get("kind") == "upload" and t.get("status") == "running"]
+        tasks = [{"id": tid, **t} for tid, t in self._running.items()]
+        downloads = sum(1 for t in tasks if t.get("kind") == "download")
         # Group by session
         per_session: Dict[str, List[Dict[str, Any]]] = {}
-        for tid, t in tasks:
-            if t.get("status") != "running":
-                continue
-            sid = t.get("session_id") or "-"
-            per_session.setdefault(sid, []).append({"id": tid, **t})
+        for t in tasks:
+            per_session.setdefault(t.get("session_id") or "-", []).append(t)
         return {
-            "totals": {"active": len(active), "downloads": len(downloads), "uploads": len(uploads)},
-            "tasks": [{"id": tid, **t} for tid, t in tasks if t.get("status") == "running"],
+            "totals": {"active": len(tasks), "downloads": downloads, "uploads": len(tasks) - downloads},
+            "tasks": tasks,
             "per_session": per_session,
+            "strategies": dict(self._strategies),
+            "boot": dict(self._boot),
+            "by_tier": {tier: s.summary() for tier, s in self._by_tier.items()},
+            "persistence": {"pending": len(self._pending), "flushed": self.flushed, "dropped": self.dropped},
         }
 
 
@@ -9,6 +9,7 @@ import time
 from typing import Optional, Dict, Any, List
 from motor.motor_asyncio import AsyncIOMotorClient
 from config import MONGO_DB
+from devgagan.core.memory_budget import is_buffer, source_exists, source_name, source_size
 
 class FileHashManager:
     """Manages file hashing and deduplication in MongoDB"""
@@ -56,7 +57,7 @@ class FileHashManager:
         Calculate SHA-256 hash of a file efficiently
         
         Args:
-            file_path: Path to the file
+            file_path: Path to the file (or an in-memory BytesIO)
             chunk_size: Size of chunks to read (default 8KB)
             
         Returns:
@@ -65,6 +66,10 @@ class FileHashManager:
         sha256_hash = hashlib.sha256()
         
         try:
+            if is_buffer(file_path):
+                # Hash the buffer in place, no copy
+                sha256_hash.update(file_path.getbuffer())
+                return sha256_hash.hexdigest()
             with open(file_path, "rb") as f:
                 # Read file in chunks to handle large files efficiently
                 for chunk in iter(lambda: f.read(chunk_size), b""):
@@ -109,7 +114,7 @@ class FileHashManager:
         
         try:
             # Method 1: Check by file hash (most accurate)
-            if file_path and os.path.exists(file_path):
+            if file_path and source_exists(file_path):
                 file_hash = self._calculate_file_hash(file_path)
                 if file_hash:
                     result = await self.collection.find_one({"file_hash": file_hash})
@@ -127,7 +132,7 @@ class FileHashManager:
             
             # Method 3: Check by file size and name (less accurate but fast)
             if file_size and file_path:
-                file_name = os.path.basename(file_path)
+                file_name = source_name(file_path)
                 result = await self.collection.find_one({
                     "file_size": file_size,
                     "file_name": file_name
@@ -161,7 +166,7 @@ class FileHashManager:
         await self.initialize()
         
         try:
-            if not os.path.exists(file_path):
+            if not source_exists(file_path):
                 print(f"❌ Cannot store hash: file not found: {file_path}")
                 return False
             
@@ -171,9 +176,8 @@ class FileHashManager:
                 return False
             
             # Get file information
-            file_stat = os.stat(file_path)
-            file_size = file_stat.st_size
-            file_name = os.path.basename(file_path)
+            file_size = source_size(file_path)
+            file_name = source_name(file_path)
             
             # Calculate message hash if message info provided
             message_hash = None
@@ -191,7 +195,7 @@ class FileHashManager:
                 "original_chat_id": chat_id,
                 "original_message_id": message_id,
                 "message_hash": message_hash,
-                "file_path_when_stored": file_path,  # For debugging
+                "file_path_when_stored": "<memory>" if is_buffer(file_path) else file_path,  # For debugging
             }
             
             # Add additional info if provided
@@ -1,48 +1,204 @@
+import asyncio
+import calendar
 import datetime
 import logging
+import os
+import time
 from pymongo.errors import PyMongoError, NetworkTimeout, OperationFailure
 from .connection import premium_db as db
+
+# Premium status cache: user_id -> (premium doc or None, valid_until epoch seconds).
+# An entry is served until the plan's expire_date or the TTL, whichever comes first,
+# and is invalidated by add_premium/remove_premium (and therefore /transfer).
+PREMIUM_CACHE_TTL = int(os.getenv("PREMIUM_CACHE_TTL", "300"))
+_premium_cache = {}
+
+# Expiry sweep: sleeps until the next-earliest expiry, bounded by these limits
+PREMIUM_SWEEP_MIN_INTERVAL = int(os.getenv("PREMIUM_SWEEP_MIN_INTERVAL", "5"))
+PREMIUM_SWEEP_MAX_INTERVAL = int(os.getenv("PREMIUM_SWEEP_MAX_INTERVAL", "3600"))
+PREMIUM_TTL_GRACE = int(os.getenv("PREMIUM_TTL_GRACE", str(7 * 86400)))
+PREMIUM_NOTIFY_BATCH = int(os.getenv("PREMIUM_NOTIFY_BATCH", "20"))
+PREMIUM_NOTIFY_RATE = float(os.getenv("PREMIUM_NOTIFY_RATE", "10"))
+_indexes_ready = False
+_sweep_wakeup = None
+
+
+def _expire_ts(expire_date):
+    """expire_date is stored as naive UTC; aware datetimes are converted"""
+    try:
+        return calendar.timegm(expire_date.utctimetuple())
+    except Exception:
+        return None
+
+
+def _cache_premium(user_id, data):
+    now = time.time()
+    valid_until = now + PREMIUM_CACHE_TTL
+    if data:
+        exp = _expire_ts(data.get("expire_date"))
+        if exp is not None:
+            if exp <= now:
+                # Expired but not swept yet: not premium
+                data = None
+            else:
+                valid_until = min(valid_until, exp)
+    _premium_cache[user_id] = (data, valid_until)
+    return data
+
+
+def invalidate_premium_cache(user_id=None):
+    if user_id is None:
+        _premium_cache.clear()
+    else:
+        _premium_cache.pop(user_id, None)
+
  
 async def add_premium(user_id, expire_date):
-    data = await check_premium(user_id)
-    if data and data.get("_id"):
-        await db.update_one({"_id": user_id}, {"$set": {"expire_date": expire_date}})
-    else:
-        await db.insert_one({"_id": user_id, "expire_date": expire_date})
+    await db.update_one({"_id": user_id}, {"$set": {"expire_date": expire_date}}, upsert=True)
+    invalidate_premium_cache(user_id)
+    wake_expiry_sweeper()
  
 async def remove_premium(user_id):
     await db.delete_one({"_id": user_id})
+    invalidate_premium_cache(user_id)
  
 async def check_premium(user_id):
-    return await db.find_one({"_id": user_id})
+    """Return the active premium doc for user_id (or None), served from cache when fresh"""
+    hit = _premium_cache.get(user_id)
+    if hit and hit[1] > time.time():
+        return hit[0]
+    return _cache_premium(user_id, await db.find_one({"_id": user_id}))
  
 async def premium_users():
     id_list = []
-    async for data in db.find():
+    async for data in db.find({}, {"_id": 1}):
         id_list.append(data["_id"])
     return id_list
  
+async def _ensure_indexes():
+    """Index expire_date for the sweep's range query.
+
+    The index is a TTL index with a generous grace period: the sweep below
+    normally removes (and notifies) expired users first, the TTL is only a
+    backstop if the sweeper is not running.
+    """
+    global _indexes_ready
+    if _indexes_ready:
+        return
+    _indexes_ready = True
+    try:
+        await db.create_index("expire_date", expireAfterSeconds=PREMIUM_TTL_GRACE)
+    except Exception as ttl_err:
+        if "IndexOptionsConflict" in str(ttl_err) or "equivalent index already exists" in str(ttl_err):
+            pass
+        else:
+            logging.warning(f"Could not create premium expire_date index: {ttl_err}")
+
+
 async def check_and_remove_expired_users():
-    """Scan premium users and remove expired ones without crashing the bot.
+    """Remove expired premium users with one range query + delete_many.
 
-    Any Mongo connectivity errors are caught and logged as non-fatal so that
-    background jobs never bring the bot down.
+    Returns the list of removed user ids. Any Mongo connectivity errors are
+    caught and logged as non-fatal so that background jobs never bring the
+    bot down.
     """
     try:
+        await _ensure_indexes()
         current_time = datetime.datetime.utcnow()
-        # Project only the fields we need and avoid loading huge docs
-        cursor = db.find({}, {"_id": 1, "expire_date": 1})
-        async for data in cursor:
-            try:
-                expire_date = data.get("expire_date")
-                if expire_date and expire_date < current_time:
-                    await remove_premium(data["_id"])
-                    logging.info(f"Removed user {data['_id']} due to expired plan.")
-            except Exception as inner_err:
-                logging.warning(f"Error handling premium record {data.get('_id')}: {inner_err}")
-                continue
+        expired = []
+        async for data in db.find({"expire_date": {"$lt": current_time}}, {"_id": 1}):
+            expired.append(data["_id"])
+        if not expired:
+            return []
+        await db.delete_many({"_id": {"$in": expired}, "expire_date": {"$lt": current_time}})
+        for user_id in expired:
+            invalidate_premium_cache(user_id)
+        logging.info(f"Removed {len(expired)} users due to expired plans.")
+        return expired
     except (NetworkTimeout, OperationFailure, PyMongoError) as e:
         logging.error(f"Premium expiry check skipped due to Mongo error: {e}")
     except Exception as e:
         logging.error(f"Unexpected error during premium expiry check: {e}")
- 
\ No newline at end of file
+    return []
+
+
+async def seconds_until_next_expiry():
+    """Seconds until the earliest remaining plan expires (None if there are none)"""
+    await _ensure_indexes()
+    doc = await db.find_one(
+        {"expire_date": {"$ne": None}},
+        {"expire_date": 1},
+        sort=[("expire_date", 1)],
+    )
+    if not doc:
+        return None
+    exp = _expire_ts(doc.get("expire_date"))
+    if exp is None:
+        return None
+    return max(0.0, exp - time.time())
+
+
+async def notify_expired_users(user_ids):
+    """Tell users their plan expired, in rate-limited batches (FloodWait pauses the batch)"""
+    from devgagan import app
+    from devgagan.core.broadcast import RateLimiter
+    from devgagan.core.mongo.users_db import db as users_collection
+    from pyrogram.errors import FloodWait
+
+    names = {}
+    try:
+        async for u in users_collection.find({"user": {"$in": list(user_ids)}}, {"user": 1, "first_name": 1}):
+            names[u["user"]] = u.get("first_name") or "User"
+    except Exception:
+        pass
+
+    limiter = RateLimiter(PREMIUM_NOTIFY_RATE)
+
+    async def _send(user_id):
+        for _ in range(3):
+            await limiter.acquire()
+            try:
+                await app.send_message(user_id, text=f"Hello {names.get(user_id, 'User')}, your premium subscription has expired.")
+                return True
+            except FloodWait as fw:
+                limiter.pause(int(getattr(fw, "value", 0) or 0) + 1)
+            except Exception:
+                return False
+        return False
+
+    sent = 0
+    for i in range(0, len(user_ids), PREMIUM_NOTIFY_BATCH):
+        batch = user_ids[i:i + PREMIUM_NOTIFY_BATCH]
+        results = await asyncio.gather(*(_send(uid) for uid in batch))
+        sent += sum(1 for r in results if r)
+    return sent
+
+
+def wake_expiry_sweeper():
+    """Re-plan the sweep (a new plan may expire before the scheduled wake-up)"""
+    if _sweep_wakeup is not None:
+        _sweep_wakeup.set()
+
+
+async def premium_expiry_loop():
+    """Sweep expired plans, then sleep until the next-earliest expiry (bounded)"""
+    global _sweep_wakeup
+    _sweep_wakeup = asyncio.Event()
+    while True:
+        removed = await check_and_remove_expired_users()
+        if removed:
+            try:
+                await notify_expired_users(removed)
+            except Exception as e:
+                logging.warning(f"Premium expiry notifications failed: {e}")
+        try:
+            delay = await seconds_until_next_expiry()
+        except Exception:
+            delay = None
+        delay = PREMIUM_SWEEP_MAX_INTERVAL if delay is None else delay + 1
+        delay = min(max(delay, PREMIUM_SWEEP_MIN_INTERVAL), PREMIUM_SWEEP_MAX_INTERVAL)
+        _sweep_wakeup.clear()
+        try:
+            await asyncio.wait_for(_sweep_wakeup.wait(), timeout=delay)
+        except asyncio.TimeoutError:
+            pass
@@ -1,97 +1,201 @@
+import asyncio
+import os
+import time
+from datetime import datetime, timedelta
+from pymongo import UpdateOne
+from pyrogram.errors import FloodWait
 from .connection import get_collection
 
 # Get the users collection - now using the fast users_db collection
 # All 224 users have been migrated from users_db.users to users_db for better performance
 db = get_collection('users', 'users_db')
 
+# In-process membership cache so repeat interactions skip MongoDB entirely
+_known_users = set()
+_indexes_ready = False
+_indexes_retry_at = 0.0  # after a failed create_index, don't retry before this (monotonic)
+INDEX_RETRY_INTERVAL = 60
+
+# Background profile refresh tuning (is_bot/username/first_name/last_name on user docs)
+PROFILE_REFRESH_INTERVAL = int(os.getenv("USER_PROFILE_REFRESH_INTERVAL", "600"))
+PROFILE_REFRESH_BATCH = int(os.getenv("USER_PROFILE_REFRESH_BATCH", "1000"))
+PROFILE_REFRESH_MAX_AGE = int(os.getenv("USER_PROFILE_REFRESH_MAX_AGE", str(7 * 86400)))
+
 
 async def get_users():
   user_list = []
-  async for user in db.find({"user": {"$gt": 0}}):
+  async for user in db.find({"user": {"$gt": 0}}, {"user": 1}):
     user_list.append(user['user'])
   return user_list
 
 
+def _profile_fields(u):
+  """Extract the profile fields we persist on a user document from a Telegram user"""
+  username = getattr(u, "username", None) or ""
+  return {
+    # Also treat usernames ending with 'bot' as bots (same rule /stats always used)
+    "is_bot": bool(getattr(u, "is_bot", False)) or username.lower().endswith("bot"),
+    "username": username,
+    "first_name": getattr(u, "first_name", None) or "",
+    "last_name": getattr(u, "last_name", None) or "",
+    "profile_checked_at": datetime.utcnow(),
+  }
+
+
 async def get_users_excluding_bots():
-  """Get all users excluding bots for accurate statistics"""
-  from devgagan import app
-  
+  """Get all users excluding bots, using the stored `is_bot` classification.
+
+  Users the background refresher has not classified yet are counted as real users.
+  """
+  await _ensure_indexes()
   user_list = []
-  async for user in db.find({"user": {"$gt": 0}}):
+  async for user in db.find({"user": {"$gt": 0}, "is_bot": {"$ne": True}}, {"user": 1}):
     user_list.append(user['user'])
-  
-  if not user_list:
-    return []
-  
-  # Remove duplicates and sort
-  user_list = sorted(set(int(u) for u in user_list))
-  
-  # Fetch Telegram profile info in batches to identify bots
-  BATCH = 100
-  non_bot_users = []
-  
-  for i in range(0, len(user_list), BATCH):
-    batch = user_list[i:i+BATCH]
+  return sorted(set(int(u) for u in user_list))
+
+
+async def get_user_profiles():
+  """Yield stored user documents (id + profile fields) for exports"""
+  async for user in db.find({"user": {"$gt": 0}}, {"_id": 0}):
+    yield user
+
+
+async def get_user_counts():
+  """Return {'total', 'real', 'bots'} computed from indexed count_documents queries"""
+  await _ensure_indexes()
+  total = await db.count_documents({"user": {"$gt": 0}})
+  bots = await db.count_documents({"user": {"$gt": 0}, "is_bot": True})
+  return {"total": total, "real": total - bots, "bots": bots}
+
+
+async def refresh_user_profiles(batch_size=100, max_users=PROFILE_REFRESH_BATCH):
+  """Classify/refresh up to `max_users` stale or never-checked users via app.get_users.
+
+  Returns the number of user documents updated.
+  """
+  from devgagan import app
+
+  await _ensure_indexes()
+  stale_before = datetime.utcnow() - timedelta(seconds=PROFILE_REFRESH_MAX_AGE)
+  query = {
+    "user": {"$gt": 0},
+    "$or": [
+      {"profile_checked_at": {"$exists": False}},
+      {"profile_checked_at": {"$lt": stale_before}},
+    ],
+  }
+  pending = []
+  # Oldest check first (never-checked users sort before any date), so users that
+  # keep failing cannot hold the head of every pass
+  async for user in db.find(query, {"user": 1}).sort("profile_checked_at", 1).limit(max_users):
+    pending.append(int(user['user']))
+
+  updated = 0
+  for i in range(0, len(pending), batch_size):
+    batch = pending[i:i+batch_size]
+    ops = []
+    flooded = False
     try:
       tg_users = await app.get_users(batch)
       if not isinstance(tg_users, list):
         tg_users = [tg_users]
-      
+      seen = set()
       for u in tg_users:
         if not u:
           continue
-        
-        # Check if user is a bot
-        is_bot = getattr(u, "is_bot", False)
-        username = u.username or ""
-        
-        # Also check username ending with 'bot'
-        is_bot_username = username.lower().endswith("bot") if username else False
-        
-        # Only add if not a bot
-        if not is_bot and not is_bot_username:
-          non_bot_users.append(u.id)
-          
-    except Exception:
-      # Fallback: check each user individually
+        seen.add(u.id)
+        ops.append(UpdateOne({"user": u.id}, {"$set": _profile_fields(u)}))
+      # Deleted/inaccessible accounts: mark checked so they are not retried every pass
+      for uid in batch:
+        if uid not in seen:
+          ops.append(UpdateOne({"user": uid}, {"$set": {"profile_checked_at": datetime.utcnow()}}))
+    except FloodWait as fw:
+      print(f"🛡️ User profile refresh hit FloodWait {fw.value}s, resuming next pass")
+      break
+    except Exception as e:
+      # Fallback: check each user individually; stamp the ones that still fail
+      print(f"⚠️ User profile refresh batch failed, checking users one by one: {e}")
+      ops = []
       for uid in batch:
         try:
           u = await app.get_users(uid)
-          if u:
-            is_bot = getattr(u, "is_bot", False)
-            username = u.username or ""
-            is_bot_username = username.lower().endswith("bot") if username else False
-            
-            if not is_bot and not is_bot_username:
-              non_bot_users.append(uid)
+          fields = _profile_fields(u) if u else {"profile_checked_at": datetime.utcnow()}
+        except FloodWait as fw:
+          print(f"🛡️ User profile refresh hit FloodWait {fw.value}s, resuming next pass")
+          flooded = True
+          break
         except Exception:
-          # If we can't get user info, assume it's not a bot
-          non_bot_users.append(uid)
-  
-  return sorted(set(non_bot_users))
+          fields = {"profile_checked_at": datetime.utcnow()}
+        ops.append(UpdateOne({"user": uid}, {"$set": fields}))
+    if ops:
+      try:
+        result = await db.bulk_write(ops, ordered=False)
+        updated += result.modified_count
+      except Exception as e:
+        print(f"⚠️ User profile bulk write failed: {e}")
+    if flooded:
+      break
+    await asyncio.sleep(1)
+  return updated
 
 
-async def get_user(user):
-  users = await get_users()
-  if user in users:
-    return True
-  else:
-    return False
+async def user_profile_refresh_loop():
+  """Background job: incrementally keep is_bot/profile fields fresh"""
+  while True:
+    try:
+      updated = await refresh_user_profiles()
+      if updated:
+        print(f"👥 Refreshed {updated} user profiles")
+    except Exception as e:
+      print(f"⚠️ User profile refresh error: {e}")
+    await asyncio.sleep(PROFILE_REFRESH_INTERVAL)
+
 
-async def add_user(user):
-  users = await get_users()
-  if user in users:
+async def _ensure_indexes():
+  """Create the users indexes once per process; each one independently of the others.
+
+  Retried (at most every INDEX_RETRY_INTERVAL seconds) until every index exists.
+  """
+  global _indexes_ready, _indexes_retry_at
+  if _indexes_ready or time.monotonic() < _indexes_retry_at:
     return
+  failed = False
+  for keys, options in (("user", {"unique": True}), ("is_bot", {}), ("profile_checked_at", {})):
+    try:
+      await db.create_index(keys, **options)
+    except Exception as e:
+      # Legacy duplicates or an existing non-unique index - lookups still work, just unenforced
+      if "IndexOptionsConflict" in str(e) or "equivalent index already exists" in str(e):
+        continue
+      failed = True
+      print(f"⚠️ Warning: Could not create users index on {keys}: {e}")
+  if failed:
+    _indexes_retry_at = time.monotonic() + INDEX_RETRY_INTERVAL
   else:
-    await db.insert_one({"user": user})
+    _indexes_ready = True
 
 
-async def del_user(user):
-  users = await get_users()
-  if not user in users:
+async def get_user(user):
+  if user in _known_users:
+    return True
+  await _ensure_indexes()
+  if await db.find_one({"user": user}, {"_id": 1}):
+    _known_users.add(user)
+    return True
+  return False
+
+async def add_user(user, profile=None):
+  """Register a user id; `profile` (a Telegram user) pre-fills the is_bot/profile fields"""
+  if user in _known_users:
     return
-  else:
-    await db.delete_one({"user": user})
-    
+  await _ensure_indexes()
+  update = {"$setOnInsert": {"user": user}}
+  if profile is not None:
+    update["$set"] = _profile_fields(profile)
+  await db.update_one({"user": user}, update, upsert=True)
+  _known_users.add(user)
 
 
+async def del_user(user):
+  _known_users.discard(user)
+  await db.delete_one({"user": user})
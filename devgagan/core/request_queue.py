@@ -0,0 +1,151 @@
+"""
+Per-session request queues for Telegram API calls.
+
+Each client (user session, pool session, bot) gets its own FIFO queue and
+consumer, so lookups on different sessions never wait behind each other;
+they do not share rate limits. Requests on the same session are spaced by
+an adaptive interval: a FloodWait pauses that session's queue, widens its
+interval and retries, while successful calls slowly shrink it back toward
+REQUEST_QUEUE_MIN_INTERVAL. A consumer exits after REQUEST_QUEUE_IDLE_SECONDS
+without work, so short-lived user sessions leave nothing behind.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from pyrogram.errors import FloodWait
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+def _to_float(val: Optional[str], default: float) -> float:
+    try:
+        return float(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+REQUEST_QUEUE_MIN_INTERVAL: float = _to_float(os.getenv("REQUEST_QUEUE_MIN_INTERVAL"), 0.1)
+REQUEST_QUEUE_MAX_INTERVAL: float = _to_float(os.getenv("REQUEST_QUEUE_MAX_INTERVAL"), 3.0)
+REQUEST_QUEUE_IDLE_SECONDS: float = _to_float(os.getenv("REQUEST_QUEUE_IDLE_SECONDS"), 30.0)
+REQUEST_QUEUE_FLOOD_RETRIES: int = _to_int(os.getenv("REQUEST_QUEUE_FLOOD_RETRIES"), 2)
+
+# Interval multipliers: widen on FloodWait, decay a little after every success
+_BACKOFF = 2.0
+_DECAY = 0.9
+
+
+@dataclass
+class _Request:
+    call: Callable[[], Awaitable[Any]]
+    fut: asyncio.Future
+    label: str = ""
+
+
+@dataclass
+class SessionQueue:
+    key: int
+    label: str
+    interval: float = REQUEST_QUEUE_MIN_INTERVAL
+    queue: asyncio.Queue = field(default_factory=asyncio.Queue)
+    worker: Optional[asyncio.Task] = None
+    last_call_at: float = 0.0
+    processed: int = 0
+    flood_waits: int = 0
+
+
+class RequestDispatcher:
+    def __init__(self):
+        self._queues: Dict[int, SessionQueue] = {}
+
+    def _queue_for(self, client) -> SessionQueue:
+        # Several user sessions share the Client name "userbot", so key on the object
+        key = id(client)
+        sq = self._queues.get(key)
+        if sq is None:
+            sq = SessionQueue(key=key, label=str(getattr(client, "name", None) or key))
+            self._queues[key] = sq
+        # Check and start happen without an await in between, so only one consumer runs per session
+        if sq.worker is None or sq.worker.done():
+            sq.worker = asyncio.create_task(self._consume(sq))
+        return sq
+
+    async def call(self, client, fn: Callable[..., Awaitable[Any]], *args, label: str = "", **kwargs) -> Any:
+        """Run fn(*args, **kwargs) on client's queue and return its result (or raise its error)"""
+        fut = asyncio.get_running_loop().create_future()
+        sq = self._queue_for(client)
+        sq.queue.put_nowait(_Request(call=lambda: fn(*args, **kwargs), fut=fut, label=label))
+        return await fut
+
+    async def get_messages(self, client, chat_id, message_ids, label: str = "") -> Any:
+        return await self.call(client, client.get_messages, chat_id, message_ids, label=label)
+
+    async def _run(self, sq: SessionQueue, req: _Request) -> None:
+        for attempt in range(REQUEST_QUEUE_FLOOD_RETRIES + 1):
+            wait = sq.last_call_at + sq.interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            sq.last_call_at = time.monotonic()
+            try:
+                result = await req.call()
+            except FloodWait as fw:
+                sq.flood_waits += 1
+                sq.interval = min(max(sq.interval, REQUEST_QUEUE_MIN_INTERVAL) * _BACKOFF, REQUEST_QUEUE_MAX_INTERVAL)
+                if attempt >= REQUEST_QUEUE_FLOOD_RETRIES:
+                    raise
+                pause = int(getattr(fw, "value", 0) or 0) + 1
+                print(f"🛡️ REQUEST QUEUE [{sq.label}]: FloodWait {pause}s, pausing this session "
+                      f"(interval now {sq.interval:.2f}s, {sq.queue.qsize()} queued)")
+                await asyncio.sleep(pause)
+                continue
+            sq.interval = max(REQUEST_QUEUE_MIN_INTERVAL, sq.interval * _DECAY)
+            if not req.fut.done():
+                req.fut.set_result(result)
+            return
+
+    async def _consume(self, sq: SessionQueue) -> None:
+        try:
+            while True:
+                try:
+                    req = await asyncio.wait_for(sq.queue.get(), timeout=REQUEST_QUEUE_IDLE_SECONDS)
+                except asyncio.TimeoutError:
+                    if sq.queue.empty():
+                        return
+                    continue
+                try:
+                    if not req.fut.done():
+                        await self._run(sq, req)
+                        sq.processed += 1
+                        if req.label and sq.processed % 5 == 0:
+                            print(f"🔄 REQUEST QUEUE [{sq.label}]: {req.label} done (queue size: {sq.queue.qsize()})")
+                except Exception as e:
+                    if not req.fut.done():
+                        req.fut.set_exception(e)
+                finally:
+                    sq.queue.task_done()
+        finally:
+            if self._queues.get(sq.key) is sq and sq.queue.empty():
+                self._queues.pop(sq.key, None)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        return {
+            sq.label if sq.label not in ("userbot", "") else f"userbot:{sq.key}": {
+                "queued": sq.queue.qsize(),
+                "interval": round(sq.interval, 3),
+                "processed": sq.processed,
+                "flood_waits": sq.flood_waits,
+            }
+            for sq in self._queues.values()
+        }
+
+
+# Global instance
+request_dispatcher = RequestDispatcher()
@@ -5,13 +5,37 @@ import glob
 from typing import Dict, List, Optional, Tuple, Set
 from dataclasses import dataclass, field
 from pyrogram import Client
-from pyrogram.errors import AuthKeyUnregistered, SessionRevoked, UserDeactivated
+from pyrogram.errors import AuthKeyUnregistered, SessionRevoked, UserDeactivated, FloodWait
 from config import API_ID, API_HASH
 from motor.motor_asyncio import AsyncIOMotorClient
-from config import MONGO_DB
+from config import MONGO_DB, LOG_GROUP
+from devgagan.core.identity_cache import identity_cache
+from devgagan.core.metrics import metrics
 
+# Boot warm-up: clients started at once, and the limit for a single Client.start()
+POOL_WARMUP_CONCURRENCY = int(os.getenv("POOL_WARMUP_CONCURRENCY", "5"))
+POOL_START_TIMEOUT = float(os.getenv("POOL_START_TIMEOUT", "30"))
+# Session documents fetched per cursor batch, and seconds between live reloads of the pool
+POOL_LOAD_BATCH = int(os.getenv("POOL_LOAD_BATCH", "100"))
+POOL_RELOAD_INTERVAL = float(os.getenv("POOL_RELOAD_INTERVAL", "60"))
 
-@dataclass
+# Seconds between get_me liveness probes of one pooled client (acquisitions in between only check is_connected)
+SESSION_PROBE_INTERVAL = float(os.getenv("SESSION_PROBE_INTERVAL", "300"))
+
+# Error score half-life: old errors count less instead of being reset after a cooldown
+SESSION_ERROR_HALF_LIFE = float(os.getenv("SESSION_ERROR_HALF_LIFE", "300"))
+
+# Method classes for FloodWait scheduling. Telegram limits file transfers and message
+# sending separately, so a flood on one class does not take the account out for the other.
+METHOD_DOWNLOAD = "download"
+METHOD_UPLOAD = "upload"
+ALL_METHODS = "*"
+
+# Fields needed to register / diff sessions (session strings are only read when a client starts)
+_REGISTRY_PROJECTION = {"_id": 1, "device_model": 1, "last_updated": 1, "added_at": 1}
+
+
+@dataclass(slots=True)
 class SessionStats:
     session_id: str
     usage_count: int = 0
@@ -22,15 +46,57 @@ class SessionStats:
     device_model: str = "iPhone 16 Pro"
     client_started: bool = False
     last_start_error: str = ""
+    # last_updated/added_at of the session document this state was built from
+    version: float = 0.0
+    # Draining sessions get no new work; once idle the client is stopped and, if retiring, forgotten
+    draining: bool = False
+    retiring: bool = False
+    # Exponentially decaying error score (see SESSION_ERROR_HALF_LIFE)
+    error_score: float = 0.0
+    score_at: float = field(default_factory=time.time)
+    # method class (or ALL_METHODS) -> time until which the session must not be used for it
+    blocked_until: Dict[str, float] = field(default_factory=dict)
 
     def increment_usage(self):
         self.usage_count += 1
         self.last_used = time.time()
 
-    def record_error(self, flood_wait_seconds: int = 0):
+    def current_score(self, now: Optional[float] = None) -> float:
+        now = now or time.time()
+        if self.error_score and SESSION_ERROR_HALF_LIFE > 0:
+            self.error_score *= 0.5 ** (max(0.0, now - self.score_at) / SESSION_ERROR_HALF_LIFE)
+        self.score_at = now
+        return self.error_score
+
+    def record_error(self, flood_wait_seconds: int = 0, method_class: Optional[str] = None):
         self.errors += 1
+        self.error_score = self.current_score() + 1.0
         if flood_wait_seconds > 0:
             self.flood_wait_time = max(self.flood_wait_time, flood_wait_seconds)
+            self.block(method_class or ALL_METHODS, flood_wait_seconds)
+
+    def block(self, method_class: str, seconds: float) -> None:
+        until = time.time() + seconds
+        self.blocked_until[method_class] = max(self.blocked_until.get(method_class, 0.0), until)
+
+    def blocked_for(self, method_class: Optional[str], now: Optional[float] = None) -> float:
+        """Seconds until the session may be used for method_class (0 when free)"""
+        now = now or time.time()
+        until = self.blocked_until.get(ALL_METHODS, 0.0)
+        if method_class:
+            until = max(until, self.blocked_until.get(method_class, 0.0))
+        return max(0.0, until - now)
+
+
+def flood_wait_seconds_of(err: Optional[BaseException]) -> int:
+    """FloodWait duration of a Pyrogram or Telethon error, 0 for anything else"""
+    if err is None:
+        return 0
+    if isinstance(err, FloodWait):
+        return int(getattr(err, "value", 0) or 0)
+    if type(err).__name__ == "FloodWaitError":
+        return int(getattr(err, "seconds", 0) or 0)
+    return 0
 
 
 def delete_session_files_from_disk(session_id: str) -> int:
@@ -81,9 +147,9 @@ class SessionPool:
         self.session_stats: Dict[str, SessionStats] = {}
         self.session_locks: Dict[str, asyncio.Lock] = {}
 
+        # A session whose decayed error score reaches this is blocked for cooldown_period
         self.max_errors_before_cooldown = 5
         self.cooldown_period = 300
-        self.cooldown_sessions: Dict[str, float] = {}
 
         self.init_lock = asyncio.Lock()
         # Controls how many simultaneous transfers a single session can handle
@@ -98,26 +164,226 @@ class SessionPool:
         self._cv = asyncio.Condition()
         self._premium_waiters: List[asyncio.Future] = []
         self._free_waiters: List[asyncio.Future] = []
+        # Result of the last warm_up() (ready/failed/seconds)
+        self.warmup_report: Dict[str, object] = {}
+        # method class -> FloodWaits reported on release
+        self.flood_waits: Dict[str, int] = {}
+        self._reload_task: Optional[asyncio.Task] = None
+
+    async def _prime_client(self, session_id: str, client: Client) -> None:
+        """Cache identity and the LOG_GROUP peer once, so uploads make no warm-up calls"""
+        await identity_cache.prime(client, LOG_GROUP)
+        try:
+            ident = await identity_cache.get_me(client)
+            self._cached_usernames[session_id] = ident.username or f"user_{ident.me_id}"
+        except Exception:
+            self._cached_usernames[session_id] = "unknown"
+
+    async def _start_client(self, session_id: str) -> Optional[Client]:
+        """Start and prime the client for session_id (caller holds the session lock)"""
+        stats = self.session_stats[session_id]
+        session_data = await self.collection.find_one({"_id": session_id})
+        if not session_data or not session_data.get("is_active", False):
+            stats.last_start_error = "inactive or missing session document"
+            return None
+        sess_str = session_data.get("session_string")
+        if not sess_str:
+            stats.last_start_error = "missing session_string"
+            return None
+        client = None
+        try:
+            client = Client(
+                name=f"session_{session_id}",
+                api_id=API_ID,
+                api_hash=API_HASH,
+                session_string=sess_str,
+                device_model=stats.device_model,
+                in_memory=True,
+                no_updates=True,
+                max_concurrent_transmissions=self.session_concurrency,
+                sleep_threshold=60,
+                workers=self.session_workers
+            )
+            await asyncio.wait_for(client.start(), timeout=POOL_START_TIMEOUT)
+        except Exception as start_err:
+            stats.client_started = False
+            stats.last_start_error = str(start_err) or type(start_err).__name__
+            print(f"❌ Failed to start session client {session_id}: {stats.last_start_error}")
+            if client is not None:
+                # A timed-out start may have left the connection open; stop() fails before initialize
+                try:
+                    await client.stop()
+                except Exception:
+                    try:
+                        await client.disconnect()
+                    except Exception:
+                        pass
+            return None
+        self.sessions[session_id] = client
+        stats.client_started = True
+        stats.last_start_error = ""
+        await self._prime_client(session_id, client)
+        return client
+
+    async def warm_up(self) -> Dict[str, object]:
+        """Start every registered client concurrently (at most POOL_WARMUP_CONCURRENCY at a time).
+
+        Clients already running are left alone. The result is kept in
+        `warmup_report` and shown by /diag.
+        """
+        started_at = time.time()
+        gate = asyncio.Semaphore(max(1, POOL_WARMUP_CONCURRENCY))
+
+        async def _one(session_id: str) -> bool:
+            async with gate:
+                lock = self.session_locks.setdefault(session_id, asyncio.Lock())
+                async with lock:
+                    if session_id in self.sessions:
+                        return True
+                    if not self._is_available(session_id, time.time()):
+                        return False
+                    try:
+                        return await self._start_client(session_id) is not None
+                    except Exception as e:
+                        self.session_stats[session_id].last_start_error = str(e)
+                        return False
+
+        session_ids = list(self.session_stats.keys())
+        results = await asyncio.gather(*(_one(sid) for sid in session_ids))
+        ready = sum(1 for ok in results if ok)
+        self.warmup_report = {
+            "ready": ready,
+            "failed": len(session_ids) - ready,
+            "seconds": round(time.time() - started_at, 2),
+            "finished_at": time.time(),
+        }
+        print(f"🔥 Session pool warm-up: {ready}/{len(session_ids)} clients ready in {self.warmup_report['seconds']}s")
+        return self.warmup_report
+
+    async def _iter_active(self, projection: Optional[dict] = None):
+        """Active session documents through a paged cursor (no upper limit)"""
+        cursor = self.collection.find({"is_active": True}, projection).sort("added_at", 1).batch_size(POOL_LOAD_BATCH)
+        async for doc in cursor:
+            yield doc
+
+    @staticmethod
+    def _doc_version(doc: dict) -> float:
+        return float(doc.get("last_updated") or doc.get("added_at") or 0.0)
+
+    def _register(self, session_id: str, device_model: str, version: float) -> None:
+        self.session_stats[session_id] = SessionStats(session_id=session_id, device_model=device_model, version=version)
+        self.session_locks.setdefault(session_id, asyncio.Lock())
+        self.session_permits.setdefault(session_id, asyncio.Semaphore(self.session_concurrency))
+
+    def _is_available(self, session_id: str, now: float, method_class: Optional[str] = None) -> bool:
+        stats = self.session_stats.get(session_id)
+        if stats is None or stats.draining:
+            return False
+        return stats.blocked_for(method_class, now) <= 0
+
+    def _next_unblock_in(self, method_class: Optional[str]) -> Optional[float]:
+        """Seconds until the first blocked session frees up for method_class (None if none is blocked)"""
+        now = time.time()
+        waits = [
+            stats.blocked_for(method_class, now) for stats in self.session_stats.values()
+            if not stats.draining
+        ]
+        waits = [w for w in waits if w > 0]
+        return min(waits) if waits else None
+
+    def _drain(self, session_id: str, retire: bool, reason: Optional[str] = None) -> None:
+        stats = self.session_stats.get(session_id)
+        if stats is None:
+            return
+        stats.draining = True
+        stats.retiring = stats.retiring or retire
+        print(f"🚰 Session {session_id} draining ({reason or ('removed' if stats.retiring else 'updated')})")
+
+    async def _finish_draining(self) -> None:
+        """Stop draining sessions that have no transfers left"""
+        for session_id, stats in list(self.session_stats.items()):
+            if not stats.draining:
+                continue
+            sem = self.session_permits.get(session_id)
+            if sem is not None and getattr(sem, "_value", self.session_concurrency) < self.session_concurrency:
+                continue  # still in use
+            client = self.sessions.pop(session_id, None)
+            if client is not None:
+                try:
+                    await client.stop()
+                except Exception:
+                    pass
+            if stats.retiring:
+                self.session_stats.pop(session_id, None)
+                self.session_locks.pop(session_id, None)
+                self.session_permits.pop(session_id, None)
+                self._cached_usernames.pop(session_id, None)
+                print(f"🗑️ Session {session_id} retired")
+            else:
+                # Updated session string or lost connection: next acquisition starts a fresh client
+                stats.draining = False
+                stats.client_started = False
+                print(f"♻️ Session {session_id} will restart on its next acquisition")
+
+    async def reload(self) -> Dict[str, int]:
+        """Sync with the sessions collection: register new accounts, drain removed or updated ones"""
+        seen: Dict[str, dict] = {}
+        async for doc in self._iter_active(_REGISTRY_PROJECTION):
+            seen[doc["_id"]] = doc
+        added = updated = removed = 0
+        for session_id, doc in seen.items():
+            version = self._doc_version(doc)
+            stats = self.session_stats.get(session_id)
+            if stats is None:
+                self._register(session_id, doc.get("device_model", "iPhone 16 Pro"), version)
+                added += 1
+            elif version > stats.version:
+                stats.version = version
+                stats.device_model = doc.get("device_model", stats.device_model)
+                if session_id in self.sessions:
+                    self._drain(session_id, retire=False)
+                updated += 1
+        for session_id, stats in list(self.session_stats.items()):
+            if session_id not in seen and not stats.retiring:
+                self._drain(session_id, retire=True)
+                removed += 1
+        await self._finish_draining()
+        if added or updated or removed:
+            print(f"🔄 Session pool reload: +{added} ~{updated} -{removed} (total {len(self.session_stats)})")
+            await self._wake_waiters()
+        return {"added": added, "updated": updated, "removed": removed}
+
+    async def _reload_loop(self) -> None:
+        while True:
+            await asyncio.sleep(POOL_RELOAD_INTERVAL)
+            try:
+                await self.reload()
+            except Exception as e:
+                print(f"⚠️ Session pool reload failed: {e}")
+
+    def start_reload_loop(self) -> None:
+        """Pick up sessions added/removed by other processes (or directly in MongoDB) without a restart"""
+        if self._reload_task is None and POOL_RELOAD_INTERVAL > 0:
+            self._reload_task = asyncio.create_task(self._reload_loop())
 
     async def initialize(self):
         async with self.init_lock:
-            cursor = self.collection.find({"is_active": True})
-            sessions_data = await cursor.to_list(length=100)
-            for session_data in sessions_data:
+            count = 0
+            async for session_data in self._iter_active(_REGISTRY_PROJECTION):
                 session_id = session_data["_id"]
                 device_model = session_data.get("device_model", "iPhone 16 Pro")
-                self.session_stats[session_id] = SessionStats(session_id=session_id, device_model=device_model)
-                self.session_locks[session_id] = asyncio.Lock()
-                self.session_permits[session_id] = asyncio.Semaphore(self.session_concurrency)
-            print(f"Session pool initialized with {len(sessions_data)} sessions")
+                self._register(session_id, device_model, self._doc_version(session_data))
+                count += 1
+            print(f"Session pool initialized with {count} sessions")
 
     async def add_session(self, session_id: str, session_string: str, device_model: str = "iPhone 16 Pro") -> bool:
         try:
-            existing = await self.collection.find_one({"_id": session_id})
+            now = time.time()
+            existing = await self.collection.find_one({"_id": session_id}, {"_id": 1})
             if existing:
                 await self.collection.update_one(
                     {"_id": session_id},
-                    {"$set": {"session_string": session_string, "device_model": device_model, "is_active": True, "last_updated": time.time()}}
+                    {"$set": {"session_string": session_string, "device_model": device_model, "is_active": True, "last_updated": now}}
                 )
             else:
                 await self.collection.insert_one({
@@ -125,14 +391,23 @@ class SessionPool:
                     "session_string": session_string,
                     "device_model": device_model,
                     "is_active": True,
-                    "added_at": time.time(),
-                    "last_updated": time.time()
+                    "added_at": now,
+                    "last_updated": now
                 })
-            self.session_stats[session_id] = SessionStats(session_id=session_id, device_model=device_model)
-            if session_id not in self.session_locks:
-                self.session_locks[session_id] = asyncio.Lock()
-            if session_id not in self.session_permits:
-                self.session_permits[session_id] = asyncio.Semaphore(self.session_concurrency)
+            stats = self.session_stats.get(session_id)
+            if stats is None:
+                self._register(session_id, device_model, now)
+            else:
+                # Replaced session string: let running transfers finish on the old client
+                stats.version = now
+                stats.device_model = device_model
+                stats.retiring = False
+                if session_id in self.sessions:
+                    self._drain(session_id, retire=False)
+                else:
+                    stats.draining = False
+                await self._finish_draining()
+            await self._wake_waiters()
             return True
         except Exception as e:
             print(f"Error adding session {session_id}: {e}")
@@ -143,74 +418,30 @@ class SessionPool:
             files_deleted = delete_session_files_from_disk(session_id)
             if files_deleted > 0:
                 print(f"🗑️ SessionPool: Cleaned up {files_deleted} session file(s) for {session_id}")
-            await self.collection.update_one({"_id": session_id}, {"$set": {"is_active": False}})
-            if session_id in self.sessions:
-                try:
-                    await self.sessions[session_id].stop()
-                except Exception:
-                    pass
-                del self.sessions[session_id]
-            self.session_stats.pop(session_id, None)
-            self.session_locks.pop(session_id, None)
-            self.cooldown_sessions.pop(session_id, None)
-            self.session_permits.pop(session_id, None)
+            await self.collection.update_one({"_id": session_id}, {"$set": {"is_active": False, "last_updated": time.time()}})
+            # Transfers already running on it finish first; it gets no new work
+            self._drain(session_id, retire=True)
+            await self._finish_draining()
             return True
         except Exception as e:
             print(f"Error removing session {session_id}: {e}")
             return False
 
-    async def get_session(self) -> Tuple[Optional[Client], Optional[str]]:
+    async def get_session(self, method_class: Optional[str] = None) -> Tuple[Optional[Client], Optional[str]]:
         current_time = time.time()
-        available_sessions = [
-            s for s in self.session_stats.keys()
-            if s not in self.cooldown_sessions or current_time - self.cooldown_sessions[s] > self.cooldown_period
-        ]
+        available_sessions = [s for s in self.session_stats.keys() if self._is_available(s, current_time, method_class)]
         if not available_sessions:
             print("No available sessions in pool")
             return None, None
         await self._cleanup_disconnected_sessions()
         available_sessions.sort(key=lambda s: self.session_stats[s].last_used)
         for session_id in available_sessions:
-            if self.session_locks[session_id].locked():
+            if not self._is_available(session_id, current_time, method_class) or self.session_locks[session_id].locked():
                 continue
             try:
                 async with self.session_locks[session_id]:
                     if session_id not in self.sessions:
-                        session_data = await self.collection.find_one({"_id": session_id})
-                        if not session_data or not session_data.get("is_active", False):
-                            self.session_stats[session_id].last_start_error = "inactive or missing session document"
-                            continue
-                        sess_str = session_data.get("session_string")
-                        if not sess_str:
-                            self.session_stats[session_id].last_start_error = "missing session_string"
-                            continue
-                        try:
-                            client = Client(
-                                name=f"session_{session_id}",
-                                api_id=API_ID,
-                                api_hash=API_HASH,
-                                session_string=sess_str,
-                                device_model=self.session_stats[session_id].device_model,
-                                in_memory=True,
-                                no_updates=True,
-                                max_concurrent_transmissions=self.session_concurrency,
-                                sleep_threshold=60,
-                                workers=self.session_workers
-                            )
-                            await client.start()
-                            self.sessions[session_id] = client
-                            self.session_stats[session_id].client_started = True
-                            self.session_stats[session_id].last_start_error = ""
-                            # Cache username once for logging
-                            try:
-                                me = await client.get_me()
-                                self._cached_usernames[session_id] = (me.username or f"user_{me.id}")
-                            except Exception:
-                                self._cached_usernames[session_id] = "unknown"
-                        except Exception as start_err:
-                            self.session_stats[session_id].client_started = False
-                            self.session_stats[session_id].last_start_error = str(start_err)
-                            print(f"❌ Failed to start session client {session_id}: {start_err}")
+                        if not await self._start_client(session_id):
                             continue
                     sem = self.session_permits.get(session_id)
                     if not sem:
@@ -222,6 +453,9 @@ class SessionPool:
                     except asyncio.TimeoutError:
                         # No permits available immediately
                         continue
+                    if not self._is_available(session_id, current_time, method_class) or session_id not in self.sessions:
+                        sem.release()
+                        continue
                     self.session_stats[session_id].increment_usage()
                     username = self._cached_usernames.get(session_id, "unknown")
                     print(f"🔄 Using session {session_id} (@{username}) for operation")
@@ -231,8 +465,11 @@ class SessionPool:
         print("❌ No available sessions could be acquired from the pool")
         return None, None
 
-    async def request_session(self, is_premium: bool, timeout: float = 120.0) -> Tuple[Optional[Client], Optional[str]]:
-        deadline = time.time() + max(0.0, timeout)
+    async def request_session(self, is_premium: bool, timeout: float = 120.0, method_class: Optional[str] = None) -> Tuple[Optional[Client], Optional[str]]:
+        started = time.time()
+        deadline = started + max(0.0, timeout)
+        tier = "premium" if is_premium else "free"
+        metrics.queue_enter("pool", tier)
         waiter: asyncio.Future = asyncio.get_running_loop().create_future()
         async with self._cv:
             if is_premium:
@@ -242,14 +479,17 @@ class SessionPool:
             self._cv.notify_all()
         try:
             while True:
-                client, sid = await self._try_acquire_any()
+                client, sid = await self._try_acquire_any(method_class)
                 if client:
                     return client, sid
                 remaining = deadline - time.time()
                 if remaining <= 0:
                     return None, None
+                # Wake up on a release, or as soon as a FloodWait block on some session ends
+                unblock_in = self._next_unblock_in(method_class)
+                wait = min(remaining, unblock_in + 0.05) if unblock_in is not None else remaining
                 try:
-                    await asyncio.wait_for(waiter, timeout=remaining)
+                    await asyncio.wait_for(asyncio.shield(waiter), timeout=wait)
                     # Reset waiter for potential subsequent wake-ups
                     if not waiter.done():
                         waiter.set_result(True)
@@ -260,32 +500,38 @@ class SessionPool:
                         else:
                             self._free_waiters.append(waiter)
                 except asyncio.TimeoutError:
-                    return None, None
+                    if time.time() >= deadline:
+                        return None, None
         finally:
+            metrics.queue_leave("pool", tier, time.time() - started)
             async with self._cv:
                 if waiter in self._premium_waiters:
                     self._premium_waiters.remove(waiter)
                 if waiter in self._free_waiters:
                     self._free_waiters.remove(waiter)
 
-    async def release_session(self, session_id: str, had_error: bool = False, flood_wait_seconds: int = 0):
+    async def release_session(self, session_id: str, had_error: bool = False, flood_wait_seconds: int = 0,
+                              method_class: Optional[str] = None, error: Optional[BaseException] = None):
+        """Return a permit. A FloodWait (flood_wait_seconds, or taken from `error`) blocks only
+        `method_class` on this session, for exactly the time Telegram asked for."""
         if session_id not in self.session_stats:
             print(f"⚠️ Attempted to release unknown session {session_id}")
             return
+        stats = self.session_stats[session_id]
         username = self._cached_usernames.get(session_id, "unknown")
-        if had_error:
-            self.session_stats[session_id].record_error(flood_wait_seconds)
-            print(f"⚠️ Session {session_id} (@{username}) released with error")
-            if self.session_stats[session_id].errors >= self.max_errors_before_cooldown:
-                self.cooldown_sessions[session_id] = time.time()
+        flood_wait_seconds = flood_wait_seconds or flood_wait_seconds_of(error)
+        if had_error or error is not None or flood_wait_seconds:
+            stats.record_error(flood_wait_seconds, method_class)
+            print(f"⚠️ Session {session_id} (@{username}) released with error (score {stats.error_score:.1f})")
+            if flood_wait_seconds:
+                key = method_class or ALL_METHODS
+                self.flood_waits[key] = self.flood_waits.get(key, 0) + 1
+                print(f"⏱️ Session {session_id} (@{username}) blocked for {method_class or 'all'} operations for {flood_wait_seconds}s (FloodWait)")
+            if stats.error_score >= self.max_errors_before_cooldown and stats.blocked_for(ALL_METHODS) <= 0:
+                stats.block(ALL_METHODS, self.cooldown_period)
                 print(f"❄️ Session {session_id} (@{username}) placed in cooldown for {self.cooldown_period} seconds")
-                self.session_stats[session_id].errors = 0
         else:
             print(f"✅ Session {session_id} (@{username}) released successfully")
-        if flood_wait_seconds > 10:
-            self.cooldown_sessions[session_id] = time.time()
-            cooldown_time = max(flood_wait_seconds * 1.5, self.cooldown_period)
-            print(f"⏱️ Session {session_id} (@{username}) placed in cooldown for {cooldown_time} seconds due to flood wait")
         try:
             if session_id in self.session_permits:
                 sem = self.session_permits[session_id]
@@ -296,39 +542,27 @@ class SessionPool:
                 val_after = getattr(sem, "_value", None)
                 in_use_after = (self.session_concurrency - val_after) if isinstance(val_after, int) else "unknown"
                 print(f"✅ Released permit for {session_id} (@{username}) | in_use(after)={in_use_after} / concurrency={self.session_concurrency} | waiters premium={len(self._premium_waiters)} free={len(self._free_waiters)}")
+            if self.session_stats[session_id].draining:
+                await self._finish_draining()
         finally:
             await self._wake_waiters()
 
-    async def _try_acquire_any(self) -> Tuple[Optional[Client], Optional[str]]:
+    async def _try_acquire_any(self, method_class: Optional[str] = None) -> Tuple[Optional[Client], Optional[str]]:
         await self._cleanup_disconnected_sessions()
         current_time = time.time()
-        candidates = [
-            s for s in self.session_stats.keys()
-            if s not in self.cooldown_sessions or current_time - self.cooldown_sessions[s] > self.cooldown_period
-        ]
-        candidates.sort(key=lambda s: self.session_stats[s].last_used)
+        candidates = [s for s in self.session_stats.keys() if self._is_available(s, current_time, method_class)]
+        # Least recently used first; sessions with a lower (decayed) error score win ties
+        candidates.sort(key=lambda s: (round(self.session_stats[s].current_score(current_time)), self.session_stats[s].last_used))
         for session_id in candidates:
+            # State may have changed (reload/drain) while earlier candidates were awaited
+            if not self._is_available(session_id, current_time, method_class):
+                continue
             if session_id not in self.sessions:
                 try:
                     async with self.session_locks[session_id]:
                         if session_id not in self.sessions:
-                            session_data = await self.collection.find_one({"_id": session_id})
-                            if not session_data or not session_data.get("is_active", False):
+                            if not await self._start_client(session_id):
                                 continue
-                            client = Client(
-                                name=f"session_{session_id}",
-                                api_id=API_ID,
-                                api_hash=API_HASH,
-                                session_string=session_data["session_string"],
-                                device_model=self.session_stats[session_id].device_model,
-                                in_memory=True,
-                                no_updates=True,
-                                max_concurrent_transmissions=self.session_concurrency,
-                                sleep_threshold=60,
-                                workers=self.session_workers
-                            )
-                            await client.start()
-                            self.sessions[session_id] = client
                 except Exception as e:
                     self.session_stats[session_id].client_started = False
                     self.session_stats[session_id].last_start_error = str(e)
@@ -345,6 +579,9 @@ class SessionPool:
                 await asyncio.wait_for(sem.acquire(), timeout=0.05)
             except asyncio.TimeoutError:
                 continue
+            if not self._is_available(session_id, current_time, method_class) or session_id not in self.sessions:
+                sem.release()
+                continue
 
             # Record usage and return
             self.session_stats[session_id].increment_usage()
@@ -374,42 +611,43 @@ class SessionPool:
             self._cv.notify_all()
     
     async def _cleanup_disconnected_sessions(self):
-        """Clean up sessions that have been disconnected"""
+        """Drain sessions that have been disconnected; a FloodWait on the probe only blocks the session"""
         disconnected_sessions = []
         
         for session_id, client in list(self.sessions.items()):
+            stats = self.session_stats.get(session_id)
+            if stats is None or stats.draining:
+                continue
             try:
                 # Try to check if session is still connected
                 if not client.is_connected:
                     disconnected_sessions.append(session_id)
                     continue
                     
-                # Test connection with a simple API call
-                await asyncio.wait_for(client.get_me(), timeout=5.0)
+                # Test connection with a simple API call, at most once per SESSION_PROBE_INTERVAL
+                await asyncio.wait_for(identity_cache.probe(client, SESSION_PROBE_INTERVAL), timeout=5.0)
             except (OSError, ConnectionError, ConnectionResetError, asyncio.TimeoutError) as e:
                 print(f"🔌 Session {session_id} disconnected: {e}")
                 disconnected_sessions.append(session_id)
             except Exception as e:
+                flood_wait = flood_wait_seconds_of(e)
+                if flood_wait:
+                    # The account is alive, just rate limited: keep it, skip it until the wait is over
+                    print(f"⏳ Session {session_id} health probe hit FloodWait {flood_wait}s, blocking it")
+                    stats.record_error(flood_wait)
+                    continue
                 print(f"⚠️ Error checking session {session_id}: {e}")
                 disconnected_sessions.append(session_id)
         
-        # Remove disconnected sessions
+        # Running transfers keep their client: the session drains and is restarted once idle
         for session_id in disconnected_sessions:
-            try:
-                if session_id in self.sessions:
-                    await self.sessions[session_id].stop()
-                    del self.sessions[session_id]
-                    print(f"🗑️ Removed disconnected session {session_id}")
-            except Exception as e:
-                print(f"⚠️ Error removing session {session_id}: {e}")
-                # Force remove from dict even if stop() fails
-                if session_id in self.sessions:
-                    del self.sessions[session_id]
+            self._drain(session_id, retire=False, reason="disconnected")
+        if disconnected_sessions:
+            await self._finish_draining()
     
     async def get_all_sessions(self) -> List[Dict]:
         """Get information about all active sessions"""
-        cursor = self.collection.find({"is_active": True}).sort("added_at", 1)
-        sessions = await cursor.to_list(length=100)
+        sessions = [doc async for doc in self._iter_active()]
         
         # Enhance with runtime stats
         for session in sessions:
@@ -419,10 +657,10 @@ class SessionPool:
                 session["usage_count"] = stats.usage_count
                 session["last_used"] = stats.last_used
                 session["errors"] = stats.errors
-                session["is_in_cooldown"] = session_id in self.cooldown_sessions
+                blocked = max([stats.blocked_for(cls) for cls in stats.blocked_until] or [0.0])
+                session["is_in_cooldown"] = blocked > 0
                 if session["is_in_cooldown"]:
-                    cooldown_remaining = self.cooldown_period - (time.time() - self.cooldown_sessions[session_id])
-                    session["cooldown_remaining"] = max(0, cooldown_remaining)
+                    session["cooldown_remaining"] = blocked
         
         return sessions
     
@@ -437,7 +675,6 @@ class SessionPool:
         self.sessions.clear()
         self.session_stats.clear()
         self.session_locks.clear()
-        self.cooldown_sessions.clear()
 
     async def get_diagnostics(self) -> Dict[str, dict]:
         """Return a snapshot of session pool state for diagnostics."""
@@ -456,16 +693,22 @@ class SessionPool:
                 "usage_count": stat.usage_count if stat else None,
                 "last_used": stat.last_used if stat else None,
                 "errors": stat.errors if stat else None,
-                "in_cooldown": sid in self.cooldown_sessions,
+                "in_cooldown": bool(stat) and stat.blocked_for(ALL_METHODS) > 0,
+                "blocked": {cls: round(stat.blocked_for(cls)) for cls in stat.blocked_until if stat.blocked_for(cls) > 0} if stat else {},
+                "error_score": round(stat.current_score(), 2) if stat else None,
                 "client_started": stat.client_started if stat else None,
                 "last_start_error": stat.last_start_error if stat else None,
             }
+        diag["_warmup"] = dict(self.warmup_report)
         # Waiter counts
-        diag["_waiters"] = {
+        diag["_waiters"] = self.waiter_counts()
+        return diag
+
+    def waiter_counts(self) -> Dict[str, int]:
+        return {
             "premium": len(self._premium_waiters),
             "free": len(self._free_waiters),
         }
-        return diag
 
 
 # Create global instance
@@ -4,15 +4,117 @@ Simple Flood Wait Management System
 - Prevents downloads during flood wait
 - Admin commands: /flood and /unflood
 - Survives restarts and reboots
+- Active waits are mirrored in memory (dict + expiry min-heap); checks never hit MongoDB
+- Expired documents are removed by a TTL index on `expires_at`
 """
 
+import asyncio
+import heapq
 import re
+import time
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument
 from devgagan.core.mongo.connection import get_collection
 
 # MongoDB collection for flood waits
 flood_waits_db = get_collection("flood_management", "active_flood_waits")
 
+# Seconds between attempts to load the persisted flood waits while MongoDB is unreachable
+LOAD_RETRY_INTERVAL = 10
+
+
+class _FloodWaitMirror:
+    """In-memory copy of the active flood waits.
+
+    `entries` maps user_id -> flood wait doc, `heap` holds (expires_at, user_id)
+    for lazy expiry. Kept in sync by apply/remove and, when the deployment
+    supports it (replica set), by a change stream on the collection.
+    """
+
+    def __init__(self):
+        self.entries = {}
+        self.heap = []
+        self._doc_ids = {}  # Mongo _id -> user_id (delete events only carry _id)
+        self._loaded = False
+        self._retry_at = 0.0  # monotonic time of the next load attempt after a failure
+        self._load_lock = None
+        self._watch_task = None
+
+    def put(self, doc):
+        user_id = doc["user_id"]
+        self.entries[user_id] = doc
+        if doc.get("_id") is not None:
+            self._doc_ids[doc["_id"]] = user_id
+        heapq.heappush(self.heap, (doc["expires_at"], user_id))
+
+    def drop(self, user_id):
+        self.entries.pop(user_id, None)
+
+    def prune(self, now):
+        """Pop expired heap entries; stale heap items (re-applied waits) are skipped"""
+        while self.heap and self.heap[0][0] <= now:
+            expires_at, user_id = heapq.heappop(self.heap)
+            doc = self.entries.get(user_id)
+            if doc is not None and doc["expires_at"] <= now:
+                self.entries.pop(user_id, None)
+                print(f"🕐 Flood wait expired for user {user_id}, removed automatically")
+
+    async def ensure_loaded(self):
+        if self._loaded or time.monotonic() < self._retry_at:
+            return
+        if self._load_lock is None:
+            self._load_lock = asyncio.Lock()
+        async with self._load_lock:
+            if self._loaded or time.monotonic() < self._retry_at:
+                return
+            try:
+                await flood_waits_db.create_index("expires_at", expireAfterSeconds=0)
+            except Exception as ttl_err:
+                if "IndexOptionsConflict" in str(ttl_err) or "equivalent index already exists" in str(ttl_err):
+                    pass
+                else:
+                    print(f"⚠️ Warning: Could not create flood wait TTL index: {ttl_err}")
+            try:
+                await flood_waits_db.create_index("user_id", unique=True)
+            except Exception:
+                pass
+            try:
+                now = datetime.utcnow()
+                async for doc in flood_waits_db.find({"active": True, "expires_at": {"$gt": now}}):
+                    self.put(doc)
+                print(f"✅ Loaded {len(self.entries)} active flood waits into memory")
+            except Exception as e:
+                # Not loaded: try again on a later call instead of ignoring persisted waits
+                self._retry_at = time.monotonic() + LOAD_RETRY_INTERVAL
+                print(f"⚠️ Warning: Could not load flood waits, retrying in {LOAD_RETRY_INTERVAL}s: {e}")
+                return
+            self._loaded = True
+            if self._watch_task is None:
+                try:
+                    self._watch_task = asyncio.create_task(self._watch())
+                except Exception:
+                    pass
+
+    async def _watch(self):
+        """Follow writes made by other processes; silently disabled on standalone servers"""
+        try:
+            async with flood_waits_db.watch(full_document="updateLookup") as stream:
+                async for change in stream:
+                    op = change.get("operationType")
+                    if op in ("insert", "update", "replace"):
+                        doc = change.get("fullDocument")
+                        if doc and doc.get("active", True) and doc.get("user_id") is not None:
+                            self.put(doc)
+                    elif op == "delete":
+                        user_id = self._doc_ids.pop(change.get("documentKey", {}).get("_id"), None)
+                        if user_id is not None:
+                            self.drop(user_id)
+        except Exception as e:
+            print(f"ℹ️ Flood wait change stream unavailable, using local sync only: {e}")
+
+
+_mirror = _FloodWaitMirror()
+
 class SimpleFloodWaitManager:
     """Simple flood wait management with MongoDB persistence"""
     
@@ -94,21 +196,23 @@ class SimpleFloodWaitManager:
             now = datetime.utcnow()
             expires_at = now + timedelta(seconds=seconds)
             
+            await _mirror.ensure_loaded()
+            doc = {
+                "user_id": user_id,
+                "applied_at": now,
+                "expires_at": expires_at,
+                "seconds": seconds,
+                "admin_id": admin_id,
+                "active": True
+            }
             # Store in MongoDB (upsert to replace existing)
-            await flood_waits_db.update_one(
+            stored = await flood_waits_db.find_one_and_update(
                 {"user_id": user_id},
-                {
-                    "$set": {
-                        "user_id": user_id,
-                        "applied_at": now,
-                        "expires_at": expires_at,
-                        "seconds": seconds,
-                        "admin_id": admin_id,
-                        "active": True
-                    }
-                },
-                upsert=True
+                {"$set": doc},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
             )
+            _mirror.put(stored or doc)
             
             print(f"✅ Applied {seconds}s flood wait to user {user_id} by admin {admin_id}")
             return True
@@ -121,10 +225,13 @@ class SimpleFloodWaitManager:
     async def remove_flood_wait(user_id: int, admin_id: int):
         """Remove flood wait from user"""
         try:
+            await _mirror.ensure_loaded()
             # Remove from MongoDB
             result = await flood_waits_db.delete_one({"user_id": user_id})
+            was_cached = user_id in _mirror.entries
+            _mirror.drop(user_id)
             
-            if result.deleted_count > 0:
+            if result.deleted_count > 0 or was_cached:
                 print(f"✅ Removed flood wait from user {user_id} by admin {admin_id}")
                 return True
             else:
@@ -137,21 +244,21 @@ class SimpleFloodWaitManager:
     
     @staticmethod
     async def check_flood_wait(user_id: int):
-        """Check if user has active flood wait"""
+        """Check if user has active flood wait (in-memory lookup)"""
         try:
-            # Get flood wait from MongoDB
-            flood_wait = await flood_waits_db.find_one({"user_id": user_id, "active": True})
+            await _mirror.ensure_loaded()
+            flood_wait = _mirror.entries.get(user_id)
             
             if not flood_wait:
                 return False, 0
             
-            # Check if expired
+            # Check if expired (the TTL index removes the MongoDB document)
             now = datetime.utcnow()
+            _mirror.prune(now)
             expires_at = flood_wait["expires_at"]
             
             if now >= expires_at:
-                # Expired, remove it
-                await flood_waits_db.delete_one({"user_id": user_id})
+                _mirror.drop(user_id)
                 print(f"🕐 Flood wait expired for user {user_id}, removed automatically")
                 return False, 0
             
@@ -180,21 +287,16 @@ class SimpleFloodWaitManager:
     
     @staticmethod
     async def get_all_active_flood_waits():
-        """Get all active flood waits"""
+        """Get all active flood waits (from the in-memory mirror)"""
         try:
+            await _mirror.ensure_loaded()
             now = datetime.utcnow()
-            
-            # Get all active flood waits
-            cursor = flood_waits_db.find({"active": True})
+            _mirror.prune(now)
             active_waits = []
             
-            async for flood_wait in cursor:
+            for flood_wait in list(_mirror.entries.values()):
                 expires_at = flood_wait["expires_at"]
-                
-                # Check if expired
                 if now >= expires_at:
-                    # Remove expired ones
-                    await flood_waits_db.delete_one({"user_id": flood_wait["user_id"]})
                     continue
                 
                 # Calculate remaining time
@@ -0,0 +1,143 @@
+"""
+Forum topic message index.
+
+Pages a topic's message ids with thread-filtered history (messages.getReplies
+on the topic's root message) instead of scanning raw id ranges and checking
+reply_to/thread ids on every message. Ids are cached per (chat, topic); a
+later request only pages the part of the topic it has not seen yet, and a
+topic that was read to its end is refreshed incrementally after
+TOPIC_INDEX_TTL seconds.
+"""
+
+import asyncio
+import os
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from pyrogram import raw
+
+from devgagan.core.request_queue import request_dispatcher
+
+
+def _to_int(val: Optional[str], default: int) -> int:
+    try:
+        return int(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+TOPIC_INDEX_TTL: int = _to_int(os.getenv("TOPIC_INDEX_TTL"), 300)
+TOPIC_INDEX_PAGE: int = 100  # getReplies page size limit
+TOPIC_INDEX_MAX_ENTRIES: int = _to_int(os.getenv("TOPIC_INDEX_MAX_ENTRIES"), 256)
+
+
+@dataclass
+class TopicEntry:
+    ids: List[int] = field(default_factory=list)  # sorted ascending
+    lo: int = 0            # ids >= lo have been paged
+    hi: int = 0            # ... up to and including hi
+    complete: bool = False  # paging reached the newest message at checked_at
+    checked_at: float = 0.0
+    pages: int = 0
+    touched_at: float = field(default_factory=time.time)
+
+
+class TopicIndex:
+    def __init__(self):
+        self._entries: Dict[Tuple[object, int], TopicEntry] = {}
+        self._locks: Dict[Tuple[object, int], asyncio.Lock] = {}
+
+    async def _replies_page(self, client, peer, topic_id: int, offset_id: int, min_id: int):
+        """One page of topic messages with ids >= offset_id (oldest first within the page).
+
+        Goes through the session's request queue, which paces it and retries FloodWaits.
+        """
+        return await request_dispatcher.call(client, client.invoke, raw.functions.messages.GetReplies(
+            peer=peer,
+            msg_id=topic_id,
+            offset_id=offset_id,
+            offset_date=0,
+            add_offset=-TOPIC_INDEX_PAGE,
+            limit=TOPIC_INDEX_PAGE,
+            max_id=0,
+            min_id=min_id,
+            hash=0,
+        ), label=f"topic {topic_id} page")
+
+    async def _page_forward(self, client, chat, topic_id: int, entry: TopicEntry, start: int, want: int) -> None:
+        peer = await client.resolve_peer(chat)
+        cursor = start
+        while True:
+            res = await self._replies_page(client, peer, topic_id, cursor, start - 1)
+            entry.pages += 1
+            page_ids = sorted({
+                m.id for m in getattr(res, "messages", [])
+                if isinstance(m, raw.types.Message) and m.id >= cursor
+            })
+            if page_ids:
+                known = set(entry.ids)
+                entry.ids.extend(i for i in page_ids if i not in known)
+                entry.ids.sort()
+                entry.hi = max(entry.hi, page_ids[-1])
+                cursor = page_ids[-1] + 1
+            if len(page_ids) < TOPIC_INDEX_PAGE:
+                # Short page: nothing newer in the topic right now
+                entry.complete = True
+                entry.checked_at = time.time()
+                return
+            entry.complete = False
+            if sum(1 for i in entry.ids if i >= start) >= want:
+                return
+
+    async def get_ids(self, client, chat, topic_id: int, start_id: int, want: int) -> Tuple[List[int], bool]:
+        """Topic message ids >= start_id (at least `want` when the topic has them).
+
+        Returns (ids, complete); complete means there are no topic messages after the
+        last returned id as of the last refresh.
+        """
+        key = (chat, int(topic_id))
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._entries.get(key)
+            if entry is None or start_id < entry.lo:
+                entry = TopicEntry(lo=start_id, hi=start_id - 1)
+                self._entries[key] = entry
+                self._trim()
+            entry.touched_at = time.time()
+            have = [i for i in entry.ids if i >= start_id]
+            stale = entry.complete and time.time() - entry.checked_at > TOPIC_INDEX_TTL
+            if (len(have) < want and not entry.complete) or stale:
+                # Incremental: only page what is newer than the covered range
+                await self._page_forward(client, chat, topic_id, entry, max(start_id, entry.hi + 1), want)
+                have = [i for i in entry.ids if i >= start_id]
+            print(f"📚 TOPIC INDEX: topic {topic_id} -> {len(have)} ids >= {start_id} "
+                  f"(complete={entry.complete}, pages so far={entry.pages})")
+            return have[:max(want, 0)] if want else have, entry.complete and len(have) <= want
+
+    async def newest_id(self, client, chat, topic_id: int) -> Optional[int]:
+        """Newest message id in a topic (one getReplies call)"""
+        peer = await client.resolve_peer(chat)
+        res = await request_dispatcher.call(client, client.invoke, raw.functions.messages.GetReplies(
+            peer=peer, msg_id=int(topic_id), offset_id=0, offset_date=0,
+            add_offset=0, limit=1, max_id=0, min_id=0, hash=0,
+        ), label=f"topic {topic_id} newest")
+        ids = [m.id for m in getattr(res, "messages", []) if isinstance(m, raw.types.Message)]
+        return max(ids) if ids else None
+
+    def invalidate(self, chat=None, topic_id: Optional[int] = None) -> None:
+        if chat is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == chat and (topic_id is None or k[1] == topic_id)]:
+            self._entries.pop(key, None)
+
+    def _trim(self) -> None:
+        while len(self._entries) > TOPIC_INDEX_MAX_ENTRIES:
+            oldest = min(self._entries, key=lambda k: self._entries[k].touched_at)
+            self._entries.pop(oldest, None)
+            self._locks.pop(oldest, None)
+
+
+# Global instance
+topic_index = TopicIndex()
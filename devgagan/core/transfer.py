@@ -0,0 +1,113 @@
+"""
+Transfer steps shared by the link handlers (get_func) and the offline
+benchmark (benchmarks/bench_transfers.py), so both run the same code.
+
+- request_pool_session(): premium-aware pool acquisition for a method class,
+  with the tier's wait limit
+- MediaFetch: downloads one message's media into RAM (memory budget) when
+  allowed, otherwise onto disk under a disk budget reservation; hands
+  placeholder space back as the file grows and refreshes an expired file
+  reference once. release() drops both reservations once the upload is done.
+"""
+
+import asyncio
+import os
+from typing import Awaitable, Callable, Optional, Tuple
+
+from devgagan.core.disk_budget import DiskBudget, Reservation, disk_budget
+from devgagan.core.memory_budget import MemoryBudget, MemoryReservation, memory_budget
+from devgagan.core.message_cache import is_file_reference_error
+from devgagan.core.session_pool import SessionPool, session_pool
+
+
+def _to_float(val: Optional[str], default: float) -> float:
+    try:
+        return float(val) if val is not None and str(val).strip() != "" else default
+    except Exception:
+        return default
+
+
+# Longest wait for a pool session before falling back (premium users wait less)
+POOL_ACQUIRE_TIMEOUT_PREMIUM: float = _to_float(os.getenv("POOL_ACQUIRE_TIMEOUT_PREMIUM"), 120.0)
+POOL_ACQUIRE_TIMEOUT_FREE: float = _to_float(os.getenv("POOL_ACQUIRE_TIMEOUT_FREE"), 300.0)
+
+Progress = Callable[[int, int], Awaitable[None]]
+
+
+async def request_pool_session(is_premium: bool, method_class: str,
+                               pool: Optional[SessionPool] = None) -> Tuple[Optional[object], Optional[str]]:
+    """(client, session_id) from the pool, or (None, None) when none freed up in time"""
+    pool = pool or session_pool
+    timeout = POOL_ACQUIRE_TIMEOUT_PREMIUM if is_premium else POOL_ACQUIRE_TIMEOUT_FREE
+    return await pool.request_session(is_premium=is_premium, timeout=timeout, method_class=method_class)
+
+
+class MediaFetch:
+    def __init__(self, key: str, size: int, disk: Optional[DiskBudget] = None, memory: Optional[MemoryBudget] = None):
+        self.key = key  # target path on disk; also the budget reservation key
+        self.size = max(int(size or 0), 0)
+        self.disk = disk or disk_budget
+        self.memory = memory or memory_budget
+        self.disk_reservation: Optional[Reservation] = None
+        self.memory_reservation: Optional[MemoryReservation] = None
+        self.msg = None  # the message actually downloaded (refreshed on a file reference error)
+
+    async def run(self, client, msg, progress: Optional[Progress] = None,
+                  refresh: Optional[Callable[[], Awaitable[object]]] = None, in_memory: bool = False,
+                  name: Optional[str] = None, cancel_check: Optional[Callable[[], Awaitable[bool]]] = None):
+        """Download msg's media; returns a named BytesIO (RAM path) or the file path.
+
+        refresh() must return a fresh copy of msg; it is called once when the
+        download fails with an expired file reference.
+        """
+        self.msg = msg
+
+        async def _progress(current: int, total: int):
+            # Hand preallocated disk space back as the real file grows
+            if self.disk_reservation:
+                self.disk_reservation.progress(current)
+            if progress is not None:
+                await progress(current, total)
+
+        async def _download(**kwargs):
+            try:
+                return await client.download_media(self.msg, progress=_progress, **kwargs)
+            except Exception as ref_err:
+                # Cached or long-queued message: fetch a fresh file reference once
+                if refresh is None or not is_file_reference_error(ref_err):
+                    raise
+                self.msg = await refresh()
+                return await client.download_media(self.msg, progress=_progress, **kwargs)
+
+        # Small photos/voice/audio/documents skip the disk when the memory budget allows
+        if in_memory:
+            self.memory_reservation = self.memory.try_reserve(self.key, self.size)
+        if self.memory_reservation:
+            buffer = None
+            try:
+                buffer = await _download(in_memory=True)
+            except asyncio.CancelledError:
+                raise
+            except Exception as mem_err:
+                print(f"⚠️ In-memory download failed, retrying on disk: {mem_err}")
+            if buffer is not None:
+                # Logical rename: uploads take the filename from the buffer
+                buffer.name = name or os.path.basename(self.key)
+                return buffer
+            self.memory.release(self.memory_reservation.key)
+            self.memory_reservation = None
+
+        # Reserve the expected size before transferring; waits while the disk budget is full
+        self.disk_reservation = await self.disk.reserve(self.key, self.size, cancel_check=cancel_check)
+        path = await _download(file_name=self.key)
+        if not path or not os.path.exists(path):
+            raise Exception("Download failed: path not created")
+        return path
+
+    def release(self) -> None:
+        if self.disk_reservation:
+            self.disk.release(self.disk_reservation.key)
+            self.disk_reservation = None
+        if self.memory_reservation:
+            self.memory.release(self.memory_reservation.key)
+            self.memory_reservation = None
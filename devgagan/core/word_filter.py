@@ -0,0 +1,47 @@
+"""
+Per-user delete/replace word filter.
+
+A user's delete_words and replacement_words are compiled into a single regex
+alternation (longest word first), so captions and filenames are rewritten in
+one pass instead of one str.replace per word. Filters are built by
+DatabaseManager.get_word_filter and rebuilt only when those settings change.
+"""
+
+import re
+from typing import Dict, Iterable, Optional
+
+
+class WordFilter:
+    def __init__(self, delete_words: Iterable[str], replacements: Dict[str, str]):
+        # word -> replacement; None marks a delete word (delete wins over replace)
+        self._mapping: Dict[str, Optional[str]] = {
+            word: replacement for word, replacement in (replacements or {}).items() if word
+        }
+        for word in delete_words or ():
+            if word:
+                self._mapping[word] = None
+        self._pattern = None
+        if self._mapping:
+            words = sorted(self._mapping, key=len, reverse=True)
+            self._pattern = re.compile("|".join(map(re.escape, words)))
+
+    def __bool__(self) -> bool:
+        return self._pattern is not None
+
+    def __len__(self) -> int:
+        return len(self._mapping)
+
+    def apply(self, text: str, deleted: str = "") -> str:
+        """Remove delete words (replaced by `deleted`) and apply replacements in one pass"""
+        if not text or self._pattern is None:
+            return text
+        mapping = self._mapping
+
+        def _sub(match):
+            replacement = mapping[match.group(0)]
+            return deleted if replacement is None else replacement
+
+        return self._pattern.sub(_sub, text)
+
+
+EMPTY_FILTER = WordFilter((), {})
@@ -1,3 +1,5 @@
+import html
+import io
 import time
 from typing import List
 from pyrogram import filters
@@ -10,6 +12,9 @@ from devgagan import app
 from config import OWNER_ID
 from devgagan.core.session_pool import session_pool
 from devgagan.core.metrics import metrics
+from devgagan.core.request_queue import request_dispatcher
+from devgagan.core.message_cache import message_cache
+from devgagan.core.loop_monitor import loop_monitor, PROFILE_MAX_SECONDS
 from devgagan.core.mongo.plans_db import check_premium
 
 
@@ -35,19 +40,23 @@ async def diag_pool(_, message):
     # Session pool diagnostics
     diag = await session_pool.get_diagnostics()
     waiters = diag.pop("_waiters", {"premium": 0, "free": 0})
+    warmup = diag.pop("_warmup", {})
 
     # Metrics snapshot
     snap = await metrics.snapshot()
     tasks = snap.get("tasks", [])
     per_session = snap.get("per_session", {})
 
-    # Compute premium/free counts for current tasks
+    # Compute premium/free counts for current tasks (one cached lookup per distinct user)
     prem_count = 0
     free_count = 0
+    tier_by_user = {}
     for t in tasks:
         try:
-            doc = await check_premium(int(t.get("user_id")))
-            if doc:
+            uid = int(t.get("user_id"))
+            if uid not in tier_by_user:
+                tier_by_user[uid] = bool(await check_premium(uid))
+            if tier_by_user[uid]:
                 prem_count += 1
             else:
                 free_count += 1
@@ -64,6 +73,56 @@ async def diag_pool(_, message):
         f"(downloads=<code>{snap['totals']['downloads']}</code>, uploads=<code>{snap['totals']['uploads']}</code>)"
     )
     lines.append(f"<b>Active by tier</b>: premium=<code>{prem_count}</code> | free=<code>{free_count}</code>")
+    strategies = snap.get("strategies") or {}
+    if strategies:
+        lines.append("<b>Transfer strategies</b>: " + " | ".join(
+            f"{name}=<code>{count}</code>" for name, count in sorted(strategies.items())
+        ))
+    queues = request_dispatcher.stats()
+    if queues:
+        lines.append("<b>Request queues</b>: " + " | ".join(
+            f"{name}=<code>{q['queued']}</code>@<code>{q['interval']}s</code>" for name, q in sorted(queues.items())
+        ))
+    if warmup:
+        lines.append(
+            f"<b>Pool warm-up</b>: ready=<code>{warmup.get('ready', 0)}</code> "
+            f"failed=<code>{warmup.get('failed', 0)}</code> in <code>{warmup.get('seconds', 0)}s</code>"
+        )
+    by_tier = snap.get("by_tier") or {}
+    if by_tier:
+        lines.append("<b>Finished by tier</b>: " + " | ".join(
+            f"{tier}=<code>{sum(s['statuses'].values())}</code> "
+            f"(p50=<code>{s['duration_p50']}s</code>, avg=<code>{round((s['avg_throughput'] or 0) / 1048576, 2)} MB/s</code>)"
+            for tier, s in sorted(by_tier.items())
+        ))
+    persistence = snap.get("persistence") or {}
+    if persistence.get("pending") or persistence.get("dropped"):
+        lines.append(
+            f"<b>Metrics flush</b>: pending=<code>{persistence.get('pending', 0)}</code> "
+            f"dropped=<code>{persistence.get('dropped', 0)}</code>"
+        )
+    boot = snap.get("boot") or {}
+    if boot:
+        lines.append("<b>Startup</b>: " + " | ".join(f"{name}=<code>{secs}s</code>" for name, secs in boot.items()))
+    lag = loop_monitor.stats()
+    lines.append(
+        f"<b>Event loop</b>: lag=<code>{lag['lag'] * 1000:.0f}ms</code> "
+        f"p99&lt;=<code>{lag['p99'] * 1000:.0f}ms</code> max=<code>{lag['max_lag'] * 1000:.0f}ms</code>"
+    )
+    slow = list(loop_monitor.slow_callbacks)[-3:]
+    if slow:
+        lines.append(f"<b>Slow callbacks</b> (last {len(slow)} of {lag['slow_callbacks']}):")
+        for entry in reversed(slow):
+            lines.append(
+                f"   - <code>{entry['duration']}s</code> at <code>{_fmt_ts(entry['at'])}</code> "
+                f"in <code>{html.escape(str(entry['where']))}</code>"
+            )
+    mc = message_cache.stats()
+    lines.append(
+        f"<b>Message cache</b>: meta=<code>{mc['meta_hits']}/{mc['meta_hits'] + mc['meta_misses']}</code> "
+        f"objects=<code>{mc['object_hits']}/{mc['object_hits'] + mc['object_misses']}</code> "
+        f"chats=<code>{mc['chat_hits']}/{mc['chat_hits'] + mc['chat_misses']}</code> hits"
+    )
     lines.append("")
 
     # List running tasks (cap to 15)
@@ -90,11 +149,14 @@ async def diag_pool(_, message):
             errors = info.get("errors")
             last = _fmt_ts(info.get("last_used", 0))
             cool = " (cooldown)" if info.get("in_cooldown") else ""
+            blocked = info.get("blocked") or {}
+            if blocked:
+                cool += " blocked=" + ",".join(f"<code>{cls}:{secs}s</code>" for cls, secs in blocked.items())
             started = info.get("client_started")
             start_err = info.get("last_start_error") or ""
             lines.append(
                 f"• <code>{sid}</code>: in_use=<code>{in_use}/{conc}</code> "
-                f"used=<code>{usage}</code> errors=<code>{errors}</code> last=<code>{last}</code>{cool}"
+                f"used=<code>{usage}</code> errors=<code>{errors}</code> score=<code>{info.get('error_score')}</code> last=<code>{last}</code>{cool}"
             )
             if started is not None:
                 ok = "✅" if started else "❌"
@@ -122,3 +184,40 @@ async def diag_pool(_, message):
     text = "\n".join(lines)
     kb = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="nav:back_delete")]])
     await message.reply_text(text, parse_mode=ParseMode.HTML, disable_web_page_preview=True, reply_markup=kb)
+
+
+@app.on_message(filters.command("profile") & filters.private)
+async def profile_cmd(_, message):
+    """/profile [seconds] - sample all threads and send collapsed stacks (owner only)"""
+    user_id = message.from_user.id if message.from_user else message.chat.id
+    # Silent admin check - no response for non-admins
+    if user_id not in OWNER_ID:
+        return
+    try:
+        seconds = int(message.command[1]) if len(message.command) > 1 else 10
+    except ValueError:
+        seconds = 0
+    if seconds <= 0:
+        await message.reply_text(f"Usage: /profile [seconds] (1-{PROFILE_MAX_SECONDS})")
+        return
+    seconds = min(seconds, PROFILE_MAX_SECONDS)
+    status = await message.reply_text(f"🔬 Profiling for {seconds}s...")
+    try:
+        folded = await loop_monitor.profile(seconds)
+    except Exception as e:
+        await status.edit_text(f"❌ Profiling failed: {e}")
+        return
+    bio = io.BytesIO(folded.encode("utf-8"))
+    bio.name = f"profile-{int(time.time())}.folded"
+    slow = list(loop_monitor.slow_callbacks)
+    caption = (
+        f"Collapsed stacks for {seconds}s (flamegraph.pl / speedscope).\n"
+        f"Slow callbacks recorded: {len(slow)}"
+    )
+    if slow:
+        caption += f"\nLatest: {slow[-1]['duration']}s in {slow[-1]['where']}"
+    await message.reply_document(bio, caption=caption[:1000], parse_mode=ParseMode.DISABLED)
+    try:
+        await status.delete()
+    except Exception:
+        pass
@@ -1,5 +1,4 @@
 import asyncio
-import os
 import traceback
 from pyrogram import filters
 from pyrogram.enums import ParseMode
@@ -10,26 +9,159 @@ from pyrogram.errors import (
 )
 from config import OWNER_ID
 from devgagan import app
-from devgagan.core.mongo.users_db import get_users
+from devgagan.core.broadcast import broadcast_engine
+from devgagan.core.mongo.users_db import db as users_collection
 
-async def send_msg(user_id, message):
+async def send_msg(client, user_id, from_chat_id, message_id):
+    """
+    Copy a message to a user and pin it
+    Returns: (success: bool, error_type: str, error_msg: str)
+    FloodWait is re-raised so the broadcast engine can pause and retry.
+    """
     try:
-        x = await message.copy(chat_id=user_id)
+        x = await client.copy_message(chat_id=int(user_id), from_chat_id=from_chat_id, message_id=message_id)
         try:
             await x.pin()
         except Exception:
-            await x.pin(both_sides=True)
-    except FloodWait as e:
-        await asyncio.sleep(e.x)
-        return send_msg(user_id, message)
+            try:
+                await x.pin(both_sides=True)
+            except Exception:
+                pass
+        return True, None, None
+    except FloodWait:
+        raise
+    except UserIsBot:
+        return False, "bot", f"User {user_id} is a bot - cannot send to bots"
     except InputUserDeactivated:
-        return 400, f"{user_id} : deactivated\n"
+        return False, "deactivated", f"{user_id} : deactivated"
     except UserIsBlocked:
-        return 400, f"{user_id} : blocked the bot\n"
+        return False, "blocked", f"{user_id} : blocked the bot"
     except PeerIdInvalid:
-        return 400, f"{user_id} : user id invalid\n"
+        return False, "invalid_peer", f"{user_id} : user id invalid"
     except Exception:
-        return 500, f"{user_id} : {traceback.format_exc()}\n"
+        return False, "unknown", f"{user_id} : {traceback.format_exc()}"
+
+
+def _progress_bar(processed, total):
+    progress_percentage = (processed / total * 100) if total > 0 else 100.0
+    filled = min(10, int(progress_percentage // 10))
+    return progress_percentage, "█" * filled + "░" * (10 - filled)
+
+
+def _rate_label(stats, total_users):
+    success_rate = (stats['success'] / total_users * 100) if total_users > 0 else 0
+    
+    # Create success rate emoji and color
+    if success_rate >= 90:
+        return success_rate, "🟢", "Excellent"
+    elif success_rate >= 70:
+        return success_rate, "🟡", "Good"
+    elif success_rate >= 50:
+        return success_rate, "🟠", "Average"
+    return success_rate, "🔴", "Needs Attention"
+
+
+def _render_gcast_progress(stats, processed, total_users):
+    progress_percentage, progress_bar = _progress_bar(processed, total_users)
+    return (
+        f"🌐 <b>Global Broadcasting in Progress...</b>\n\n"
+        f"📊 <b>Live Statistics:</b>\n"
+        f"🎯 <b>Progress:</b> <code>{processed:,}/{total_users:,}</code> "
+        f"(<code>{progress_percentage:.1f}%</code>)\n"
+        f"📈 <b>Progress Bar:</b> <code>[{progress_bar}]</code>\n\n"
+        f"✅ <b>Successfully Copied:</b> <code>{stats['success']:,}</code>\n"
+        f"❌ <b>Failed:</b> <code>{stats['failed']:,}</code>\n"
+        f"🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n\n"
+        f"⚡ <i>High-speed copy & pin processing...</i>"
+    )
+
+
+def _render_gcast_final(stats, processed, total_users):
+    success_rate, rate_emoji, rate_status = _rate_label(stats, total_users)
+    
+    # Create visual progress bar for final stats
+    final_progress_bar = "█" * 10
+    
+    return (
+        f"🎉 <b>Global Broadcast Completed!</b> ✨\n\n"
+        f"┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓\n"
+        f"┃  🌐 <b>GLOBAL BROADCAST REPORT</b>    ┃\n"
+        f"┗━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┛\n\n"
+        f"📈 <b>Performance Overview:</b>\n"
+        f"👥 <b>Total Recipients:</b> <code>{total_users:,}</code>\n"
+        f"✅ <b>Successfully Copied:</b> <code>{stats['success']:,}</code>\n"
+        f"❌ <b>Copy Failed:</b> <code>{stats['failed']:,}</code>\n"
+        f"{rate_emoji} <b>Success Rate:</b> <code>{success_rate:.1f}%</code> <i>({rate_status})</i>\n\n"
+        f"📊 <b>Progress Visualization:</b>\n"
+        f"<code>[{final_progress_bar}] 100% Complete</code>\n\n"
+        f"🔍 <b>Detailed Error Analysis:</b>\n"
+        f"├ 🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n"
+        f"├ 💀 <b>Deactivated Accounts:</b> <code>{stats['deactivated']:,}</code>\n"
+        f"├ 🔗 <b>Invalid User IDs:</b> <code>{stats['invalid_peers']:,}</code>\n"
+        f"├ ⏳ <b>Rate Limit Delays:</b> <code>{stats['flood_waits']:,}</code>\n"
+        f"└ ❓ <b>Unknown Errors:</b> <code>{stats['other_errors'] + stats['bots']:,}</code>\n\n"
+        f"💡 <b>System Status:</b> <i>All copy operations completed successfully</i>\n"
+        f"📌 <b>Pin Status:</b> <i>Messages pinned where possible</i>"
+    )
+
+
+def _render_acast_progress(stats, processed, total_users):
+    progress_percentage, progress_bar = _progress_bar(processed, total_users)
+    return (
+        f"📡 <b>Broadcasting in Progress...</b>\n\n"
+        f"📊 <b>Live Statistics:</b>\n"
+        f"🎯 <b>Progress:</b> <code>{processed:,}/{total_users:,}</code> "
+        f"(<code>{progress_percentage:.1f}%</code>)\n"
+        f"📈 <b>Progress Bar:</b> <code>[{progress_bar}]</code>\n\n"
+        f"✅ <b>Delivered:</b> <code>{stats['success']:,}</code>\n"
+        f"❌ <b>Failed:</b> <code>{stats['failed']:,}</code>\n"
+        f"🤖 <b>Bots Detected:</b> <code>{stats['bots']:,}</code>\n\n"
+        f"⚡ <i>High-speed processing active...</i>"
+    )
+
+
+def _render_acast_final(stats, processed, total_users):
+    success_rate, rate_emoji, rate_status = _rate_label(stats, total_users)
+    
+    # Create visual progress bar for final stats
+    final_progress_bar = "█" * 10
+    
+    return (
+        f"🎉 <b>Announcement Broadcast Completed!</b> ✨\n\n"
+        f"┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓\n"
+        f"┃  📊 <b>BROADCAST ANALYTICS REPORT</b>  ┃\n"
+        f"┗━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┛\n\n"
+        f"📈 <b>Performance Overview:</b>\n"
+        f"👥 <b>Total Recipients:</b> <code>{total_users:,}</code>\n"
+        f"✅ <b>Successfully Delivered:</b> <code>{stats['success']:,}</code>\n"
+        f"❌ <b>Delivery Failed:</b> <code>{stats['failed']:,}</code>\n"
+        f"{rate_emoji} <b>Success Rate:</b> <code>{success_rate:.1f}%</code> <i>({rate_status})</i>\n\n"
+        f"📊 <b>Progress Visualization:</b>\n"
+        f"<code>[{final_progress_bar}] 100% Complete</code>\n\n"
+        f"🔍 <b>Detailed Error Analysis:</b>\n"
+        f"├ 🤖 <b>Bot Accounts:</b> <code>{stats['bots']:,}</code>\n"
+        f"├ 🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n"
+        f"├ 💀 <b>Deactivated Accounts:</b> <code>{stats['deactivated']:,}</code>\n"
+        f"├ 🔗 <b>Invalid User IDs:</b> <code>{stats['invalid_peers']:,}</code>\n"
+        f"├ ⏳ <b>Rate Limit Delays:</b> <code>{stats['flood_waits']:,}</code>\n"
+        f"└ ❓ <b>Unknown Errors:</b> <code>{stats['other_errors']:,}</code>\n\n"
+        f"💡 <b>System Status:</b> <i>All operations completed successfully</i>\n"
+        f"🕐 <b>Broadcast Duration:</b> <i>Processing completed</i>"
+    )
+
+
+def _render_critical_error(title, e):
+    return (
+        f"🚨 <b>{title}</b>\n\n"
+        f"❌ <b>Error Details:</b>\n"
+        f"<code>{str(e)[:200]}...</code>\n\n"
+        f"🔧 <b>Recommended Actions:</b>\n"
+        f"• Check user database integrity\n"
+        f"• Verify bot permissions\n"
+        f"• Try again in a few minutes\n"
+        f"• Contact system administrator if issue persists\n\n"
+        f"📞 <b>Support:</b> <i>Bot is still operational for other functions</i>"
+    )
 
 
 @app.on_message(filters.command("gcast"))
@@ -50,9 +182,8 @@ async def broadcast(client, message):
         )
     
     try:
-        # Get user list
-        all_users = (await get_users()) or []
-        if not all_users:
+        total_users = await users_collection.count_documents({"user": {"$gt": 0}})
+        if not total_users:
             return await message.reply_text(
                 "📭 <b>Empty User Database</b>\n\n"
                 "❌ <b>Error:</b> No users found in the database\n"
@@ -60,10 +191,6 @@ async def broadcast(client, message):
                 parse_mode=ParseMode.HTML
             )
         
-        total_users = len(all_users)
-        
-        print(f"📢 Starting global broadcast to {total_users} users")
-        
         # Initialize progress message
         progress_msg = await message.reply_text(
             f"🌐 <b>Global Broadcast System</b>\n\n"
@@ -75,147 +202,20 @@ async def broadcast(client, message):
             parse_mode=ParseMode.HTML
         )
         
-        # Statistics tracking
-        stats = {
-            'success': 0,
-            'failed': 0,
-            'deactivated': 0,
-            'blocked': 0,
-            'invalid_peers': 0,
-            'flood_waits': 0,
-            'other_errors': 0
-        }
-        
-        # Process users in batches
-        batch_size = 50
-        processed = 0
-        
-        delay_s = float(os.getenv("GCAST_DELAY_SECONDS", "0.4"))
-        for i in range(0, total_users, batch_size):
-            batch = all_users[i:i + batch_size]
-            
-            for user_id in batch:
-                try:
-                    # Validate user ID
-                    if not user_id or not str(user_id).isdigit():
-                        stats['invalid_peers'] += 1
-                        stats['failed'] += 1
-                        continue
-                    
-                    result = await send_msg(user_id, message.reply_to_message)
-                    
-                    if result is None:
-                        stats['success'] += 1
-                    else:
-                        stats['failed'] += 1
-                        error_code, error_msg = result
-                        
-                        # Categorize errors
-                        if "deactivated" in error_msg.lower():
-                            stats['deactivated'] += 1
-                        elif "blocked" in error_msg.lower():
-                            stats['blocked'] += 1
-                        elif "invalid" in error_msg.lower():
-                            stats['invalid_peers'] += 1
-                        elif "flood" in error_msg.lower():
-                            stats['flood_waits'] += 1
-                        else:
-                            stats['other_errors'] += 1
-                    
-                    processed += 1
-                    
-                    # Update progress every 10 users
-                    if processed % 10 == 0:
-                        try:
-                            progress_percentage = processed/total_users*100
-                            progress_bar = "█" * int(progress_percentage // 10) + "░" * (10 - int(progress_percentage // 10))
-                            
-                            await progress_msg.edit_text(
-                                f"🌐 <b>Global Broadcasting in Progress...</b>\n\n"
-                                f"📊 <b>Live Statistics:</b>\n"
-                                f"🎯 <b>Progress:</b> <code>{processed:,}/{total_users:,}</code> "
-                                f"(<code>{progress_percentage:.1f}%</code>)\n"
-                                f"📈 <b>Progress Bar:</b> <code>[{progress_bar}]</code>\n\n"
-                                f"✅ <b>Successfully Copied:</b> <code>{stats['success']:,}</code>\n"
-                                f"❌ <b>Failed:</b> <code>{stats['failed']:,}</code>\n"
-                                f"🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n\n"
-                                f"⚡ <i>High-speed copy & pin processing...</i>",
-                                parse_mode=ParseMode.HTML
-                            )
-                        except:
-                            pass  # Ignore edit errors
-                    
-                    # Small delay to prevent overwhelming
-                    await asyncio.sleep(delay_s)
-                    
-                except Exception as e:
-                    # Catch any unexpected errors to prevent crash
-                    stats['failed'] += 1
-                    stats['other_errors'] += 1
-                    print(f"🚨 Unexpected error processing user {user_id}: {str(e)[:100]}")
-                    continue
-        
-        # Final results
-        success_rate = (stats['success'] / total_users * 100) if total_users > 0 else 0
-        
-        # Create success rate emoji and color
-        if success_rate >= 90:
-            rate_emoji = "🟢"
-            rate_status = "Excellent"
-        elif success_rate >= 70:
-            rate_emoji = "🟡"
-            rate_status = "Good"
-        elif success_rate >= 50:
-            rate_emoji = "🟠"
-            rate_status = "Average"
-        else:
-            rate_emoji = "🔴"
-            rate_status = "Needs Attention"
-        
-        # Create visual progress bar for final stats
-        final_progress_bar = "█" * 10
-        
-        final_message = (
-            f"🎉 <b>Global Broadcast Completed!</b> ✨\n\n"
-            f"┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓\n"
-            f"┃  🌐 <b>GLOBAL BROADCAST REPORT</b>    ┃\n"
-            f"┗━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┛\n\n"
-            f"📈 <b>Performance Overview:</b>\n"
-            f"👥 <b>Total Recipients:</b> <code>{total_users:,}</code>\n"
-            f"✅ <b>Successfully Copied:</b> <code>{stats['success']:,}</code>\n"
-            f"❌ <b>Copy Failed:</b> <code>{stats['failed']:,}</code>\n"
-            f"{rate_emoji} <b>Success Rate:</b> <code>{success_rate:.1f}%</code> <i>({rate_status})</i>\n\n"
-            f"📊 <b>Progress Visualization:</b>\n"
-            f"<code>[{final_progress_bar}] 100% Complete</code>\n\n"
-            f"🔍 <b>Detailed Error Analysis:</b>\n"
-            f"├ 🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n"
-            f"├ 💀 <b>Deactivated Accounts:</b> <code>{stats['deactivated']:,}</code>\n"
-            f"├ 🔗 <b>Invalid User IDs:</b> <code>{stats['invalid_peers']:,}</code>\n"
-            f"├ ⏳ <b>Rate Limit Delays:</b> <code>{stats['flood_waits']:,}</code>\n"
-            f"└ ❓ <b>Unknown Errors:</b> <code>{stats['other_errors']:,}</code>\n\n"
-            f"💡 <b>System Status:</b> <i>All copy operations completed successfully</i>\n"
-            f"📌 <b>Pin Status:</b> <i>Messages pinned where possible</i>"
+        # Streams users, sends concurrently under a FloodWait-aware limiter and
+        # checkpoints to MongoDB; the final report is edited into progress_msg
+        await broadcast_engine.start(
+            client, "gcast",
+            from_chat_id=message.chat.id,
+            message_id=message.reply_to_message.id,
+            progress_chat_id=progress_msg.chat.id,
+            progress_msg_id=progress_msg.id,
         )
         
-        await progress_msg.edit_text(final_message, parse_mode=ParseMode.HTML)
-        print(f"📢 Global broadcast completed: {stats['success']}/{total_users} successful")
-        
     except Exception as e:
         # Ultimate fallback to prevent bot crash
-        error_msg = (
-            f"🚨 <b>Global Broadcast System Critical Error</b>\n\n"
-            f"❌ <b>Error Details:</b>\n"
-            f"<code>{str(e)[:200]}...</code>\n\n"
-            f"🔧 <b>Recommended Actions:</b>\n"
-            f"• Check user database integrity\n"
-            f"• Verify bot permissions\n"
-            f"• Try again in a few minutes\n"
-            f"• Contact system administrator if issue persists\n\n"
-            f"📞 <b>Support:</b> <i>Bot is still operational for other functions</i>"
-        )
-        
         try:
-            await message.reply_text(error_msg, parse_mode=ParseMode.HTML)
+            await message.reply_text(_render_critical_error("Global Broadcast System Critical Error", e), parse_mode=ParseMode.HTML)
         except:
             pass  # If even error message fails, just log
             
@@ -223,13 +223,11 @@ async def broadcast(client, message):
         print(f"🔍 Traceback: {traceback.format_exc()}")
 
 
-
-
-
 async def safe_forward_message(client, user_id, from_chat_id, message_id):
     """
     Safely forward a message with comprehensive error handling
     Returns: (success: bool, error_type: str, error_msg: str)
+    FloodWait is re-raised so the broadcast engine can pause and retry.
     """
     try:
         await client.forward_messages(
@@ -259,8 +257,8 @@ async def safe_forward_message(client, user_id, from_chat_id, message_id):
         return False, "admin_required", f"Admin required for user {user_id}"
     except MessageIdInvalid:
         return False, "invalid_message", f"Message ID invalid for user {user_id}"
-    except FloodWait as e:
-        return False, "flood_wait", f"FloodWait: {e.x} seconds"
+    except FloodWait:
+        raise
     except Exception as e:
         return False, "unknown", f"Unknown error for user {user_id}: {str(e)[:100]}"
 
@@ -283,9 +281,8 @@ async def announced(client, message):
         )
     
     try:
-        # Get user list
-        users = await get_users() or []
-        if not users:
+        total_users = await users_collection.count_documents({"user": {"$gt": 0}})
+        if not total_users:
             return await message.reply_text(
                 "📭 <b>Empty User Database</b>\n\n"
                 "❌ <b>Error:</b> No users found in the database\n"
@@ -293,11 +290,6 @@ async def announced(client, message):
                 parse_mode=ParseMode.HTML
             )
         
-        to_send = message.reply_to_message.id
-        total_users = len(users)
-        
-        print(f"📢 Starting broadcast to {total_users} users")
-        
         # Initialize progress message
         progress_msg = await message.reply_text(
             f"🚀 <b>Announcement Broadcast System</b>\n\n"
@@ -309,169 +301,18 @@ async def announced(client, message):
             parse_mode=ParseMode.HTML
         )
         
-        # Statistics tracking
-        stats = {
-            'success': 0,
-            'failed': 0,
-            'bots': 0,
-            'invalid_peers': 0,
-            'blocked': 0,
-            'deactivated': 0,
-            'flood_waits': 0,
-            'other_errors': 0
-        }
-        
-        # Process users in batches to avoid overwhelming
-        batch_size = 50
-        processed = 0
-        
-        delay_s = float(os.getenv("GCAST_DELAY_SECONDS", "0.4"))
-        for i in range(0, total_users, batch_size):
-            batch = users[i:i + batch_size]
-            
-            for user_id in batch:
-                try:
-                    # Validate user ID
-                    if not user_id or not str(user_id).isdigit():
-                        stats['invalid_peers'] += 1
-                        continue
-                    
-                    success, error_type, error_msg = await safe_forward_message(
-                        client, user_id, message.chat.id, to_send
-                    )
-                    
-                    if success:
-                        stats['success'] += 1
-                    else:
-                        stats['failed'] += 1
-                        
-                        # Categorize errors for statistics
-                        if error_type == "bot":
-                            stats['bots'] += 1
-                        elif error_type == "invalid_peer":
-                            stats['invalid_peers'] += 1
-                        elif error_type == "blocked":
-                            stats['blocked'] += 1
-                        elif error_type in ["deactivated"]:
-                            stats['deactivated'] += 1
-                        elif error_type == "flood_wait":
-                            stats['flood_waits'] += 1
-                            # Extract wait time and sleep
-                            try:
-                                wait_time = int(error_msg.split(": ")[1].split(" ")[0])
-                                print(f"⏳ FloodWait: sleeping for {wait_time} seconds")
-                                await asyncio.sleep(wait_time)
-                                # Retry after flood wait
-                                retry_success, _, _ = await safe_forward_message(
-                                    client, user_id, message.chat.id, to_send
-                                )
-                                if retry_success:
-                                    stats['success'] += 1
-                                    stats['failed'] -= 1
-                            except:
-                                pass
-                        else:
-                            stats['other_errors'] += 1
-                        
-                        # Log specific errors (only print, don't crash)
-                        if error_type not in ["bot", "invalid_peer", "blocked", "deactivated"]:
-                            print(f"⚠️ Broadcast error: {error_msg}")
-                    
-                    processed += 1
-                    
-                    # Update progress every 10 users
-                    if processed % 10 == 0:
-                        try:
-                            progress_percentage = processed/total_users*100
-                            progress_bar = "█" * int(progress_percentage // 10) + "░" * (10 - int(progress_percentage // 10))
-                            
-                            await progress_msg.edit_text(
-                                f"📡 <b>Broadcasting in Progress...</b>\n\n"
-                                f"📊 <b>Live Statistics:</b>\n"
-                                f"🎯 <b>Progress:</b> <code>{processed:,}/{total_users:,}</code> "
-                                f"(<code>{progress_percentage:.1f}%</code>)\n"
-                                f"📈 <b>Progress Bar:</b> <code>[{progress_bar}]</code>\n\n"
-                                f"✅ <b>Delivered:</b> <code>{stats['success']:,}</code>\n"
-                                f"❌ <b>Failed:</b> <code>{stats['failed']:,}</code>\n"
-                                f"🤖 <b>Bots Detected:</b> <code>{stats['bots']:,}</code>\n\n"
-                                f"⚡ <i>High-speed processing active...</i>",
-                                parse_mode=ParseMode.HTML
-                            )
-                        except:
-                            pass  # Ignore edit errors
-                    
-                    # Small delay to prevent overwhelming
-                    await asyncio.sleep(delay_s)
-                    
-                except Exception as e:
-                    # Catch any unexpected errors to prevent crash
-                    stats['failed'] += 1
-                    stats['other_errors'] += 1
-                    print(f"🚨 Unexpected error processing user {user_id}: {str(e)[:100]}")
-                    continue
-        
-        # Final results
-        success_rate = (stats['success'] / total_users * 100) if total_users > 0 else 0
-        
-        # Create success rate emoji and color
-        if success_rate >= 90:
-            rate_emoji = "🟢"
-            rate_status = "Excellent"
-        elif success_rate >= 70:
-            rate_emoji = "🟡"
-            rate_status = "Good"
-        elif success_rate >= 50:
-            rate_emoji = "🟠"
-            rate_status = "Average"
-        else:
-            rate_emoji = "🔴"
-            rate_status = "Needs Attention"
-        
-        # Create visual progress bar for final stats
-        final_progress_bar = "█" * 10
-        
-        final_message = (
-            f"🎉 <b>Announcement Broadcast Completed!</b> ✨\n\n"
-            f"┏━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┓\n"
-            f"┃  📊 <b>BROADCAST ANALYTICS REPORT</b>  ┃\n"
-            f"┗━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━┛\n\n"
-            f"📈 <b>Performance Overview:</b>\n"
-            f"👥 <b>Total Recipients:</b> <code>{total_users:,}</code>\n"
-            f"✅ <b>Successfully Delivered:</b> <code>{stats['success']:,}</code>\n"
-            f"❌ <b>Delivery Failed:</b> <code>{stats['failed']:,}</code>\n"
-            f"{rate_emoji} <b>Success Rate:</b> <code>{success_rate:.1f}%</code> <i>({rate_status})</i>\n\n"
-            f"📊 <b>Progress Visualization:</b>\n"
-            f"<code>[{final_progress_bar}] 100% Complete</code>\n\n"
-            f"🔍 <b>Detailed Error Analysis:</b>\n"
-            f"├ 🤖 <b>Bot Accounts:</b> <code>{stats['bots']:,}</code>\n"
-            f"├ 🚫 <b>Blocked Users:</b> <code>{stats['blocked']:,}</code>\n"
-            f"├ 💀 <b>Deactivated Accounts:</b> <code>{stats['deactivated']:,}</code>\n"
-            f"├ 🔗 <b>Invalid User IDs:</b> <code>{stats['invalid_peers']:,}</code>\n"
-            f"├ ⏳ <b>Rate Limit Delays:</b> <code>{stats['flood_waits']:,}</code>\n"
-            f"└ ❓ <b>Unknown Errors:</b> <code>{stats['other_errors']:,}</code>\n\n"
-            f"💡 <b>System Status:</b> <i>All operations completed successfully</i>\n"
-            f"🕐 <b>Broadcast Duration:</b> <i>Processing completed</i>"
+        await broadcast_engine.start(
+            client, "acast",
+            from_chat_id=message.chat.id,
+            message_id=message.reply_to_message.id,
+            progress_chat_id=progress_msg.chat.id,
+            progress_msg_id=progress_msg.id,
         )
         
-        await progress_msg.edit_text(final_message, parse_mode=ParseMode.HTML)
-        print(f"📢 Broadcast completed: {stats['success']}/{total_users} successful")
-        
     except Exception as e:
         # Ultimate fallback to prevent bot crash
-        error_msg = (
-            f"🚨 <b>Broadcast System Critical Error</b>\n\n"
-            f"❌ <b>Error Details:</b>\n"
-            f"<code>{str(e)[:200]}...</code>\n\n"
-            f"🔧 <b>Recommended Actions:</b>\n"
-            f"• Check user database integrity\n"
-            f"• Verify bot permissions\n"
-            f"• Try again in a few minutes\n"
-            f"• Contact system administrator if issue persists\n\n"
-            f"📞 <b>Support:</b> <i>Bot is still operational for other functions</i>"
-        )
-        
         try:
-            await message.reply_text(error_msg, parse_mode=ParseMode.HTML)
+            await message.reply_text(_render_critical_error("Broadcast System Critical Error", e), parse_mode=ParseMode.HTML)
         except:
             pass  # If even error message fails, just log
             
@@ -479,5 +320,12 @@ async def announced(client, message):
         print(f"🔍 Traceback: {traceback.format_exc()}")
 
 
+broadcast_engine.register_kind("gcast", send_msg, _render_gcast_progress, _render_gcast_final)
+broadcast_engine.register_kind("acast", safe_forward_message, _render_acast_progress, _render_acast_final)
 
-
+# Resume broadcasts interrupted by a restart
+try:
+    asyncio.create_task(broadcast_engine.resume_pending(app))
+except Exception:
+    # If event loop is not running, pending broadcasts resume on next boot
+    pass
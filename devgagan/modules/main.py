@@ -1,3 +1,4 @@
+import os
 import time
 import random
 import string
@@ -24,91 +25,20 @@ from pyrogram.errors import FloodWait
 from devgagan.core.func import subscribe, chk_user, get_link
 from devgagan.core.mongo import db
 from devgagan.modules.shrink import *
-from devgagan.core.cancel import cancel_manager
+from devgagan.core.cancel import cancel_manager, OperationCancelled
 from devgagan.core.get_func import get_msg
 from devgagan.core.simple_flood_wait import flood_manager
 from devgagan.core.auto_flood_detection import auto_flood_detector
+from devgagan.core.broadcast import RateLimiter
+from devgagan.core.topic_index import topic_index
+from devgagan.core.request_queue import request_dispatcher
+from devgagan.core.message_cache import message_cache
 
-# Global userbot request queue for flood protection
-userbot_queue = asyncio.Queue()
-userbot_processing = False
+# Bulk copy for public batches: ids per metadata fetch / per forward call, and API calls per second
+BULK_COPY_WINDOW = int(os.getenv("BULK_COPY_WINDOW", "200"))
+BULK_COPY_CHUNK = min(100, int(os.getenv("BULK_COPY_CHUNK", "100")))
+BULK_COPY_RATE_PER_SEC = float(os.getenv("BULK_COPY_RATE_PER_SEC", "1"))
 
-# Queued userbot message fetching to prevent concurrent flood waits
-async def get_messages_queued(userbot, channel_ref, msg_ids, batch_num):
-    """Queue userbot requests to prevent concurrent API calls and flood waits"""
-    global userbot_processing
-    
-    # Add request to queue
-    request_data = {
-        'userbot': userbot,
-        'channel_ref': channel_ref, 
-        'msg_ids': msg_ids,
-        'batch_num': batch_num,
-        'result': None,
-        'error': None,
-        'done': asyncio.Event()
-    }
-    
-    await userbot_queue.put(request_data)
-    
-    # Start processing if not already running
-    if not userbot_processing:
-        asyncio.create_task(process_userbot_queue())
-    
-    # Wait for our request to be processed
-    await request_data['done'].wait()
-    
-    if request_data['error']:
-        raise request_data['error']
-    
-    return request_data['result']
-
-# Process userbot queue with proper rate limiting
-async def process_userbot_queue():
-    """Process userbot requests one at a time with rate limiting"""
-    global userbot_processing
-    userbot_processing = True
-    
-    try:
-        while not userbot_queue.empty():
-            request = await userbot_queue.get()
-            
-            try:
-                # Add delay between requests for rate limiting
-                await asyncio.sleep(0.3)  # 300ms between userbot calls (optimized for 100 users)
-                
-                # Make the actual API call
-                result = await request['userbot'].get_messages(
-                    request['channel_ref'], 
-                    request['msg_ids']
-                )
-                request['result'] = result
-                
-                # Log progress every 5 batches
-                if request['batch_num'] % 5 == 0:
-                    print(f"🔄 USERBOT QUEUE: Processed batch {request['batch_num']} (queue size: {userbot_queue.qsize()})")
-                
-            except FloodWait as fw:
-                print(f"🛡️ USERBOT QUEUE: Flood wait {fw.value}s detected, pausing queue...")
-                await asyncio.sleep(fw.value + 1)
-                # Retry the request after flood wait
-                try:
-                    result = await request['userbot'].get_messages(
-                        request['channel_ref'], 
-                        request['msg_ids']
-                    )
-                    request['result'] = result
-                except Exception as retry_err:
-                    request['error'] = retry_err
-            except Exception as e:
-                request['error'] = e
-            
-            # Mark request as done
-            request['done'].set()
-            userbot_queue.task_done()
-            
-    finally:
-        userbot_processing = False
 from devgagan.core.task_registry import registry
 from devgagan.core.cleanup import cleanup_manager
 
@@ -229,7 +159,9 @@ async def process_and_upload_link(userbot, user_id, msg_id, link, retry_count, m
             return True, error_msg, file_info, processing_time_str
         
         # Categorize errors for better user feedback
-        if "No media found" in error_msg:
+        if isinstance(e, OperationCancelled):
+            error_type = "canceled"
+        elif "No media found" in error_msg:
             error_type = "no_media"
         elif "Message not found" in error_msg or "message you specified doesn't exist" in error_msg:
             error_type = "not_found"
@@ -388,8 +320,11 @@ async def single_link(_, message):
         await message.reply(flood_message)
         return
 
+    # Resolve the tier once for this request
+    freecheck = await chk_user(message, user_id)
+
     # Anti-spam: allow more for paid/verified/owner
-    is_prem = (await chk_user(message, user_id) == 0) or (user_id in OWNER_ID) or (await is_user_verified(user_id))
+    is_prem = (freecheck == 0) or (user_id in OWNER_ID) or (await is_user_verified(user_id))
     ok, wait = _rate_limit_allow(user_id, is_prem)
     if not ok:
         await message.reply(
@@ -442,12 +377,12 @@ async def single_link(_, message):
             return
 
     # Check freemium limits
-    if await chk_user(message, user_id) == 1 and FREEMIUM_LIMIT == 0 and user_id not in OWNER_ID and not await is_user_verified(user_id):
+    if freecheck == 1 and FREEMIUM_LIMIT == 0 and user_id not in OWNER_ID and not await is_user_verified(user_id):
         await message.reply("Freemium service is currently not available. Use /upgrade to get access immediately.")
         return
 
     # Check cooldown
-    can_proceed, response_message = await check_interval(user_id, await chk_user(message, user_id))
+    can_proceed, response_message = await check_interval(user_id, freecheck)
     if not can_proceed:
         await message.reply(response_message)
         return
@@ -481,7 +416,7 @@ async def single_link(_, message):
         if link and await try_forward_first(link, user_id):
             # Successful forward; set interval ONLY for free users and exit without download/upload
             try:
-                if (await chk_user(message, user_id)) == 1 and not await is_user_verified(user_id):
+                if freecheck == 1 and not await is_user_verified(user_id):
                     await set_interval(user_id, seconds=FREE_SINGLE_WAIT_SECONDS)
             except Exception:
                 pass
@@ -525,7 +460,7 @@ async def single_link(_, message):
                 success_download = False
             # Apply cooldown ONLY for free users after a successful single download
             try:
-                if (await chk_user(message, user_id)) == 1 and not await is_user_verified(user_id):
+                if freecheck == 1 and not await is_user_verified(user_id):
                     await set_interval(user_id, seconds=FREE_SINGLE_WAIT_SECONDS)
             except Exception:
                 pass
@@ -544,10 +479,10 @@ async def single_link(_, message):
             
     except FloodWait as fw:
         # Auto flood detection for user session
-        await auto_flood_detector.detect_user_flood_wait(user_id, fw.x, "single download")
+        await auto_flood_detector.detect_user_flood_wait(user_id, fw.value, "single download")
         
         await msg.edit_text(
-            f'Try again after {fw.x} seconds due to floodwait from Telegram.\n\nTip: Premium users get priority handling — use /upgrade.'
+            f'Try again after {fw.value} seconds due to floodwait from Telegram.\n\nTip: Premium users get priority handling — use /upgrade.'
         )
     except Exception as e:
         error_msg = str(e)
@@ -819,24 +754,24 @@ async def try_forward_first(link: str, user_id: int):
             return False
         # Check if source chat allows forwarding (protected content)
         try:
-            src_chat = await app.get_chat(chat_ref)
+            src_chat = await message_cache.get_chat_facts(app, chat_ref)
             # Disable forwarding for group/supergroup entirely; use user session download instead
             try:
-                if getattr(src_chat, "type", None) in (ChatType.SUPERGROUP, ChatType.GROUP):
+                if src_chat.chat_type in (ChatType.SUPERGROUP, ChatType.GROUP):
                     if DEBUG_FORWARD:
                         print(f"[FORWARD-DEBUG] Source is a group/supergroup: {chat_ref}; skipping forward/copy")
                     return False
             except Exception:
                 # If type is unavailable, fall through to protected content checks
                 pass
-            if getattr(src_chat, "has_protected_content", False):
+            if src_chat.protected:
                 if DEBUG_FORWARD:
                     print(f"[FORWARD-DEBUG] Source chat has protected content: {chat_ref}")
                 return False
             # Only allow copy for channels (broadcast), never for groups/supergroups
-            if getattr(src_chat, "type", None) != ChatType.CHANNEL:
+            if src_chat.chat_type != ChatType.CHANNEL:
                 if DEBUG_FORWARD:
-                    print(f"[FORWARD-DEBUG] Non-channel source ({getattr(src_chat, 'type', None)}); skipping forward/copy")
+                    print(f"[FORWARD-DEBUG] Non-channel source ({src_chat.chat_type}); skipping forward/copy")
                 return False
         except Exception:
             # If we cannot fetch chat info, do not risk forwarding; fall back to download path
@@ -859,6 +794,89 @@ async def try_forward_first(link: str, user_id: int):
             print(f"[FORWARD-DEBUG] Unexpected error in try_forward_first for link: {link}")
         return False
 
+async def bulk_copy_public_range(chat_ref, start_id: int, want: int, user_id: int, last_id=None,
+                                 is_active=None, on_progress=None):
+    """Copy up to `want` messages from a public, non-protected channel starting at start_id.
+
+    The channel is resolved once, ids are prefiltered from message metadata (deleted and
+    service messages dropped) and delivered with one forward_messages(drop_author=True)
+    call per 100 ids under a shared rate limiter. Returns (handled_ids, copied): handled
+    ids are skipped by the per-message loop, ids from failed chunks are left to it.
+    """
+    handled = set()
+    copied = 0
+    try:
+        src_chat = await message_cache.get_chat_facts(app, chat_ref)
+    except Exception:
+        return handled, copied
+    # Same rules as try_forward_first: broadcast channels without protected content only
+    if src_chat.chat_type != ChatType.CHANNEL or src_chat.protected:
+        return handled, copied
+    from_chat = src_chat.chat_id
+    limiter = RateLimiter(BULK_COPY_RATE_PER_SEC)
+    next_id = start_id
+    empty_windows = 0
+
+    async def _call(fn, *args, **kwargs):
+        for _ in range(3):
+            await limiter.acquire()
+            try:
+                return await fn(*args, **kwargs)
+            except FloodWait as fw:
+                wait = int(getattr(fw, "value", 0) or 0) + 1
+                print(f"[BULK-COPY] FloodWait {wait}s, pausing")
+                limiter.pause(wait)
+        raise Exception("FloodWait retries exhausted")
+
+    while copied < want:
+        if is_active is not None and not await is_active():
+            break
+        window = list(range(next_id, next_id + BULK_COPY_WINDOW))
+        if last_id is not None:
+            window = [x for x in window if x <= last_id]
+        if not window:
+            break
+        next_id = window[-1] + 1
+        try:
+            # Metadata goes through the client's own request queue (paced by its FloodWait feedback)
+            msgs = await request_dispatcher.get_messages(app, from_chat, window, label=f"bulk copy {window[0]}")
+        except Exception as e:
+            print(f"[BULK-COPY] Metadata fetch failed at {window[0]}: {e}")
+            break
+        if not isinstance(msgs, list):
+            msgs = [msgs]
+        for m in msgs:
+            message_cache.put_message(from_chat, m)
+        valid = [m.id for m in msgs if m and not getattr(m, "empty", False) and not getattr(m, "service", None)]
+        if not valid:
+            handled.update(window)
+            empty_windows += 1
+            # Without a known end, a few empty windows mean we ran past the last post
+            if last_id is None and empty_windows >= 3:
+                break
+            continue
+        empty_windows = 0
+        take = valid[:want - copied]
+        covered_upto = window[-1] if len(take) == len(valid) else take[-1]
+        failed = set()
+        for k in range(0, len(take), BULK_COPY_CHUNK):
+            chunk = take[k:k + BULK_COPY_CHUNK]
+            try:
+                res = await _call(app.forward_messages, chat_id=user_id, from_chat_id=from_chat,
+                                  message_ids=chunk, drop_author=True)
+            except Exception as e:
+                print(f"[BULK-COPY] Chunk {chunk[0]}-{chunk[-1]} failed, leaving it to the per-message path: {e}")
+                failed.update(chunk)
+                continue
+            copied += len(res) if isinstance(res, list) else 1
+            if on_progress is not None:
+                try:
+                    await on_progress(copied)
+                except Exception:
+                    pass
+        handled.update(x for x in window if x <= covered_upto and x not in failed)
+    return handled, copied
+
 @app.on_message(filters.command("batch") & filters.private)
 async def batch_link(_, message):
     join = await subscribe(_, message)
@@ -1055,6 +1073,9 @@ async def batch_link(_, message):
     channel_ref = None
     last_message_id_cap = None
     last_downloadable_id_cap = None  # Smart cap: last message that actually has downloadable media
+    # Topic ids from the TopicIndex (per batch, never shared between users)
+    current_topic_history = []
+    topic_index_complete = False
     try:
         # Derive channel reference from the start link
         # For /c/<internalId>/, convert to -100<internalId>
@@ -1075,8 +1096,8 @@ async def batch_link(_, message):
                     needs_user_session = True
                 elif channel_ref is not None:
                     # Try resolve chat type using bot; for public usernames this works
-                    chat_info = await app.get_chat(channel_ref)
-                    if getattr(chat_info, 'type', None) in (ChatType.SUPERGROUP, ChatType.GROUP):
+                    chat_info = await message_cache.get_chat_facts(app, channel_ref)
+                    if chat_info.chat_type in (ChatType.SUPERGROUP, ChatType.GROUP):
                         needs_user_session = True
                 if needs_user_session:
                     kb = InlineKeyboardMarkup([
@@ -1162,8 +1183,8 @@ async def batch_link(_, message):
             try:
                 # Prefer userbot to fetch chat info; fallback to bot
                 info_client = userbot if userbot else app
-                chat_info = await info_client.get_chat(channel_ref)
-                chat_type = getattr(chat_info, 'type', None)
+                chat_info = await message_cache.get_chat_facts(info_client, channel_ref)
+                chat_type = chat_info.chat_type
                 if chat_type in (ChatType.SUPERGROUP, ChatType.GROUP):
                     probe_client = userbot if userbot else app
                 elif chat_type == ChatType.CHANNEL:
@@ -1188,108 +1209,21 @@ async def batch_link(_, message):
                             try:
                                 print(f"🔍 TOPIC GROUP: Scanning for messages in topic {topic_id}...")
                                 
-                                # Method 1: Try to get messages by scanning a range around the start message
-                                topic_history = []
-                                # Make topic_history available globally for batch processing
-                                globals()['current_topic_history'] = topic_history
-                                
-                                # Smart dynamic scanning based on batch size and user expectations
+                                # Thread-aware index: page the topic's own history (getReplies) instead of
+                                # scanning raw id ranges and checking reply/thread ids on every message
                                 start_msg_id = int(topic_match.group(3))
-                                
-                                # OPTIMIZED scanning - reduced API calls for better scaling
-                                if cl <= 10:  # Small batch (1-10)
-                                    scan_behind = 5   # Reduced from 10
-                                    scan_ahead = 25   # Reduced from 50
-                                elif cl <= 50:  # Medium batch (11-50)
-                                    scan_behind = 10  # Reduced from 20
-                                    scan_ahead = 75   # Reduced from 100
-                                elif cl <= 200:  # Large batch (51-200)
-                                    scan_behind = 20  # Reduced from 30
-                                    scan_ahead = 150  # Reduced from 200
-                                else:  # Huge batch (201+)
-                                    scan_behind = 30  # Reduced from 50
-                                    scan_ahead = 200  # Reduced from 300
-                                
-                                start_scan = max(1, start_msg_id - scan_behind)
-                                end_scan = start_msg_id + scan_ahead
-                                
-                                print(f"🔍 TOPIC GROUP: ULTRA FAST scanning for batch size {cl}")
-                                print(f"🔍 TOPIC GROUP: Scanning range {start_scan} to {end_scan} ({end_scan - start_scan + 1} messages)")
-                                
-                                # ULTRA AGGRESSIVE early detection - stop immediately when enough found
-                                early_stop_threshold = min(cl, 30)  # Stop at exactly what we need or 30 max
-                                print(f"🏁 TOPIC GROUP: Will stop at {early_stop_threshold} messages (ULTRA FAST)")
-                                
-                                # Get messages in batches to find topic messages (with queue-based flood protection)
-                                messages_found_count = 0
-                                batch_count = 0
-                                
-                                # Queue all batch requests to prevent concurrent userbot usage
-                                batch_requests = []
-                                for batch_start in range(start_scan, end_scan, 30):
-                                    batch_end = min(batch_start + 29, end_scan)
-                                    msg_ids = list(range(batch_start, batch_end + 1))
-                                    batch_requests.append((batch_start, batch_end, msg_ids))
-                                
-                                print(f"📋 USERBOT QUEUE: Queuing {len(batch_requests)} batch requests for topic detection")
-                                
-                                for batch_start, batch_end, msg_ids in batch_requests:
-                                    try:
-                                        batch_count += 1
-                                        
-                                        # Queue-based userbot access with automatic rate limiting
-                                        messages = await get_messages_queued(userbot, channel_ref, msg_ids, batch_count)
-                                        
-                                        if not isinstance(messages, list):
-                                            messages = [messages] if messages else []
-                                        
-                                        for msg in messages:
-                                            if msg and msg.id:
-                                                # Check if message belongs to this topic
-                                                belongs_to_topic = False
-                                                
-                                                # Check reply_to_message_id
-                                                if hasattr(msg, 'reply_to_message_id') and msg.reply_to_message_id == topic_id:
-                                                    belongs_to_topic = True
-                                                # Check message_thread_id
-                                                elif hasattr(msg, 'message_thread_id') and msg.message_thread_id == topic_id:
-                                                    belongs_to_topic = True
-                                                # Check if it's the topic creation message
-                                                elif msg.id == topic_id:
-                                                    belongs_to_topic = True
-                                                
-                                                if belongs_to_topic:
-                                                    topic_history.append(msg.id)
-                                                    messages_found_count += 1
-                                                    if messages_found_count <= 10 or messages_found_count % 20 == 0:
-                                                        print(f"📍 TOPIC GROUP: Found message {msg.id} in topic {topic_id} (total: {messages_found_count})")
-                                                    
-                                                    # Early stop if we found enough messages
-                                                    if messages_found_count >= early_stop_threshold:
-                                                        print(f"🏁 TOPIC GROUP: ULTRA FAST STOP! Found {messages_found_count} messages")
-                                                        break
-                                    
-                                    except Exception as batch_err:
-                                        # Handle flood wait specifically
-                                        if "flood" in str(batch_err).lower() or "wait" in str(batch_err).lower():
-                                            print(f"🛡️ FLOOD WAIT: Detected flood wait, pausing for 15 seconds...")
-                                            await asyncio.sleep(15)
-                                            # Try to continue after flood wait
-                                            continue
-                                        else:
-                                            print(f"⚠️ TOPIC GROUP: Batch scan error for {batch_start}-{batch_end}: {batch_err}")
-                                            continue
-                                    
-                                    # Break outer loop if early stop was triggered
-                                    if messages_found_count >= early_stop_threshold:
-                                        break
+                                topic_history, topic_index_complete = await topic_index.get_ids(
+                                    userbot, channel_ref, topic_id, start_msg_id, cl
+                                )
+                                topic_history = list(topic_history)
                                 
                                 if topic_history:
                                     # Sort to get the actual range of messages in this topic
                                     topic_history.sort()
                                     
                                     # For hybrid mode, extend the cap beyond what we found to allow more scanning
-                                    if len(topic_history) < cl:  # If we didn't find enough, allow more scanning
+                                    # (not needed when the index already paged to the end of the topic)
+                                    if len(topic_history) < cl and not topic_index_complete:
                                         # Extend BOTH caps to allow hybrid mode to continue scanning (more conservative)
                                         extension = min(200, max(50, cl))  # Much more conservative extension
                                         last_message_id_cap = max(topic_history) + extension
@@ -1302,7 +1236,7 @@ async def batch_link(_, message):
                                     print(f"✅ TOPIC GROUP: Found {len(topic_history)} messages, range: {min(topic_history)} to {max(topic_history)}")
                                     print(f"📋 TOPIC RANGE: Setting caps - message: {last_message_id_cap}, downloadable: {last_downloadable_id_cap}")
                                     # Store for batch processing
-                                    globals()['current_topic_history'] = topic_history
+                                    current_topic_history = topic_history
                                 else:
                                     print(f"⚠️ TOPIC GROUP: No messages found in topic {topic_id} via API scan")
                                     print(f"🔍 TOPIC GROUP: Trying alternative method - get_chat_history")
@@ -1326,7 +1260,7 @@ async def batch_link(_, message):
                                             last_downloadable_id_cap = last_message_id_cap
                                             print(f"✅ TOPIC HISTORY: Found {len(topic_history)} messages via history, last: {last_message_id_cap}")
                                             # Store for batch processing
-                                            globals()['current_topic_history'] = topic_history
+                                            current_topic_history = topic_history
                                         else:
                                             print(f"⚠️ TOPIC HISTORY: Still no messages found, using safe extended range")
                                             # Final fallback - ultra conservative range
@@ -1409,7 +1343,7 @@ async def batch_link(_, message):
                 try:
                     if mid is None or mid <= 0:
                         return False
-                    m = await client.get_messages(chat, mid)
+                    m = await request_dispatcher.get_messages(client, chat, mid)
                     if not m:
                         return False
                     # Check for downloadable media without downloading
@@ -1525,25 +1459,10 @@ async def batch_link(_, message):
             try:
                 if '/c/' not in start_id and userbot is not None:
                     topic_id = topic_info['topic_id']
-                    # Iterate recent history and pick the newest message that belongs to this topic
-                    newest_topic_msg_id = None
-                    fetched = 0
-                    last_offset = 0
-                    # Try up to 3 pages of 200 messages each (lightweight)
-                    for _ in range(3):
-                        async for msg in userbot.get_chat_history(topic_info['username'], offset_id=last_offset, limit=200):
-                            fetched += 1
-                            last_offset = msg.id
-                            if msg and msg.id:
-                                if (hasattr(msg, 'reply_to_message_id') and msg.reply_to_message_id == topic_id) or \
-                                   (hasattr(msg, 'message_thread_id') and msg.message_thread_id == topic_id) or \
-                                   msg.id == topic_id:
-                                    newest_topic_msg_id = msg.id
-                                    break
-                        if newest_topic_msg_id:
-                            break
+                    # One getReplies call returns the newest message in this topic
+                    newest_topic_msg_id = await topic_index.newest_id(userbot, topic_info['username'], topic_id)
                     if newest_topic_msg_id:
-                        print(f"🎯 PUBLIC TOPIC PEEK: Latest topic message detected: {newest_topic_msg_id} (fetched={fetched})")
+                        print(f"🎯 PUBLIC TOPIC PEEK: Latest topic message detected: {newest_topic_msg_id}")
                         topic_message_queue = [newest_topic_msg_id]
                         # Cap scanning strictly to this id
                         last_message_id_cap = newest_topic_msg_id
@@ -1555,8 +1474,8 @@ async def batch_link(_, message):
                 print(f"⚠️ PUBLIC TOPIC PEEK ERROR: {peek_err}")
             
             # If we have topic history from detection, use it for smart processing
-            if 'current_topic_history' in globals() and globals()['current_topic_history']:
-                topic_history = globals()['current_topic_history']
+            if current_topic_history:
+                topic_history = current_topic_history
                 # Filter messages >= start message and sort
                 topic_message_queue = [msg_id for msg_id in topic_history if msg_id >= topic_info['start_msg_id']]
                 topic_message_queue.sort()
@@ -1575,6 +1494,36 @@ async def batch_link(_, message):
             else:
                 print(f"⚠️ TOPIC FALLBACK: No topic history available, using sequential scan")
 
+    # Public, non-protected channel ranges: bulk copy in 100-id chunks instead of one copy + sleep per message
+    if (not is_topic_group_batch and isinstance(channel_ref, str) and await is_normal_tg_link(validated_link)):
+        async def _bulk_active():
+            try:
+                return users_loop.get(user_id, False) and not await cancel_manager.is_cancelled(user_id)
+            except Exception:
+                return users_loop.get(user_id, False)
+
+        async def _bulk_progress(done):
+            progress_html = (
+                f"📦 <b>Batch Processing</b>\n\n"
+                f"⏳ Progress: <b>{done}/{cl}</b>\n\n"
+                f"🚀 Sit back and relax while we handle everything!"
+            )
+            await pin_msg.edit_text(progress_html, reply_markup=cta_btn, disable_web_page_preview=True)
+
+        try:
+            bulk_started = time.time()
+            bulk_ids, bulk_copied = await bulk_copy_public_range(
+                channel_ref, cs, cl, user_id, last_id=last_message_id_cap,
+                is_active=_bulk_active, on_progress=_bulk_progress,
+            )
+            if bulk_copied or bulk_ids:
+                print(f"[BULK-COPY] Copied {bulk_copied}/{cl} messages in {time.time() - bulk_started:.1f}s for user {user_id}")
+            seen_ids.update(bulk_ids)
+            processed_count += bulk_copied
+            last_processed_for_scan = processed_count
+        except Exception as e:
+            print(f"[BULK-COPY] Falling back to per-message processing: {e}")
+
     try:
         # Smart batch processing with gap detection and long-jump handling
         i = cs
@@ -1653,7 +1602,7 @@ async def batch_link(_, message):
         # For topic groups, use smart message queue if available
         topic_queue_index = 0
         use_topic_queue = is_topic_group_batch and len(topic_message_queue) > 0
-        hybrid_mode = is_topic_group_batch and len(topic_message_queue) > 0 and len(topic_message_queue) < cl
+        hybrid_mode = is_topic_group_batch and len(topic_message_queue) > 0 and len(topic_message_queue) < cl and not topic_index_complete
         # If we're processing only the last topic message, disable hybrid to stop after that single message
         if process_only_last_topic_msg:
             hybrid_mode = False
@@ -2114,7 +2063,7 @@ async def batch_link(_, message):
 
         # Set cooldown ONLY for free users after batch, and complete batch
         try:
-            if (await chk_user(message, user_id)) == 1 and not await is_user_verified(user_id):
+            if freecheck == 1 and not await is_user_verified(user_id):
                 await set_interval(user_id, seconds=FREE_BATCH_WAIT_SECONDS)
         except Exception:
             pass
@@ -2276,7 +2225,7 @@ async def cleanup_command(_, message):
         
     try:
         # Get current stats before cleanup
-        stats_before = cleanup_manager.get_comprehensive_stats()
+        stats_before = await cleanup_manager.get_comprehensive_stats()
         
         # Run comprehensive cleanup
         await message.reply("🧹 Starting comprehensive cleanup...")
@@ -2288,7 +2237,7 @@ async def cleanup_command(_, message):
         memory_result = await cleanup_manager.memory_cleanup.cleanup_memory(force=True)
         
         # Get stats after cleanup
-        stats_after = cleanup_manager.get_comprehensive_stats()
+        stats_after = await cleanup_manager.get_comprehensive_stats()
         
         # Format results
         files_before = stats_before["file_stats"]["total_files"]
@@ -2330,7 +2279,7 @@ async def cleanup_stats_command(_, message):
         return
         
     try:
-        stats = cleanup_manager.get_comprehensive_stats()
+        stats = await cleanup_manager.get_comprehensive_stats()
         
         file_stats = stats["file_stats"]
         memory_stats = stats["memory_stats"]
@@ -2343,6 +2292,7 @@ async def cleanup_stats_command(_, message):
             f"• Total: {file_stats['total_files']} files ({file_stats['total_size_mb']:.1f} MB)\n"
             f"• Tracked temp files: {file_stats['tracked_temp_files']}\n"
             f"• Active downloads: {file_stats['active_downloads']}\n"
+            f"• Disk budget: {file_stats.get('disk_budget_reservations', 0)} reservations ({file_stats.get('disk_budget_reserved_mb', 0):.1f} MB)\n"
             f"• Linked thumbnails: {file_stats.get('linked_thumbnails', 0)}\n"
             f"• Videos with thumbnails: {file_stats.get('videos_with_thumbnails', 0)}\n\n"
             f"🧠 **Memory:**\n"
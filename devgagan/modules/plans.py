@@ -6,6 +6,7 @@ import asyncio
 from config import OWNER_ID, PREMIUM_BROADCAST
 from devgagan.core.func import get_seconds
 from devgagan.core.mongo import plans_db  
+from devgagan.core.mongo.users_db import db as users_collection
 from pyrogram import filters 
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
@@ -206,48 +207,50 @@ async def transfer_premium(client, message):
 
 
 async def premium_remover():
-    all_users = await plans_db.premium_users()
-    removed_users = []
-    not_removed_users = []
+    # One range query + delete_many for expired plans, then batched notifications
+    expired_ids = await plans_db.check_and_remove_expired_users()
+    if expired_ids:
+        await plans_db.notify_expired_users(expired_ids)
 
-    for user_id in all_users:
+    # Remaining plans in one indexed pass; names come from stored user profiles
+    remaining = []
+    async for doc in plans_db.db.find({}, {"_id": 1, "expire_date": 1}).sort("expire_date", 1):
+        remaining.append(doc)
+    names = {}
+    ids = list(expired_ids) + [d["_id"] for d in remaining]
+    if ids:
         try:
-            user = await app.get_users(user_id)
-            chk_time = await plans_db.check_premium(user_id)
-
-            if chk_time and chk_time.get("expire_date"):
-                expiry_date = chk_time["expire_date"]
+            async for u in users_collection.find({"user": {"$in": ids}}, {"user": 1, "first_name": 1}):
+                names[u["user"]] = u.get("first_name") or "Unknown"
+        except Exception:
+            pass
 
-                if expiry_date <= datetime.datetime.now():
-                    name = user.first_name
-                    await plans_db.remove_premium(user_id)
-                    await app.send_message(user_id, text=f"Hello {name}, your premium subscription has expired.")
-                    print(f"{name}, your premium subscription has expired.")
-                    removed_users.append(f"{name} ({user_id})")
-                else:
-                    name = user.first_name
-                    current_time = datetime.datetime.now()
-                    time_left = expiry_date - current_time
+    removed_users = [f"{names.get(uid, 'Unknown')} ({uid})" for uid in expired_ids]
+    not_removed_users = []
+    current_time = datetime.datetime.utcnow()
+    for doc in remaining:
+        user_id = doc["_id"]
+        name = names.get(user_id, "Unknown")
+        expiry_date = doc.get("expire_date")
+        if not expiry_date:
+            continue
+        time_left = expiry_date - current_time
 
-                    days = time_left.days
-                    hours, remainder = divmod(time_left.seconds, 3600)
-                    minutes, seconds = divmod(remainder, 60)
+        days = time_left.days
+        hours, remainder = divmod(time_left.seconds, 3600)
+        minutes, seconds = divmod(remainder, 60)
 
-                    if days > 0:
-                        remaining_time = f"{days} days, {hours} hours, {minutes} minutes, {seconds} seconds"
-                    elif hours > 0:
-                        remaining_time = f"{hours} hours, {minutes} minutes, {seconds} seconds"
-                    elif minutes > 0:
-                        remaining_time = f"{minutes} minutes, {seconds} seconds"
-                    else:
-                        remaining_time = f"{seconds} seconds"
+        if days > 0:
+            remaining_time = f"{days} days, {hours} hours, {minutes} minutes, {seconds} seconds"
+        elif hours > 0:
+            remaining_time = f"{hours} hours, {minutes} minutes, {seconds} seconds"
+        elif minutes > 0:
+            remaining_time = f"{minutes} minutes, {seconds} seconds"
+        else:
+            remaining_time = f"{seconds} seconds"
 
-                    print(f"{name} : Remaining Time : {remaining_time}")
-                    not_removed_users.append(f"{name} ({user_id})")
-        except:
-            await plans_db.remove_premium(user_id)
-            print(f"Unknown users captured : {user_id} removed")
-            removed_users.append(f"Unknown ({user_id})")
+        print(f"{name} : Remaining Time : {remaining_time}")
+        not_removed_users.append(f"{name} ({user_id})")
 
     return removed_users, not_removed_users
 
@@ -2,13 +2,13 @@ from pyrogram import filters
 import io
 from devgagan import app
 from config import OWNER_ID, PREMIUM_LIMIT, FREEMIUM_LIMIT
-from devgagan.core.func import subscribe
+from devgagan.core.func import subscribe, check_membership, invalidate_membership, required_channels
 import asyncio
 from devgagan.core.func import *
 from pyrogram.types import CallbackQuery, InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.raw.functions.bots import SetBotInfo
 from pyrogram.raw.types import InputUserSelf
-from devgagan.core.mongo.users_db import get_users, get_users_excluding_bots
+from devgagan.core.mongo.users_db import get_user_counts, get_user_profiles
 
 from pyrogram.types import BotCommand, InlineKeyboardButton, InlineKeyboardMarkup
 from pyrogram.enums import ParseMode
@@ -154,20 +154,11 @@ async def get_all_users(client, message):
         return
     """Owner-only: present export options and handle user data export."""
     try:
-        # Get accurate user count excluding bots
-        try:
-            users_excluding_bots = await get_users_excluding_bots()
-            real_user_count = len(users_excluding_bots)
-            all_users = await get_users()
-            total_count = len(all_users)
-            bot_count = total_count - real_user_count
-        except Exception as e:
-            # Fallback to old method if new function fails
-            print(f"⚠️ Bot filtering failed in /get, using fallback: {e}")
-            all_users = await get_users()
-            real_user_count = len(all_users)
-            total_count = real_user_count
-            bot_count = 0
+        # Indexed counts over the stored is_bot classification
+        counts = await get_user_counts()
+        real_user_count = counts["real"]
+        total_count = counts["total"]
+        bot_count = counts["bots"]
         
         if total_count == 0:
             await message.reply_text("ℹ️ No users found in the database.")
@@ -209,40 +200,18 @@ async def on_export_users(client, callback_query):
     format_type = callback_query.data.split(":")[1]
     chat_id = callback_query.message.chat.id
     try:
-        users = await get_users()
-        users = sorted(set(int(u) for u in users))  # no duplicates
-        count = len(users)
-
-        # Fetch Telegram profile info in batches
-        BATCH = 100
+        # Profile info comes from the user documents (refreshed in the background)
         tg_info = {}
-        for i in range(0, count, BATCH):
-            batch = users[i:i+BATCH]
-            try:
-                tg_users = await app.get_users(batch)
-                if not isinstance(tg_users, list):
-                    tg_users = [tg_users]
-                for u in tg_users:
-                    if not u:
-                        continue
-                    tg_info[u.id] = {
-                        "username": u.username or "-",
-                        "first_name": u.first_name or "-",
-                        "last_name": u.last_name or "-",
-                        "is_bot": getattr(u, "is_bot", False),
-                    }
-            except Exception:
-                for uid in batch:
-                    try:
-                        u = await app.get_users(uid)
-                        tg_info[uid] = {
-                            "username": (u.username or "-") if u else "-",
-                            "first_name": (u.first_name or "-") if u else "-",
-                            "last_name": (u.last_name or "-") if u else "-",
-                            "is_bot": getattr(u, "is_bot", False) if u else False,
-                        }
-                    except Exception:
-                        tg_info[uid] = {"username": "-", "first_name": "-", "last_name": "-", "is_bot": False}
+        async for doc in get_user_profiles():
+            uid = int(doc["user"])
+            tg_info[uid] = {
+                "username": doc.get("username") or "-",
+                "first_name": doc.get("first_name") or "-",
+                "last_name": doc.get("last_name") or "-",
+                "is_bot": bool(doc.get("is_bot", False)),
+            }
+        users = sorted(tg_info)  # no duplicates
+        count = len(users)
 
         # Exclude bots (username ending with 'bot' or is_bot true)
         def is_bot_username(uname: str) -> bool:
@@ -488,49 +457,34 @@ async def see_privacy(client, callback_query):
     )
     await callback_query.message.edit_text(privacy_text, reply_markup=buttons, parse_mode=ParseMode.MARKDOWN)
 
+@app.on_chat_member_updated(group=11)
+async def on_required_channel_member_updated(_, update):
+    """Drop cached force-join state when a user joins/leaves/is banned from a required channel"""
+    try:
+        chat = update.chat
+        member = update.new_chat_member or update.old_chat_member
+        if not chat or not member or not member.user:
+            return
+        main_channel, alienx_channel = required_channels()
+        refs = {str(c).lstrip("@").lower() for c in (main_channel, alienx_channel) if c}
+        if str(chat.id) in refs or (chat.username and chat.username.lower() in refs):
+            invalidate_membership(member.user.id)
+    except Exception:
+        pass
+
 @app.on_callback_query(filters.regex("verify_subscription"))
 async def verify_subscription(client, callback_query):
     """Handle subscription verification when user clicks the verify button"""
     user_id = callback_query.from_user.id
     
     # Import here to avoid circular imports
-    from config import CHANNEL, CHANNEL_ID, FREEMIUM_LIMIT, PREMIUM_LIMIT
-    from pyrogram.errors import UserNotParticipant, ChatAdminRequired
-    from pyrogram.enums import ChatMemberStatus
-    
-    # Check both channels
-    main_channel = CHANNEL if CHANNEL else CHANNEL_ID
-    alienx_channel = "@AlienxSaver"
+    from config import FREEMIUM_LIMIT, PREMIUM_LIMIT
     
-    main_joined = False
-    alienx_joined = False
-    
-    # Check main channel membership
-    if main_channel:
-        try:
-            user = await client.get_chat_member(main_channel, user_id)
-            if user.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-                main_joined = True
-        except UserNotParticipant:
-            main_joined = False
-        except ChatAdminRequired:
-            main_joined = True  # Allow access since we can't verify
-        except Exception:
-            main_joined = True  # Allow access on error to prevent blocking users
-    else:
-        main_joined = True  # If no main channel configured, skip this check
-    
-    # Check AlienxSaver channel membership
-    try:
-        user = await client.get_chat_member(alienx_channel, user_id)
-        if user.status in [ChatMemberStatus.MEMBER, ChatMemberStatus.ADMINISTRATOR, ChatMemberStatus.OWNER]:
-            alienx_joined = True
-    except UserNotParticipant:
-        alienx_joined = False
-    except ChatAdminRequired:
-        alienx_joined = True  # Allow access since we can't verify
-    except Exception:
-        alienx_joined = True  # Allow access on error
+    # Check both channels concurrently, bypassing (and refreshing) the membership cache
+    main_channel, _ = required_channels()
+    main_state, alienx_state = await check_membership(client, user_id, refresh=True)
+    main_joined = main_state in ("joined", "unknown")
+    alienx_joined = alienx_state in ("joined", "unknown")
     
     if main_joined and alienx_joined:
         # User has joined both channels - show success message and welcome
@@ -6,7 +6,7 @@ from pyrogram import filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 from pyrogram.enums import ParseMode
 from config import OWNER_ID
-from devgagan.core.mongo.users_db import get_users, get_users_excluding_bots, add_user, get_user
+from devgagan.core.mongo.users_db import get_user_counts, add_user, get_user
 from devgagan.core.mongo.plans_db import premium_users
 from devgagan.core.get_func import dashboard_manager
 
@@ -20,7 +20,7 @@ async def chat_watcher_func(_, message):
         if message.from_user:
             us_in_db = await get_user(message.from_user.id)
             if not us_in_db:
-                await add_user(message.from_user.id)
+                await add_user(message.from_user.id, message.from_user)
     except:
         pass
 
@@ -53,22 +53,14 @@ async def stats(client, message):
     
     # Measure pure MongoDB ping (fast operations only)
     ping_start = time.time()
-    all_users = await get_users()
+    counts = await get_user_counts()
     premium = await premium_users()
     ping = round((time.time() - ping_start) * 1000)
     
-    # Get user counts (this is slow due to Telegram API calls, but don't include in ping)
-    try:
-        users_excluding_bots = await get_users_excluding_bots()
-        user_count = len(users_excluding_bots)
-        total_count = len(all_users)
-        bot_count = total_count - user_count
-    except Exception as e:
-        # Fallback to old method if new function fails
-        print(f"⚠️ Bot filtering failed, using fallback: {e}")
-        user_count = len(all_users)
-        total_count = user_count
-        bot_count = 0
+    # Counts come from the stored is_bot classification (kept fresh in the background)
+    user_count = counts["real"]
+    total_count = counts["total"]
+    bot_count = counts["bots"]
     
     stats_text = f"""
 <b>📊 Bot Statistics</b> - {(await client.get_me()).mention}